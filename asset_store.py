@@ -0,0 +1,285 @@
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    ASSET_STORE_DIR, ASSET_MAX_WORKERS, ASSET_MAX_BYTES, ASSET_MIN_BYTES, ASSET_CONTENT_TYPES, HTTP_TIMEOUT_SEC,
+)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# CSVの画像列（frame_{i}_img と cta_img）
+IMAGE_COLUMN_PATTERN = re.compile(r"^(frame_\d+_img|cta_img)$")
+ASSET_STATUS_COLUMN = "asset_status"
+
+# 実際のファイル形式をContent-Typeではなく先頭バイトで判定する
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": ("image/jpeg", ".jpg"),
+    b"\x89PNG\r\n\x1a\n": ("image/png", ".png"),
+    b"GIF87a": ("image/gif", ".gif"),
+    b"GIF89a": ("image/gif", ".gif"),
+}
+
+class AssetError(Exception):
+    """画像のダウンロードまたは検証に失敗した場合に送出される。"""
+
+def sniff_image(data):
+    """先頭バイトから画像形式を判定し、(Content-Type, 拡張子) を返す。画像でない場合はNone。"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    for signature, kind in IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return kind
+    return None
+
+def is_remote(url):
+    return url.startswith(("http://", "https://"))
+
+class AssetStore:
+    """
+    画像をSHA-256のハッシュで管理するローカルストア。
+
+    - 同じ内容の画像は、URLが異なっても1ファイルだけ保存する（<root>/<ハッシュ先頭2文字>/<ハッシュ>.<拡張子>）。
+    - URLとハッシュの対応をSQLiteに記録し、一度検証したURLは再ダウンロードしない。
+    - 失敗したURLは記録しないため、次回の実行で再試行される。
+
+    スレッドセーフ。prefetchで複数スレッドから同時にダウンロードする。
+    """
+
+    def __init__(self, root=ASSET_STORE_DIR, max_workers=ASSET_MAX_WORKERS, max_bytes=ASSET_MAX_BYTES,
+                 min_bytes=ASSET_MIN_BYTES, content_types=ASSET_CONTENT_TYPES, timeout=HTTP_TIMEOUT_SEC):
+        self.root = root
+        self.max_workers = max_workers
+        self.max_bytes = max_bytes
+        self.min_bytes = min_bytes
+        self.content_types = content_types
+        self.timeout = timeout
+        os.makedirs(root, exist_ok=True)
+
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS assets (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                path TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def lookup(self, url):
+        """検証済みのURLであれば保存先のパスを返す。ファイルが消えている場合はNone。"""
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM assets WHERE url = ?", (url,)).fetchone()
+        if row and os.path.exists(row[0]):
+            return row[0]
+        return None
+
+    def download(self, url):
+        """
+        画像を1枚ダウンロードして検証する。
+
+        Returns:
+            tuple: (本文のバイト列, Content-Type, 拡張子)
+
+        Raises:
+            AssetError: HTTPエラー、Content-Type・サイズ・ファイル形式の検証に失敗した場合。
+        """
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    raise AssetError(f"HTTP {response.status_code}")
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if content_type not in self.content_types:
+                    raise AssetError(f"画像ではありません（Content-Type: {content_type or '不明'}）")
+                try:
+                    length = int(response.headers.get("Content-Length") or 0)
+                except ValueError:
+                    raise AssetError(f"Content-Lengthが不正です（{response.headers.get('Content-Length')}）")
+                if length > self.max_bytes:
+                    raise AssetError(f"サイズが大きすぎます（{length} bytes）")
+                chunks, size = [], 0
+                for chunk in response.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AssetError(f"サイズが大きすぎます（{self.max_bytes} bytes超）")
+                    chunks.append(chunk)
+        except requests.exceptions.RequestException as e:
+            raise AssetError(f"{type(e).__name__}: {e}")
+
+        data = b"".join(chunks)
+        if len(data) < self.min_bytes:
+            raise AssetError(f"サイズが小さすぎます（{len(data)} bytes）")
+        kind = sniff_image(data)
+        if kind is None:
+            raise AssetError("画像として解釈できません")
+        return data, kind[0], kind[1]
+
+    def put(self, url, data, content_type, ext):
+        """画像を内容のハッシュで保存し、URLとの対応を記録する。同じ内容が保存済みなら書き込まない。"""
+        digest = hashlib.sha256(data).hexdigest()
+        folder = os.path.join(self.root, digest[:2])
+        path = os.path.join(folder, digest + ext)
+        if not os.path.exists(path):
+            os.makedirs(folder, exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO assets (url, sha256, path, content_type, size, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, digest, path, content_type, len(data), time.time()),
+            )
+            self._conn.commit()
+        return path
+
+    def fetch(self, url):
+        """
+        URLの画像をストアに保存し、ローカルパスを返す。検証済みのURLはダウンロードしない。
+
+        Raises:
+            AssetError: ダウンロードまたは検証に失敗した場合。
+        """
+        path = self.lookup(url)
+        if path:
+            return path
+        data, content_type, ext = self.download(url)
+        return self.put(url, data, content_type, ext)
+
+    def prefetch(self, urls):
+        """
+        複数の画像URLを、max_workers件ずつ同時にダウンロード・検証する。重複したURLは1回だけ処理する。
+
+        Returns:
+            dict: {url: (ローカルパス or None, エラーメッセージ)}。成功時のエラーメッセージは空文字。
+        """
+        unique = list(dict.fromkeys(u for u in urls if u and is_remote(u)))
+
+        def fetch_one(url):
+            # 1件の失敗で他のURLの結果を失わないよう、例外はURLごとに失敗として記録する
+            try:
+                return url, (self.fetch(url), "")
+            except AssetError as e:
+                return url, (None, str(e))
+            except (requests.exceptions.RequestException, ValueError) as e:
+                return url, (None, f"{type(e).__name__}: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(executor.map(fetch_one, unique))
+
+    def close(self):
+        self.session.close()
+        with self._lock:
+            self._conn.close()
+
+def image_columns(fieldnames):
+    return [c for c in fieldnames if IMAGE_COLUMN_PATTERN.match(c)]
+
+def localize_csv(input_filename, output_filename=None, store=None):
+    """
+    Canva用CSVの画像列（frame_{i}_img, cta_img）の画像をまとめて事前取得し、検証済みのローカルパスに書き換える。
+    asset_status列に、全ての画像が使える行は "OK"、失敗した画像がある行は "NG: 列名: 理由; ..." を記録する。
+    失敗した画像の列は元のURLのまま残す。
+
+    Args:
+        input_filename (str): generate_canva_csv_batchなどで出力したCSV。
+        output_filename (str): 書き換えたCSVの出力先。Noneの場合は入力ファイルを上書きする。
+        store (AssetStore): 使用するストア。Noneの場合は既定の設定で作成する。
+
+    Returns:
+        dict: 集計 {"rows", "ok_rows", "ng_rows", "urls", "downloaded", "failed", "elapsed_sec"}。
+    """
+    output_filename = output_filename or input_filename
+    own_store = store is None
+    store = store or AssetStore()
+    started = time.perf_counter()
+
+    with open(input_filename, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        fieldnames = list(reader.fieldnames or [])
+        rows = list(reader)
+    columns = image_columns(fieldnames)
+
+    try:
+        urls = [row[c] for row in rows for c in columns]
+        fetched = store.prefetch(urls)
+    finally:
+        if own_store:
+            store.close()
+
+    ng_rows = 0
+    for row in rows:
+        errors = []
+        for c in columns:
+            value = row[c]
+            if is_remote(value):
+                path, error = fetched[value]
+                if path:
+                    row[c] = os.path.abspath(path)
+                else:
+                    errors.append(f"{c}: {error}")
+            elif not value or not os.path.exists(value):
+                # NO_IMAGE_URL や存在しないローカルパス
+                errors.append(f"{c}: 画像がありません（{value or '空'}）")
+        row[ASSET_STATUS_COLUMN] = "OK" if not errors else "NG: " + "; ".join(errors)
+        ng_rows += bool(errors)
+
+    if ASSET_STATUS_COLUMN not in fieldnames:
+        fieldnames.append(ASSET_STATUS_COLUMN)
+    tmp = output_filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, output_filename)
+
+    stats = {
+        "rows": len(rows),
+        "ok_rows": len(rows) - ng_rows,
+        "ng_rows": ng_rows,
+        "urls": len(fetched),
+        "downloaded": sum(1 for path, _ in fetched.values() if path),
+        "failed": sum(1 for path, _ in fetched.values() if not path),
+        "elapsed_sec": round(time.perf_counter() - started, 2),
+    }
+    for url, (path, error) in fetched.items():
+        if not path:
+            print(f"[NG] {url}: {error}")
+    print(f"画像アセットを検証しました: {output_filename} "
+          f"(画像 {stats['downloaded']}/{stats['urls']}件成功, 行 OK {stats['ok_rows']} / NG {stats['ng_rows']}, "
+          f"{stats['elapsed_sec']}秒)")
+    return stats
+
+if __name__ == "__main__":
+    # 実行例: python asset_store.py canva_import_data.csv --output canva_import_data_local.csv
+    ap = argparse.ArgumentParser(description="CSVの画像URLを事前取得・検証し、ローカルの画像パスに書き換える")
+    ap.add_argument("csv", help="Canva用CSVファイル")
+    ap.add_argument("--output", help="出力CSVファイル名（省略時は上書き）")
+    ap.add_argument("--store", default=ASSET_STORE_DIR, help="画像の保存先フォルダ")
+    ap.add_argument("--workers", type=int, default=ASSET_MAX_WORKERS, help="同時ダウンロード数")
+    args = ap.parse_args()
+
+    store = AssetStore(args.store, max_workers=args.workers)
+    try:
+        localize_csv(args.csv, args.output, store)
+    finally:
+        store.close()
@@ -0,0 +1,287 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# 作品数ごとの計測ケース（1ケースずつ新しいプロセスで実行し、ピークメモリを分けて計測する）
+DEFAULT_SIZES = (10, 1000, 10000)
+RESULTS_DIR = "benchmark_results"
+
+DEFAULT_OPTIONS = {
+    "llm_latency": 0.02,        # モックLLMの応答遅延（秒）
+    "malformed_rate": 0.0,      # モックLLMが不正な形式の出力を返す割合
+    "prefill_ms_per_char": 0.0, # モックLLMがKVキャッシュに無いプロンプト1文字あたりにかける時間（ミリ秒）
+    "prompt_layout": None,      # LLMプロンプトの形式（Noneの場合はconfig.LLM_PROMPT_LAYOUT）
+    "api_latency": 0.0,         # ItemListの応答遅延（秒）
+    "detail_latency": 0.0,      # 作品詳細ページの応答遅延（秒）
+    "pages": 8,                 # 1作品あたりの試し読み画像・ビューアのページ数
+    "stream": False,            # LLMをストリーミングモードで呼び出す
+    "generate_concurrency": 4,  # パイプラインのgenerateステージの同時実行数
+    "capture_concurrency": 2,   # キャプチャの同時実行数
+}
+
+# ベースラインと比較して回帰とみなす変化率
+REGRESSION_THROUGHPUT_DROP = 0.10   # 作品/分が10%以上低下
+REGRESSION_LATENCY_RISE = 0.20      # ステージのp95が20%以上増加
+REGRESSION_MEMORY_RISE = 0.20       # ピークメモリが20%以上増加
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def peak_memory_mb():
+    """このプロセスのピークメモリ（MB）を返す。resourceモジュールが無い環境（Windows）ではNone。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # LinuxはKB、macOSはバイト単位
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def latency_of(histogram):
+    return {"p50": histogram["p50"], "p95": histogram["p95"], "count": histogram["count"]}
+
+def stage_latencies(report):
+    """メトリクスのレポートから、パイプラインのステージごとのp50/p95（秒）を取り出す。"""
+    return {h["labels"]["stage"]: latency_of(h) for h in report["histograms"] if h["name"] == "stage_seconds"}
+
+def histogram_latency(report, name, **labels):
+    """メトリクスのレポートから、名前とラベルが一致するヒストグラムのp50/p95（秒）を取り出す（無ければNone）。"""
+    for h in report["histograms"]:
+        if h["name"] == name and all(h["labels"].get(k) == v for k, v in labels.items()):
+            return latency_of(h)
+    return None
+
+def start_stand_ins(options):
+    """モックのDMMサーバー（API・作品詳細ページ・ビューア）とLLMサーバーを起動し、各モジュールの接続先を差し替える。"""
+    import dmm_api
+    import final_canva_csv_generator
+    from mock_dmm_server import start_mock_dmm_server
+    from mock_llm_server import start_mock_llm_server
+
+    dmm_server, base_url, endpoint = start_mock_dmm_server(api_latency=options["api_latency"],
+                                                           detail_latency=options["detail_latency"],
+                                                           pages=options["pages"])
+    llm_server, llm_state, llm_url = start_mock_llm_server(latency=options["llm_latency"],
+                                                           malformed_rate=options["malformed_rate"], seed=0,
+                                                           prefill_ms_per_char=options["prefill_ms_per_char"])
+    dmm_api.DMM_API_ENDPOINT = endpoint
+    # ローカルのスタンドインが相手なので流量制限は実質無効にし、HTTPキャッシュは作業ディレクトリ内に作る
+    dmm_api._default_client = dmm_api.DMMClient(rate_per_sec=10000, burst=1000)
+    final_canva_csv_generator.OLLAMA_BASE_URL = llm_url
+    final_canva_csv_generator._llm_client = None
+    final_canva_csv_generator.LLM_CACHE_ENABLED = False
+    return base_url, llm_state, (dmm_server, llm_server)
+
+def run_pipeline_case(size, options):
+    """モックサーバーに対してCanva用CSVのパイプラインをsize作品分実行し、計測結果を返す。"""
+    import metrics
+    from pipeline import run_canva_pipeline
+
+    _, llm_state, servers = start_stand_ins(options)
+    metrics.enable()
+    metrics.reset()
+    cids = [f"bench{n:06d}" for n in range(1, size + 1)]
+    started = time.perf_counter()
+    try:
+        results, stats = run_canva_pipeline(cids, "bench_output.csv", use_mock=False, stream_llm=options["stream"],
+                                            generate_concurrency=options["generate_concurrency"],
+                                            prompt_layout=options["prompt_layout"])
+    finally:
+        for server in servers:
+            server.shutdown()
+    elapsed = time.perf_counter() - started
+    report = metrics.report()
+    return {
+        "case": "pipeline",
+        "works": size,
+        "ok": sum(1 for r in results if r["status"] == "OK"),
+        "elapsed_sec": round(elapsed, 3),
+        "works_per_min": round(size / elapsed * 60, 1) if elapsed > 0 else None,
+        "stages": stage_latencies(report),
+        "utilization": {s["stage"]: round(s["utilization"], 3) for s in stats["stages"]},
+        "fallback_rate": report["derived"]["llm_fallback_rate"],
+        "llm_requests": llm_state.requests,
+        "llm_malformed": llm_state.malformed,
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+def run_capture_case(size, options):
+    """
+    モックのビューアに対してプレビューキャプチャをsize作品分実行し、計測結果を返す。
+    Playwrightのブラウザが使えない環境ではNoneを返す。
+    """
+    import asyncio
+    import metrics
+    import fanza_capture_preview as capture
+
+    base_url, _, servers = start_stand_ins(options)
+    metrics.enable()
+    metrics.reset()
+    urls = [f"{base_url}/detail/cid=bench{n:06d}/?pages={options['pages']}" for n in range(1, size + 1)]
+    opts = capture.CaptureOptions(max_pages=options["pages"], wait_mode="adaptive")
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(capture.capture_many(urls, opts, headful=False, concurrency=options["capture_concurrency"]))
+    except Exception as e:
+        # ブラウザ未インストール（playwright install 未実行）など
+        print(f"キャプチャを実行できませんでした: {str(e).splitlines()[0]}", file=sys.stderr)
+        return None
+    finally:
+        for server in servers:
+            server.shutdown()
+    elapsed = time.perf_counter() - started
+    report = metrics.report()
+    return {
+        "case": "capture",
+        "works": size,
+        "ok": sum(1 for r in results if r["status"] == "OK"),
+        "elapsed_sec": round(elapsed, 3),
+        "works_per_min": round(size / elapsed * 60, 1) if elapsed > 0 else None,
+        "stages": {name: latency for name, latency in (
+            ("page", histogram_latency(report, "capture_page_seconds")),
+            ("work", histogram_latency(report, "capture_work_seconds", status="OK")),
+        ) if latency},
+        # ブラウザは別プロセスのため、Python側のピークメモリのみ
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+def run_case_in_subprocess(case, size, options, workdir):
+    """1ケースを新しいプロセスで実行し、結果の辞書を返す（失敗・スキップ時はNone）。"""
+    result_path = os.path.join(workdir, f"{case}_{size}.json")
+    args = [sys.executable, os.path.join(HERE, "benchmark_e2e.py"), "--run-one", case, str(size),
+            "--result-file", result_path, "--options", json.dumps(options)]
+    # 各ケースのキャッシュ・CSV・キャプチャは作業ディレクトリに作られる。進捗表示は捨てる
+    proc = subprocess.run(args, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                          env=dict(os.environ, PYTHONPATH=HERE))
+    if proc.returncode != 0:
+        print(f"[{case} {size}作品] 失敗しました:\n{proc.stderr[-2000:]}")
+        return None
+    with open(result_path, encoding="utf-8") as f:
+        result = json.load(f)
+    if result is None:
+        print(f"[{case} {size}作品] スキップしました: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''}")
+    return result
+
+def case_key(result):
+    return f"{result['case']}:{result['works']}"
+
+def find_regressions(results, baseline):
+    """ベースラインの結果と比較し、回帰と判定した項目のメッセージのリストを返す。"""
+    previous = {case_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        base = previous.get(case_key(r))
+        if base is None:
+            continue
+        key = case_key(r)
+        if base.get("works_per_min") and r.get("works_per_min") is not None:
+            if r["works_per_min"] < base["works_per_min"] * (1 - REGRESSION_THROUGHPUT_DROP):
+                regressions.append(f"{key}: 作品/分 {base['works_per_min']} → {r['works_per_min']}")
+        for stage, latency in r["stages"].items():
+            base_p95 = (base["stages"].get(stage) or {}).get("p95")
+            if base_p95 and latency["p95"] is not None and latency["p95"] > base_p95 * (1 + REGRESSION_LATENCY_RISE):
+                regressions.append(f"{key}: {stage} p95 {base_p95:.3f}秒 → {latency['p95']:.3f}秒")
+        if base.get("peak_memory_mb") and r.get("peak_memory_mb") is not None:
+            if r["peak_memory_mb"] > base["peak_memory_mb"] * (1 + REGRESSION_MEMORY_RISE):
+                regressions.append(f"{key}: ピークメモリ {base['peak_memory_mb']}MB → {r['peak_memory_mb']}MB")
+    return regressions
+
+def print_results(results):
+    print("\n--- エンドツーエンドベンチマーク ---")
+    for r in results:
+        fallback = f"  フォールバック率 {r['fallback_rate']:.1%}" if r.get("fallback_rate") is not None else ""
+        memory = f"{r['peak_memory_mb']}MB" if r["peak_memory_mb"] is not None else "-"
+        print(f"[{r['case']} {r['works']}作品] 成功 {r['ok']}/{r['works']}  {r['elapsed_sec']:.1f}秒  "
+              f"{r['works_per_min']} 作品/分  ピークメモリ {memory}{fallback}")
+        for stage, latency in r["stages"].items():
+            print(f"    {stage:22s} p50 {latency['p50']:.3f}秒  p95 {latency['p95']:.3f}秒  ({latency['count']}件)")
+
+def run_benchmark(sizes=DEFAULT_SIZES, capture_works=0, options=None, baseline_path=None, results_dir=RESULTS_DIR):
+    """
+    ローカルのスタンドイン（DMM API・作品詳細ページ・LLM・ビューア）に対して、作品数ごとに
+    取得から CSV 出力までのパイプライン（capture_works > 0 ならキャプチャも）を計測し、結果をJSONで保存する。
+
+    Returns:
+        tuple: (各ケースの結果のリスト, 回帰と判定した項目のリスト)
+    """
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            result = run_case_in_subprocess("pipeline", size, options, workdir)
+            if result:
+                results.append(result)
+        if capture_works:
+            result = run_case_in_subprocess("capture", capture_works, options, workdir)
+            if result:
+                results.append(result)
+    print_results(results)
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "options": options, "results": results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {path}")
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f))
+        if regressions:
+            print(f"\n--- 回帰を検出しました（ベースライン: {baseline_path}） ---")
+            for message in regressions:
+                print(f"  {message}")
+        else:
+            print(f"\nベースライン（{baseline_path}）からの回帰はありません。")
+    return results, regressions
+
+
+if __name__ == "__main__":
+    # 実行例: python benchmark_e2e.py --sizes 10,1000 --malformed-rate 0.05 --baseline benchmark_results/20260101-120000.json
+    ap = argparse.ArgumentParser(description="ローカルのモックサーバーに対してエンドツーエンドの処理性能を計測する")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="計測する作品数（カンマ区切り）")
+    ap.add_argument("--capture", type=int, default=0, metavar="N",
+                    help="N作品分のプレビューキャプチャも計測する（Playwrightのブラウザが必要）")
+    ap.add_argument("--llm-latency", type=float, default=DEFAULT_OPTIONS["llm_latency"], help="モックLLMの応答遅延（秒）")
+    ap.add_argument("--malformed-rate", type=float, default=DEFAULT_OPTIONS["malformed_rate"],
+                    help="モックLLMが不正な形式の出力を返す割合（0.0-1.0）")
+    ap.add_argument("--api-latency", type=float, default=DEFAULT_OPTIONS["api_latency"], help="ItemListの応答遅延（秒）")
+    ap.add_argument("--detail-latency", type=float, default=DEFAULT_OPTIONS["detail_latency"], help="作品詳細ページの応答遅延（秒）")
+    ap.add_argument("--prefill-ms-per-char", type=float, default=DEFAULT_OPTIONS["prefill_ms_per_char"],
+                    help="モックLLMがKVキャッシュに無いプロンプト1文字あたりにかける時間（ミリ秒）")
+    ap.add_argument("--prompt-layout", choices=("legacy", "prefix"), help="LLMプロンプトの形式")
+    ap.add_argument("--stream", action="store_true", help="LLMをストリーミングモードで呼び出す")
+    ap.add_argument("--generate-concurrency", type=int, default=DEFAULT_OPTIONS["generate_concurrency"],
+                    help="generateステージの同時実行数")
+    ap.add_argument("--baseline", help="比較するベースラインの結果JSON（benchmark_results/*.json）")
+    ap.add_argument("--results-dir", default=RESULTS_DIR, help="結果JSONの保存先ディレクトリ")
+    # 内部用: 1ケースを実行して結果をJSONに書き出す
+    ap.add_argument("--run-one", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    ap.add_argument("--result-file", help=argparse.SUPPRESS)
+    ap.add_argument("--options", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.run_one:
+        case, size = args.run_one[0], int(args.run_one[1])
+        options = dict(DEFAULT_OPTIONS, **json.loads(args.options or "{}"))
+        result = (run_capture_case if case == "capture" else run_pipeline_case)(size, options)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        sys.exit(0)
+
+    _, regressions = run_benchmark(
+        sizes=[int(s) for s in args.sizes.split(",") if s.strip()],
+        capture_works=args.capture,
+        options={"llm_latency": args.llm_latency, "malformed_rate": args.malformed_rate,
+                 "prefill_ms_per_char": args.prefill_ms_per_char, "prompt_layout": args.prompt_layout,
+                 "api_latency": args.api_latency, "detail_latency": args.detail_latency,
+                 "stream": args.stream, "generate_concurrency": args.generate_concurrency},
+        baseline_path=args.baseline,
+        results_dir=args.results_dir,
+    )
+    # CIで回帰を検出できるよう、回帰があれば終了コード1で終了する
+    sys.exit(1 if regressions else 0)
@@ -31,3 +31,107 @@ MOCK_DMM_DATA = {
     "keywords": ["AI美女", "未来都市", "SORA2", "幻想的", "芸術"],
     "affiliate_link": "YOUR_DMM_AFFILIATE_LINK" # 実際のリンクに置き換える
 }
+
+# --- DMM APIクライアント設定 ---
+DMM_MAX_WORKERS = 8            # 複数作品を取得する際の同時実行数（スレッド数）
+DMM_RATE_LIMIT_PER_SEC = 1.0   # DMM APIへの平均リクエスト数/秒（トークンバケットの補充速度）
+DMM_RATE_LIMIT_BURST = 5       # 一時的に連続送信できる最大リクエスト数（トークンバケットの容量）
+DMM_MAX_RETRIES = 3            # 接続エラー・429・5xx時の最大リトライ回数
+DMM_RETRY_BACKOFF_SEC = 1.0    # リトライ間隔の基準秒数（指数バックオフ: 1, 2, 4, ...秒）
+HTTP_TIMEOUT_SEC = 10          # HTTPリクエストのタイムアウト秒数
+
+# --- HTTPキャッシュ設定 ---
+# DMM APIのJSONと作品詳細ページのHTMLをSQLiteにキャッシュし、再実行時のダウンロードを省略する
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_PATH = ".cache/http_cache.sqlite3"
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024  # キャッシュの最大サイズ。超過時は最終アクセスが古いものから削除（LRU）
+# URLの前方一致でエンドポイントごとの有効期限（秒）を指定する。最も長く一致したものを使用し、""は既定値
+HTTP_CACHE_TTLS = {
+    "https://api.dmm.com/": 6 * 60 * 60,   # DMM API: 6時間
+    "": 24 * 60 * 60,                       # 作品詳細ページなど: 24時間
+}
+
+# --- LLM生成結果キャッシュ設定 ---
+# プロンプト（LLM_MODEL + 送信メッセージ）のハッシュをキーに、パース済みのクリップリストを保存する
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = ".cache/llm_cache.sqlite3"
+LLM_CACHE_MAX_ENTRIES = 20000  # 超過時は最終アクセスが古いものから削除（LRU）
+
+# --- LLM並列生成設定 ---
+# Ollamaを OLLAMA_NUM_PARALLEL=4 などで起動している場合、その値に合わせる
+LLM_MAX_IN_FLIGHT = 4          # 同時にLLMへ送信するリクエスト数の上限
+LLM_REQUEST_TIMEOUT_SEC = 180  # LLMリクエスト1件あたりのタイムアウト秒数
+
+# --- LLMストリーミング設定 ---
+# Trueの場合、出力をストリーミングで受け取りながらクリップを逐次検証し、
+# 形式が崩れた時点で生成を打ち切ってルールベース生成に切り替える
+LLM_STREAMING = False
+LLM_STREAM_MAX_CHARS = 3000       # 出力全体の最大文字数（超えたら打ち切り）
+LLM_CLIP_MAX_TOP_CHARS = 40       # 上段テキストの最大文字数
+LLM_CLIP_MAX_BOTTOM_CHARS = 120   # 下段テキストの最大文字数
+
+# --- LLMプロンプト形式・モデル常駐設定 ---
+# "legacy": 作品ごとのデータをシステムプロンプトの途中に埋め込む（従来の形式）
+# "prefix": 共通の指示をバイト単位で同一のシステムプロンプトにし、作品ごとのデータを最後のユーザーメッセージに置く。
+#           Ollamaが共通部分のKVキャッシュを再利用できるため、最初のトークンまでの時間（TTFT）が短くなる
+LLM_PROMPT_LAYOUT = "legacy"
+LLM_DESCRIPTION_TOKEN_BUDGET = 400  # prefix形式で、あらすじをこのトークン数（推定）以内に切り詰める（0で無効）
+# リクエストごとにOllamaへ送るkeep_alive（モデルをメモリに保持する時間）。Noneの場合は送らない。
+# OllamaのOpenAI互換APIが無視するバージョンでは、サーバー側の環境変数 OLLAMA_KEEP_ALIVE で設定する
+LLM_KEEP_ALIVE = "30m"
+LLM_WARMUP = True  # バッチ開始時に短いリクエストでモデルを読み込み、共通の指示部分を処理させておく
+
+# --- 作品詳細ページの解析設定 ---
+# 試し読み画像を抽出するCSSセレクタ（実際のサイト構造に合わせて修正してください）
+SAMPLE_IMAGE_SELECTOR = "img.sample-image"
+# HTMLパーサー: "html.parser"（標準・低速） / "lxml"（要 pip install lxml） / "selectolax"（要 pip install selectolax、最速）
+HTML_PARSER_BACKEND = "html.parser"
+
+# --- キャプチャ画像の後処理設定 ---
+# fanza_capture_preview.py が captures/<cid>/ に保存した page_NN.png を、Canvaへのアップロード用に加工する
+CAPTURES_DIR = "captures"
+POSTPROCESS_CROP = (0, 0, 0, 0)      # ビューアの枠を除くために削る幅（左, 上, 右, 下）px
+POSTPROCESS_WIDTH = 720              # 出力の幅px（高さは縦横比を保って計算）
+POSTPROCESS_FORMAT = "webp"          # "webp" / "jpeg"
+POSTPROCESS_QUALITY = 80             # エンコード品質（1-100）
+POSTPROCESS_MAX_KB = 0               # 0より大きい場合、このサイズに収まるまで品質を下げる
+POSTPROCESS_WORKERS = 0              # プロセス数。0の場合はCPUコア数
+
+# --- フレーム選択設定 ---
+# frame_ranking.py がキャプチャ画像を採点し、作品ごとにMAX_FRAMES枚（frame_{i}_img + cta_img）を選ぶ
+FRAME_RANK_SIZE = (72, 128)          # 採点用に縮小するサイズ（幅, 高さ）px
+FRAME_BLANK_STD = 0.04               # 明るさの標準偏差がこれ未満のページは白紙とみなす（0-1）
+FRAME_BLANK_EDGES = 0.005            # エッジの割合がこれ未満のページは白紙とみなす
+FRAME_SPARSE_COVERAGE = 0.12         # 背景色以外の割合がこれ未満のページ（奥付・クレジット等）は減点する
+FRAME_DUP_DISTANCE = 0.03            # 選択済みのフレームとの距離がこれ未満のページはほぼ重複とみなす（0-1）
+FRAME_DIVERSITY_WEIGHT = 0.5         # 選択済みのフレームから離れていることへの加点の重み
+FRAME_RANK_WORKERS = 8               # 画像を読み込むスレッド数
+
+# --- 画像アセット設定 ---
+# CSVの画像URLを事前にダウンロード・検証し、内容のハッシュ（SHA-256）をファイル名としてローカルに1回だけ保存する
+ASSET_STORE_DIR = "assets"
+ASSET_MAX_WORKERS = 8                  # 画像を同時にダウンロードする数
+ASSET_MAX_BYTES = 20 * 1024 * 1024     # 1枚あたりの最大サイズ（超えたら失敗扱い）
+ASSET_MIN_BYTES = 100                  # これより小さいレスポンスは壊れた画像・プレースホルダーとみなす
+ASSET_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
+# --- パイプライン設定（pipeline.py） ---
+# 取得・スクレイピング・テキスト生成・CSV書き込みを別々のステージとして同時に動かす。ステージ間はキューで接続し、
+# キューが満杯になると前のステージが待機する（バックプレッシャー）
+PIPELINE_FETCH_CONCURRENCY = 4      # DMM APIの取得（レート制限はDMMClientのトークンバケットで別途かかる）
+PIPELINE_SCRAPE_CONCURRENCY = 4     # 作品詳細ページのスクレイピング
+PIPELINE_GENERATE_CONCURRENCY = 4   # テキスト生成（LLM_MAX_IN_FLIGHTに合わせる）
+PIPELINE_QUEUE_SIZE = 16            # ステージ間のキューの最大長
+
+# --- ジョブジャーナル設定 ---
+# バッチ処理でCIDごとの進行状況（取得データ・画像URL・生成テキスト・書き込んだ行）を記録し、
+# 中断後の再実行では完了済みの作品を飛ばして、失敗・未完了の作品だけを処理する（--journal）
+JOB_JOURNAL_PATH = ".cache/job_journal.sqlite3"
+
+# --- メトリクス設定（metrics.py） ---
+# ステージごとの処理時間・HTTP転送量・LLMトークン数・キャプチャ時間などを集計し、実行終了時に
+# JSONのレポートとPrometheus（node_exporterのtextfile collector）形式のファイルに書き出す。
+# 無効の場合、計測呼び出しは何もせずに戻る（各CLIの --metrics でも有効にできる）
+METRICS_ENABLED = False
+METRICS_JSON_PATH = "metrics/run_report.json"
+METRICS_PROM_PATH = "metrics/canva_generator.prom"
@@ -1,56 +1,462 @@
+import argparse
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from bs4 import BeautifulSoup
-from config import DMM_API_ID, DMM_AFFILIATE_ID, MOCK_DMM_DATA
+from requests.adapters import HTTPAdapter
+from config import (
+    DMM_API_ID, DMM_AFFILIATE_ID, MOCK_DMM_DATA,
+    DMM_MAX_WORKERS, DMM_RATE_LIMIT_PER_SEC, DMM_RATE_LIMIT_BURST,
+    DMM_MAX_RETRIES, DMM_RETRY_BACKOFF_SEC, HTTP_TIMEOUT_SEC, HTTP_CACHE_ENABLED,
+    SAMPLE_IMAGE_SELECTOR, HTML_PARSER_BACKEND,
+)
+from http_cache import HTTPCache
+import metrics
 
 # 実際のDMM APIのURLに置き換えてください
 DMM_API_ENDPOINT = "https://api.dmm.com/affiliate/v3/ItemList"
 
-def fetch_sample_images(affiliate_url):
+# ItemListの1回の呼び出しで取得できる最大件数と、offsetの上限（DMM API v3の仕様）
+DMM_MAX_HITS = 100
+DMM_MAX_OFFSET = 50000
+
+# ユーザーエージェントを設定して、スクレイピング対策を回避
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# リトライ対象のHTTPステータスコード
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
     """
-    作品詳細ページをWebスクレイピングし、試し読み画像のURLリストを取得する。
+    スレッドセーフなトークンバケット方式のレートリミッター。
+    rate件/秒でトークンが補充され、最大capacity件まで連続でリクエストを送信できる。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得する。トークンが無い場合は補充されるまで待機する。"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def extract_item_data(item):
+    """
+    ItemListのレスポンスに含まれる1作品分のitemから、基本情報を抽出する。
+    画像URLはWebスクレイピングで取得するため、ここでは空リストとする。
+    """
+    return {
+        "cid": item.get("content_id", ""),
+        "title": item["title"],
+        "description": item["iteminfo"]["description"],
+        "author": item["iteminfo"]["maker"][0]["name"],
+        "genre": item["iteminfo"]["genre"][0]["name"],
+        "keywords": [tag["name"] for tag in item["iteminfo"]["tag"]],
+        "affiliate_link": item["affiliateURL"],
+        # 画像URLはWebスクレイピングで取得
+        "image_urls": [],
+    }
+
+HTML_PARSER_BACKENDS = ("html.parser", "lxml", "selectolax")
+
+# SoupStrainerで絞り込んでも結果が変わらないセレクタ: タグ名に .class / #id / [属性] を付けただけの単一要素指定
+_STRAINABLE_SELECTOR = re.compile(r"[a-zA-Z][\w-]*(?:\.[\w-]+|#[\w-]+|\[[^\]]*\])*")
+
+def _strainer_for(selector):
+    """
+    セレクタが単一の要素指定（例: 'img.sample-image'）の場合、そのタグだけを解析対象にするSoupStrainerを返す。
+    SoupStrainerは一致したタグを親子関係なしで並べるため、子孫・兄弟セレクタや
+    疑似クラス（':first-child' など）のように周囲の構造が必要な場合はNone（ページ全体を解析）。
+    """
+    selector = selector.strip()
+    if not _STRAINABLE_SELECTOR.fullmatch(selector):
+        return None
+    from bs4 import SoupStrainer
+    return SoupStrainer(re.match(r"[a-zA-Z][\w-]*", selector).group(0))
+
+def _image_url(attrs):
+    # 遅延ロードされている場合は data-src を、そうでない場合は src を使用
+    url = attrs.get('data-src') or attrs.get('src')
+    if url and url.startswith('http'):
+        return url
+    return None
+
+def parse_sample_images(html, backend=HTML_PARSER_BACKEND, selector=SAMPLE_IMAGE_SELECTOR):
+    """
+    作品詳細ページのHTMLから試し読み画像のURLリストを抽出する。
     
     Args:
-        affiliate_url (str): 作品詳細ページのアフィリエイトURL。
+        html (str): 作品詳細ページのHTML。
+        backend (str): HTMLパーサー。"html.parser" / "lxml" / "selectolax"。
+        selector (str): 試し読み画像を抽出するCSSセレクタ（config.SAMPLE_IMAGE_SELECTOR）。
         
     Returns:
         list: 試し読み画像のURLリスト。
     """
-    print(f"--- Webスクレイピング開始: {affiliate_url} ---")
+    if backend not in HTML_PARSER_BACKENDS:
+        raise ValueError(f"未対応のHTMLパーサーです: {backend}")
+
+    with metrics.timer("html_parse_seconds", backend=backend):
+        return _parse_sample_images(html, backend, selector)
+
+def _parse_sample_images(html, backend, selector):
+    # 抽出ロジック: data-src属性やsrc属性からURLを取得
+    if backend == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+        nodes = LexborHTMLParser(html).css(selector)
+        urls = (_image_url(node.attributes) for node in nodes)
+    else:
+        # bs4はスクレイピング時のみ必要なため、ここでimportする（モックデータでの実行を軽くする）
+        from bs4 import BeautifulSoup
+        # 画像タグ以外を読み飛ばして解析することで、大きなページでもツリー構築のコストを抑える
+        soup = BeautifulSoup(html, backend, parse_only=_strainer_for(selector))
+        urls = (_image_url(img.attrs) for img in soup.select(selector))
+    return [url for url in urls if url]
+
+def compare_html_parsers(paths=None, repeat=5, selector=SAMPLE_IMAGE_SELECTOR):
+    """
+    保存済みの作品詳細ページ（HTMLファイル）に対して各パーサーの抽出結果と処理時間を比較する。
+    結果はhtml.parserでページ全体を解析した場合（SoupStrainerなし）の結果と一致するかどうかで判定する。
+    pathsを省略した場合は合成した大きなページを使う。
     
+    Returns:
+        dict: パーサー名 -> {"ms": 1回あたりの処理時間, "matched": 結果が一致したか}。
+              利用できないパーサーは {"error": 理由}。
+    """
+    from bs4 import BeautifulSoup, FeatureNotFound
+
+    if paths:
+        pages = {}
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages[path] = f.read()
+    else:
+        filler = "".join(f'<div class="ad"><script>var x{i}=1;</script><a href="/p/{i}">関連作品{i}</a></div>' for i in range(3000))
+        samples = "".join(f'<img class="sample-image" data-src="https://example.com/sample/{i}.jpg">' for i in range(20))
+        pages = {"(合成ページ)": f"<html><body>{filler}<div id='sample'>{samples}</div>{filler}</body></html>"}
+
+    expected = {}
+    for name, html in pages.items():
+        urls = (_image_url(img.attrs) for img in BeautifulSoup(html, "html.parser").select(selector))
+        expected[name] = [url for url in urls if url]
+
+    print(f"\n--- HTMLパーサーの比較 ({len(pages)}ページ × {repeat}回, セレクタ: {selector}) ---")
+    report = {}
+    for backend in HTML_PARSER_BACKENDS:
+        try:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                results = {name: parse_sample_images(html, backend, selector) for name, html in pages.items()}
+            elapsed = (time.perf_counter() - started) / repeat
+        except (ImportError, FeatureNotFound) as e:
+            # lxml未インストール時、bs4はImportErrorではなくFeatureNotFoundを送出する
+            print(f"{backend:12s} 利用不可 ({e})")
+            report[backend] = {"error": str(e)}
+            continue
+        matched = all(results[name] == expected[name] for name in pages)
+        print(f"{backend:12s} {elapsed * 1000:8.1f} ms/回  結果の一致: {'OK' if matched else 'NG'}")
+        report[backend] = {"ms": elapsed * 1000, "matched": matched}
+    return report
+
+def _target(url):
+    # メトリクスのラベル: DMM APIか、それ以外（作品詳細ページ）か
+    return "dmm_api" if url.startswith(DMM_API_ENDPOINT) else "detail_page"
+
+def is_cacheable(url, response):
+    """
+    キャッシュしてよいレスポンスか。DMM APIはエラーでもHTTP 200でエラー内容のJSONを返すため、
+    result.statusが200で作品が1件以上含まれる場合のみキャッシュする（一時的なエラーを有効期限いっぱい返さないように）。
+    """
+    if response.status_code != 200:
+        return False
+    if _target(url) != "dmm_api":
+        return True
     try:
-        # ユーザーエージェントを設定して、スクレイピング対策を回避
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        result = response.json()["result"]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return str(result.get("status")) == "200" and bool(result.get("items"))
+
+class DMMClient:
+    """
+    コネクションプール付きのDMM APIクライアント。
+
+    1つのrequests.Sessionを共有してTCP/TLS接続を再利用し、DMM APIへのリクエストは
+    トークンバケットで流量を制限する。接続エラー・タイムアウト・429/5xxは指数バックオフでリトライする。
+    fetch_many()で複数作品のAPI取得と詳細ページのスクレイピングをスレッドプールで並行実行する。
+    APIのJSONと詳細ページのHTMLは共通のHTTPCacheに保存され、有効期限内であればネットワークにアクセスしない。
+    """
+
+    def __init__(self, max_workers=DMM_MAX_WORKERS, rate_per_sec=DMM_RATE_LIMIT_PER_SEC,
+                 burst=DMM_RATE_LIMIT_BURST, max_retries=DMM_MAX_RETRIES,
+                 backoff_sec=DMM_RETRY_BACKOFF_SEC, timeout=HTTP_TIMEOUT_SEC,
+                 use_cache=HTTP_CACHE_ENABLED, cache=None):
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else (HTTPCache() if use_cache else None)
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate_per_sec, burst)
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        # API呼び出しとスクレイピングが同時に走るため、ホストあたりの接続数をワーカー数分確保する
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(max_workers, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None, rate_limited=False):
+        """
+        キャッシュとリトライ付きでGETリクエストを送信する。
+        有効期限内のキャッシュがあればそれを返し、期限切れの場合はETag/Last-Modifiedで再検証する。
+
+        Args:
+            url (str): リクエスト先URL。
+            params (dict): クエリパラメータ。
+            rate_limited (bool): Trueの場合、送信前にレートリミッターのトークンを取得する。
+
+        Returns:
+            requests.Response | CachedResponse: ステータスコードが2xxのレスポンス。
+
+        Raises:
+            requests.exceptions.RequestException: リトライ上限に達しても成功しなかった場合。
+        """
+        if self.cache is None:
+            return self._get_with_retry(url, params, rate_limited)
+
+        key = self.cache.make_key(url, params)
+        entry = self.cache.lookup(key)
+        validators = None
+        if entry:
+            cached, is_fresh, validators = entry
+            if is_fresh:
+                metrics.inc("http_cache", target=_target(url), result="hit")
+                return cached
+
+        response = self._get_with_retry(url, params, rate_limited, headers=validators)
+        if response.status_code == 304 and entry:
+            # 変更なし: キャッシュの本文を再利用し、有効期限を延長する
+            metrics.inc("http_cache", target=_target(url), result="revalidated")
+            self.cache.refresh(key, url)
+            return entry[0]
+        metrics.inc("http_cache", target=_target(url), result="miss")
+        if is_cacheable(url, response):
+            self.cache.store(key, response)
+        return response
+
+    def _get_with_retry(self, url, params=None, rate_limited=False, headers=None):
+        target = _target(url)
+        for attempt in range(self.max_retries + 1):
+            if rate_limited:
+                with metrics.timer("rate_limit_wait_seconds", target=target):
+                    self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                with metrics.timer("http_request_seconds", target=target):
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                metrics.inc("http_responses", target=target, status_class=metrics.status_class(response.status_code))
+                metrics.inc("http_bytes", len(response.content), target=target)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                retry_after = response.headers.get("Retry-After")
+                error = f"HTTP {response.status_code}"
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.inc("http_errors", target=target, error=type(e).__name__)
+                if attempt == self.max_retries:
+                    raise
+                error = e
+
+            wait = self.backoff_sec * (2 ** attempt) + random.uniform(0, self.backoff_sec)
+            if retry_after and retry_after.isdigit():
+                wait = max(wait, int(retry_after))
+            metrics.inc("http_retries", target=target)
+            print(f"[RETRY] {url} ({error}) {wait:.1f}秒後に再試行します ({attempt + 1}/{self.max_retries})")
+            time.sleep(wait)
+
+    def fetch_sample_images(self, affiliate_url):
+        """作品詳細ページをWebスクレイピングし、試し読み画像のURLリストを取得する。"""
+        print(f"--- Webスクレイピング開始: {affiliate_url} ---")
+
+        try:
+            response = self.get(affiliate_url)
+            image_urls = parse_sample_images(response.text)
+            print(f"Webスクレイピング完了。{len(image_urls)}件の画像URLを取得しました。")
+            return image_urls
+
+        except requests.exceptions.RequestException as e:
+            print(f"Webスクレイピング中にエラーが発生しました: {e}")
+            return []
+        except Exception as e:
+            print(f"HTML解析中にエラーが発生しました: {e}")
+            return []
+
+    def _item_list_params(self, **extra):
+        params = {
+            "api_id": DMM_API_ID,
+            "affiliate_id": DMM_AFFILIATE_ID,
+            "operation": "ItemList",
+            "version": "3.00",
+            "site": "DMM.com", # FANZAブックスはDMM.comサイト内のサービスです
+            "service": "book", # FANZAブックスのサービスIDは "book" です
+            "output": "json",
         }
-        response = requests.get(affiliate_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # ★★★ ここが最も重要な修正箇所です ★★★
-        # FANZAブックスの試し読み画像が格納されている要素を特定し、そのURLを抽出します。
-        # 実際のサイト構造に合わせて、以下のセレクタを修正する必要があります。
-        
-        # 仮のセレクタ: 'img.sample-image' のようなクラス名を持つ要素を想定
-        image_tags = soup.select('img.sample-image') 
-        
-        # 抽出ロジック: data-src属性やsrc属性からURLを取得
-        image_urls = []
-        for img in image_tags:
-            # 遅延ロードされている場合は data-src を、そうでない場合は src を使用
-            url = img.get('data-src') or img.get('src')
-            if url and url.startswith('http'):
-                image_urls.append(url)
-        
-        print(f"Webスクレイピング完了。{len(image_urls)}件の画像URLを取得しました。")
-        return image_urls
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Webスクレイピング中にエラーが発生しました: {e}")
-        return []
-    except Exception as e:
-        print(f"HTML解析中にエラーが発生しました: {e}")
-        return []
+        params.update({k: v for k, v in extra.items() if v is not None})
+        return params
+
+    def fetch_item(self, cid):
+        """DMM APIから作品の基本情報のみを取得する（画像URLは空リスト）。失敗時はNoneを返す。"""
+        print(f"--- DMM APIからデータ取得中 (CID: {cid}) ---")
+
+        params = self._item_list_params(cid=cid)
+
+        try:
+            response = self.get(DMM_API_ENDPOINT, params=params, rate_limited=True)
+            data = response.json()
+
+            # APIレスポンスから基本情報を抽出
+            return extract_item_data(data["result"]["items"][0])
+
+        except requests.exceptions.RequestException as e:
+            print(f"DMM APIへのリクエストに失敗しました: {e}")
+            return None
+        except Exception as e:
+            print(f"DMM APIレスポンスの処理中にエラーが発生しました: {e}")
+            return None
+
+    def fetch(self, cid):
+        """DMM APIから作品情報を取得し、Webスクレイピングで試し読み画像URLを取得する。"""
+        extracted_data = self.fetch_item(cid)
+        if extracted_data is None:
+            return None
+
+        # Webスクレイピングで試し読み画像URLを取得
+        extracted_data["image_urls"] = self.fetch_sample_images(extracted_data["affiliate_link"])
+        return extracted_data
+
+    def fetch_many(self, cids):
+        """
+        複数作品の情報を並行して取得する。
+
+        Args:
+            cids (list): CIDのリスト。
+
+        Returns:
+            list: CIDと同じ順序のextracted_dataのリスト。取得に失敗した作品はNoneとなる。
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.fetch, cids))
+
+    def iter_items(self, keyword=None, article=None, article_id=None, gte_date=None, lte_date=None,
+                   sort="date", hits=DMM_MAX_HITS, max_items=None, with_images=False):
+        """
+        ItemListをhits/offsetでページングし、条件に一致する作品をまとめて取得するジェネレーター。
+        1回のAPI呼び出しで最大100件を取得するため、数千件の作品も数十回のHTTPリクエストで取り込める。
+
+        Args:
+            keyword (str): キーワード検索。
+            article (str): 絞り込み対象（例: "genre", "author", "series"）。article_idと組み合わせて使用。
+            article_id (str): 絞り込み対象のID（例: ジャンルID）。
+            gte_date (str): 発売日の下限（例: "2024-01-01T00:00:00"）。
+            lte_date (str): 発売日の上限（例: "2024-01-31T23:59:59"）。
+            sort (str): 並び順（"date", "rank", "review" など）。
+            hits (int): 1ページあたりの取得件数（最大100）。
+            max_items (int): 取得する最大件数。Noneの場合は該当する全件。
+            with_images (bool): Trueの場合、各ページの作品の試し読み画像URLを並行してスクレイピングする。
+
+        Yields:
+            dict: fetch_dmm_data()と同じ構造のextracted_data（"cid"にcontent_idを含む）。
+        """
+        hits = min(hits, DMM_MAX_HITS)
+        offset = 1
+        yielded = 0
+        total = None
+        while offset <= DMM_MAX_OFFSET and (total is None or offset <= total):
+            params = self._item_list_params(
+                keyword=keyword, article=article, article_id=article_id,
+                gte_date=gte_date, lte_date=lte_date, sort=sort, hits=hits, offset=offset,
+            )
+            print(f"--- DMM APIから一括取得中 (offset: {offset}, hits: {hits}) ---")
+            try:
+                response = self.get(DMM_API_ENDPOINT, params=params, rate_limited=True)
+                result = response.json()["result"]
+            except requests.exceptions.RequestException as e:
+                print(f"DMM APIへのリクエストに失敗しました: {e}")
+                return
+            except Exception as e:
+                print(f"DMM APIレスポンスの処理中にエラーが発生しました: {e}")
+                return
+
+            total = int(result.get("total_count", 0))
+            items = result.get("items", [])
+            if not items:
+                return
+
+            page = []
+            for item in items:
+                try:
+                    page.append(extract_item_data(item))
+                except (KeyError, IndexError, TypeError) as e:
+                    # メーカーやタグが未設定の作品など、必要な項目が欠けている作品はスキップ
+                    print(f"[SKIP] {item.get('content_id', '?')}: 必要な項目がありません ({e})")
+
+            if max_items is not None:
+                page = page[:max_items - yielded]
+            if with_images and page:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    urls = executor.map(self.fetch_sample_images, [d["affiliate_link"] for d in page])
+                    for extracted_data, image_urls in zip(page, urls):
+                        extracted_data["image_urls"] = image_urls
+
+            for extracted_data in page:
+                yield extracted_data
+            yielded += len(page)
+            if max_items is not None and yielded >= max_items:
+                return
+            offset += len(items)
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """モジュール共通のDMMClientを返す（初回呼び出し時に生成）。"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = DMMClient()
+        return _default_client
+
+def fetch_sample_images(affiliate_url):
+    """
+    作品詳細ページをWebスクレイピングし、試し読み画像のURLリストを取得する。
+
+    Args:
+        affiliate_url (str): 作品詳細ページのアフィリエイトURL。
+
+    Returns:
+        list: 試し読み画像のURLリスト。
+    """
+    return get_default_client().fetch_sample_images(affiliate_url)
 
 def fetch_dmm_data(cid, use_mock=False):
     """
@@ -61,58 +467,46 @@ def fetch_dmm_data(cid, use_mock=False):
         # モックデータに画像URLが含まれていることを前提とする
         return MOCK_DMM_DATA
 
-    print(f"--- DMM APIからデータ取得中 (CID: {cid}) ---")
-    
-    params = {
-        "api_id": DMM_API_ID,
-        "affiliate_id": DMM_AFFILIATE_ID,
-        "operation": "ItemList",
-        "version": "3.00",
-        "site": "DMM.com", # FANZAブックスはDMM.comサイト内のサービスです
-        "service": "book", # FANZAブックスのサービスIDは "book" です
-        "cid": cid,
-        "output": "json",
-    }
-    
-    try:
-        response = requests.get(DMM_API_ENDPOINT, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        # APIレスポンスから基本情報を抽出
-        item = data["result"]["items"][0]
-        affiliate_url = item["affiliateURL"]
-        
-        extracted_data = {
-            "title": item["title"],
-            "description": item["iteminfo"]["description"],
-            "author": item["iteminfo"]["maker"][0]["name"],
-            "genre": item["iteminfo"]["genre"][0]["name"],
-            "keywords": [tag["name"] for tag in item["iteminfo"]["tag"]],
-            "affiliate_link": affiliate_url,
-            # 画像URLはWebスクレイピングで取得
-            "image_urls": [], 
-        }
-        
-        # Webスクレイピングで試し読み画像URLを取得
-        sample_image_urls = fetch_sample_images(affiliate_url)
-        extracted_data["image_urls"] = sample_image_urls
-        
-        return extracted_data
-        
-    except requests.exceptions.RequestException as e:
-        print(f"DMM APIへのリクエストに失敗しました: {e}")
-        return None
-    except Exception as e:
-        print(f"DMM APIレスポンスの処理中にエラーが発生しました: {e}")
-        return None
+    return get_default_client().fetch(cid)
+
+def fetch_dmm_data_many(cids, use_mock=False):
+    """
+    複数作品の情報を並行して取得する。戻り値はCIDと同じ順序のリスト（失敗した作品はNone）。
+    """
+    if use_mock:
+        return [fetch_dmm_data(cid, use_mock=True) for cid in cids]
+    return get_default_client().fetch_many(cids)
+
+def iter_dmm_items(**filters):
+    """
+    条件に一致する作品をItemListのページングでまとめて取得するジェネレーター。
+    引数はDMMClient.iter_items()を参照。
+    """
+    return get_default_client().iter_items(**filters)
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--compare-parsers", nargs="*", metavar="HTML",
+                    help="保存済みの作品詳細ページで各HTMLパーサーの結果と速度を比較する（省略時は合成ページ）")
+    args = ap.parse_args()
+    if args.compare_parsers is not None:
+        # 実行例: python dmm_api.py --compare-parsers saved_pages/*.html
+        compare_html_parsers(args.compare_parsers)
+        raise SystemExit
+
     # テスト実行
     data = fetch_dmm_data("test_cid_001", use_mock=True)
     print("\n--- 取得データ構造の確認 ---")
     print(data)
-    
+
     # 実際のAPIテスト (config.pyに認証情報を設定後)
     # data = fetch_dmm_data("test_cid_001", use_mock=False)
     # print(data)
+
+    # 複数作品の並行取得テスト
+    # data_list = fetch_dmm_data_many(["cid_001", "cid_002", "cid_003"])
+    # print(data_list)
+
+    # キーワード・日付範囲での一括取得テスト
+    # for data in iter_dmm_items(keyword="異世界", gte_date="2024-01-01T00:00:00", max_items=300):
+    #     print(data["cid"], data["title"])
@@ -1,13 +1,61 @@
-# fanza_capture_preview.py (rev4: async expect_popup + gate fix + per-page center click)
-import asyncio, os, re, argparse, hashlib
+# fanza_capture_preview.py (rev10: per-page timing metrics)
+import asyncio, glob, os, re, argparse, io, json, time, weakref
+from collections import Counter
+from dataclasses import dataclass
+from fnmatch import fnmatch
 from urllib.parse import urlparse
-from playwright.async_api import async_playwright, TimeoutError as PWTimeout, Page, Frame
+import numpy as np
+from PIL import Image
+import metrics
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout, Page, Frame, BrowserContext, Route, Request, WebSocketRoute
 
 VIEWPORT = {"width": 1080, "height": 1920}
 SHOT_DELAY_MS = 800
 MAX_PAGES_DEFAULT = 15
+CONCURRENCY_DEFAULT = 4
 OUT_ROOT = "captures"
 
+# 知覚ハッシュ（dHash）: HASH_SIZE x HASH_SIZE ビット。ハミング距離がしきい値以下なら同じページとみなす
+HASH_SIZE = 16
+DUP_THRESHOLD_DEFAULT = 8
+
+# 待機モード: "fixed" は従来の固定スリープ、"adaptive" はビューアの描画が安定した時点で次へ進む
+WAIT_MODES = ("fixed", "adaptive")
+MAX_WAIT_MS_DEFAULT = 2500   # adaptive時の待機上限
+POLL_MS_DEFAULT = 80         # adaptive時のスクリーンショット比較間隔
+
+# リクエスト遮断: リソース種別またはホスト名（fnmatch形式）で遮断し、ALLOWに一致するホストは常に通す
+# 種別はPlaywrightの request.resource_type の値。ビューアのページ画像は image / canvas 描画用の fetch なので、種別では遮断しない
+BLOCK_RESOURCE_TYPES = ("font", "media", "websocket", "eventsource", "ping", "manifest", "texttrack")
+BLOCK_HOST_PATTERNS = (
+    "*.doubleclick.net", "*.googlesyndication.com", "*.google-analytics.com", "*.googletagmanager.com",
+    "*.googleadservices.com", "*.facebook.net", "*.facebook.com", "*.criteo.com", "*.criteo.net",
+    "*.adnxs.com", "*.twitter.com", "*.ads-twitter.com", "*.hotjar.com",
+)
+ALLOW_HOST_PATTERNS = ()
+
+# 年齢ゲート通過後のストレージ状態（Cookie・localStorage）。有効期限内なら新しいコンテキストに読み込む
+STORAGE_STATE_PATH = os.path.join(".cache", "fanza_storage_state.json")
+STORAGE_STATE_TTL_SEC = 24 * 3600
+
+@dataclass
+class CaptureOptions:
+    max_pages: int = MAX_PAGES_DEFAULT
+    dup_threshold: int = DUP_THRESHOLD_DEFAULT
+    wait_mode: str = "fixed"
+    max_wait_ms: int = MAX_WAIT_MS_DEFAULT
+    poll_ms: int = POLL_MS_DEFAULT
+    block: bool = True
+    block_types: tuple[str, ...] = BLOCK_RESOURCE_TYPES
+    block_hosts: tuple[str, ...] = BLOCK_HOST_PATTERNS
+    allow_hosts: tuple[str, ...] = ALLOW_HOST_PATTERNS
+    storage_state: str | None = STORAGE_STATE_PATH   # Noneで保存・再利用しない
+    state_ttl_sec: int = STORAGE_STATE_TTL_SEC
+
+    @property
+    def adaptive(self) -> bool:
+        return self.wait_mode == "adaptive"
+
 PREVIEW_TRIGGERS = [
     'text=試し読み', 'text=立ち読み', 'text=サンプル',
     'button:has-text("試し読み")', 'button:has-text("立ち読み")'
@@ -40,32 +88,64 @@ def slug_from_url(url: str) -> str:
     tail = os.path.basename(p.path.rstrip('/')) or 'work'
     return re.sub(r'[^a-zA-Z0-9_-]+', '_', tail)
 
-async def click_if_visible(scope: Page | Frame, selectors):
+async def post_click_wait(scope: Page | Frame, opts: CaptureOptions | None, fixed_ms: int):
+    # fixed: 固定スリープ / adaptive: クリックで発生した読み込みの完了（load）を待ち、短く待機して次へ
+    if opts is None or not opts.adaptive:
+        await scope.wait_for_timeout(fixed_ms)
+        return
+    try:
+        await scope.wait_for_load_state("load", timeout=opts.max_wait_ms)
+    except PWTimeout:
+        pass
+    await scope.wait_for_timeout(opts.poll_ms)
+
+async def click_if_visible(scope: Page | Frame, selectors, opts: CaptureOptions | None = None):
     for sel in selectors:
         try:
             loc = scope.locator(sel).first
             if await loc.count() > 0 and await loc.is_visible():
                 await loc.click()
-                await scope.wait_for_timeout(500)
+                await post_click_wait(scope, opts, 500)
+                return True
+        except Exception:
+            pass
+    return False
+
+async def gate_visible(page: Page) -> bool:
+    for sel in GATE_OK:
+        try:
+            loc = page.locator(sel).first
+            if await loc.count() > 0 and await loc.is_visible():
                 return True
         except Exception:
             pass
     return False
 
-async def bypass_age_gate(page: Page):
+async def bypass_age_gate(page: Page, opts: CaptureOptions | None = None, state: "StorageState | None" = None):
+    # 保存済みの状態が有効でゲートが表示されていなければ、クリック・キー操作を丸ごと省略する
+    if state is not None and state.loaded(page.context):
+        if not await gate_visible(page):
+            state.skipped += 1
+            metrics.inc("capture_age_gate", result="skipped")
+            return
+        # 状態を読み込んだのにゲートが出た＝サイト側で失効している。破棄して通常の突破後に保存し直す
+        state.invalidate()
+    metrics.inc("capture_age_gate", result="bypassed")
     # 複数回トライ（サイト側で段階がある場合あり）
     for _ in range(3):
-        clicked = await click_if_visible(page, GATE_OK)
+        clicked = await click_if_visible(page, GATE_OK, opts)
         if clicked:
-            await page.wait_for_timeout(600)
+            await post_click_wait(page, opts, 600)
         # キー操作でも突破を試す
         try:
             await page.keyboard.press("Enter")
-            await page.wait_for_timeout(400)
+            await post_click_wait(page, opts, 400)
             await page.keyboard.press("Space")
-            await page.wait_for_timeout(400)
+            await post_click_wait(page, opts, 400)
         except Exception:
             pass
+    if state is not None and not await gate_visible(page):
+        await state.save(page.context)
 
 async def find_viewer(scope: Page | Frame):
     # iframe内を優先的に探索
@@ -101,97 +181,469 @@ async def center_click(frame, viewer):
     rel_y = box["height"] * 0.5
     await viewer.click(position={"x": rel_x, "y": rel_y})
 
-async def left_advance(frame, viewer):
-    # 左半分クリックで次ページ（要素相対座標で）
+async def left_advance(frame, viewer, opts: CaptureOptions, before: np.ndarray | None = None) -> tuple[bool, float]:
+    # 左半分クリックで次ページ（要素相対座標で）。戻り値は (送れたか, 待機ms)
     await viewer.scroll_into_view_if_needed()
     box = await viewer.bounding_box()
     if not box:
-        return False
+        return False, 0.0
     rel_x = box["width"] * 0.25
     rel_y = box["height"] * 0.5
     await viewer.click(position={"x": rel_x, "y": rel_y})
+    if opts.adaptive:
+        # 表示が変わり、かつ描画が落ち着くまで待つ（最終ページなどで変わらない場合は上限まで）
+        _, _, waited = await settle(frame, viewer, opts, 0, changed_from=before)
+        return True, waited
     await (frame.page if hasattr(frame, "page") else frame).wait_for_timeout(SHOT_DELAY_MS)
-    return True
+    return True, float(SHOT_DELAY_MS)
 
-def sha1file(path):
-    h = hashlib.sha1()
-    with open(path, "rb") as f:
-        h.update(f.read())
-    return h.hexdigest()
+def perceptual_hash(png: bytes) -> np.ndarray:
+    # PNGバイト列をグレースケールで展開し、(HASH_SIZE+1) x HASH_SIZE ブロックの平均輝度の横方向差分をビット化（dHash）
+    gray = np.asarray(Image.open(io.BytesIO(png)).convert("L"), dtype=np.float32)
+    h, w = gray.shape
+    bh, bw = h // HASH_SIZE, w // (HASH_SIZE + 1)
+    blocks = gray[:bh * HASH_SIZE, :bw * (HASH_SIZE + 1)].reshape(HASH_SIZE, bh, HASH_SIZE + 1, bw).mean(axis=(1, 3))
+    return (blocks[:, 1:] > blocks[:, :-1]).ravel()
 
-async def main(url: str, max_pages: int, headful: bool):
-    folder = os.path.join(OUT_ROOT, slug_from_url(url))
-    os.makedirs(folder, exist_ok=True)
+class FrameIndex:
+    # 1作品分の撮影済みページのハッシュ一覧。連続ページだけでなく全ページとの重複を判定する
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.hashes = np.empty((0, HASH_SIZE * HASH_SIZE), dtype=bool)
+        self.paths: list[str] = []
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=not headful)
-        ctx = await browser.new_context(viewport=VIEWPORT)
-        page = await ctx.new_page()
+    def distances(self, h: np.ndarray) -> np.ndarray:
+        return np.count_nonzero(self.hashes != h, axis=1)
 
-        # 1) アクセス
-        await page.goto(url, wait_until="domcontentloaded")
+    def same_as_last(self, h: np.ndarray) -> bool:
+        return len(self.paths) > 0 and int(np.count_nonzero(self.hashes[-1] != h)) <= self.threshold
 
-        # 2) 年齢ゲート突破（複数回）
-        await bypass_age_gate(page)
+    def find_duplicate(self, h: np.ndarray) -> str | None:
+        if not self.paths:
+            return None
+        d = self.distances(h)
+        i = int(d.argmin())
+        return self.paths[i] if d[i] <= self.threshold else None
 
-        # 3) 試し読み起動（ポップアップ対応：async with）
-        view: Page = page
+    def add(self, h: np.ndarray, path: str):
+        self.hashes = np.vstack([self.hashes, h])
+        self.paths.append(path)
+
+async def settle(frame, viewer, opts: CaptureOptions, fixed_ms: int,
+                 changed_from: np.ndarray | None = None) -> tuple[bytes, np.ndarray, float]:
+    # ビューアのスクリーンショットを撮る。戻り値は (PNG, 知覚ハッシュ, 撮影までの待機ms)
+    # fixed: fixed_ms待ってから撮影
+    # adaptive: 連続する2枚のスクリーンショットが完全一致したら安定とみなす（上限 max_wait_ms）
+    #           changed_from を指定した場合は、まずそのハッシュから表示が変わるのを待つ
+    started = time.perf_counter()
+    if not opts.adaptive:
+        if fixed_ms:
+            await frame.wait_for_timeout(fixed_ms)
+        png = await viewer.screenshot()
+        return png, await asyncio.to_thread(perceptual_hash, png), (time.perf_counter() - started) * 1000
+
+    deadline = started + opts.max_wait_ms / 1000
+    png = await viewer.screenshot()
+    h = await asyncio.to_thread(perceptual_hash, png)
+    changed = changed_from is None or bool(np.any(h != changed_from))
+    while time.perf_counter() < deadline:
+        await frame.wait_for_timeout(opts.poll_ms)
+        next_png = await viewer.screenshot()
+        stable = next_png == png
+        png = next_png
+        if stable and changed:
+            break
+        h = await asyncio.to_thread(perceptual_hash, png)
+        if not changed:
+            changed = bool(np.any(h != changed_from))
+    return png, h, (time.perf_counter() - started) * 1000
+
+class StorageState:
+    # 年齢ゲート通過後のストレージ状態をファイルに保存し、新しいコンテキストで再利用する
+    # 有効期限は保存からのTTLと、Cookieの最も早い期限のうち早い方
+    def __init__(self, path: str, ttl_sec: int = STORAGE_STATE_TTL_SEC):
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.skipped = 0
+        self.saved = 0
+        self._lock = asyncio.Lock()
+        self._loaded_into: set[int] = set()   # 保存済みの状態を読み込んで作成したコンテキストのid
+
+    def expires_at(self) -> float:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            saved_at = os.path.getmtime(self.path)
+        except (OSError, ValueError):
+            return 0.0
+        cookie_expiry = [c["expires"] for c in data.get("cookies", []) if c.get("expires", -1) > 0]
+        return min([saved_at + self.ttl_sec] + cookie_expiry)
+
+    def valid(self) -> bool:
+        return time.time() < self.expires_at()
+
+    async def new_context(self, browser, **kwargs) -> BrowserContext:
+        if self.valid():
+            ctx = await browser.new_context(storage_state=self.path, **kwargs)
+            self._loaded_into.add(id(ctx))
+            return ctx
+        return await browser.new_context(**kwargs)
+
+    def loaded(self, ctx: BrowserContext) -> bool:
+        # このコンテキストが有効な状態を持っている（読み込み済み、またはゲートを通過して保存済み）か
+        return id(ctx) in self._loaded_into and self.valid()
+
+    def invalidate(self):
+        self._loaded_into.clear()
         try:
-            # まずpopup期待で試す
-            async with page.expect_popup() as popup_info:
-                await click_if_visible(page, PREVIEW_TRIGGERS)
-            popup = await popup_info.value
-            if popup:
-                view = popup
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    async def save(self, ctx: BrowserContext):
+        # 同時に複数の作品がゲートを通過しても、書き込みは1つずつ
+        async with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            await ctx.storage_state(path=tmp)
+            os.replace(tmp, self.path)
+            self._loaded_into.add(id(ctx))
+            self.saved += 1
+
+def host_matches(host: str, patterns) -> bool:
+    # "*.example.com" は example.com 自体にも一致させる
+    return any(fnmatch(host, p) or (p.startswith("*.") and host == p[2:]) for p in patterns)
+
+# WebSocketはroute()を通らないためroute_web_socket()で遮断する。解除できないのでコンテキストごとに1回だけ登録し、
+# その時点でattachされているRequestFilterに振り分ける
+_websocket_filters: "weakref.WeakKeyDictionary[BrowserContext, RequestFilter | None]" = weakref.WeakKeyDictionary()
+
+async def _route_websocket(ctx: BrowserContext, ws: WebSocketRoute):
+    net = _websocket_filters.get(ctx)
+    if net is None:
+        ws.connect_to_server()
+    else:
+        await net.handle_websocket(ws)
+
+class RequestFilter:
+    # コンテキスト単位のリクエスト遮断。遮断したリクエスト数と、通したリクエストの転送量を集計する
+    # 遮断したリクエストは転送されないためサイズが分からない。削減量は compare_blocking（--compare-blocking）で計測する
+    def __init__(self, opts: CaptureOptions):
+        self.opts = opts
+        self.requests = 0
+        self.blocked = 0
+        self.blocked_by: Counter[str] = Counter()
+        self.bytes_loaded = 0
+
+    def block_reason(self, request: Request) -> str | None:
+        return self._reason(request.url, request.resource_type)
+
+    def _reason(self, url: str, resource_type: str) -> str | None:
+        host = urlparse(url).hostname or ""
+        if host_matches(host, self.opts.allow_hosts):
+            return None
+        if resource_type in self.opts.block_types:
+            return f"type:{resource_type}"
+        if host_matches(host, self.opts.block_hosts):
+            return f"host:{host}"
+        return None
+
+    async def handle(self, route: Route, request: Request):
+        self.requests += 1
+        reason = self.block_reason(request)
+        if reason:
+            self.blocked += 1
+            self.blocked_by[reason] += 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    async def handle_websocket(self, ws: WebSocketRoute):
+        self.requests += 1
+        reason = self._reason(ws.url, "websocket")
+        if reason:
+            self.blocked += 1
+            self.blocked_by[reason] += 1
+            await ws.close()
+        else:
+            ws.connect_to_server()
+
+    async def on_finished(self, request: Request):
+        try:
+            sizes = await request.sizes()
+            self.bytes_loaded += sizes["responseBodySize"] + sizes["responseHeadersSize"]
         except Exception:
-            # ポップアップが無い or 既に同タブ遷移するタイプ
-            clicked = await click_if_visible(page, PREVIEW_TRIGGERS)
-            if clicked:
-                view = page  # 同タブ
+            pass
+
+    async def attach(self, ctx: BrowserContext):
+        if self.opts.block:
+            await ctx.route("**/*", self.handle)
+            if ctx not in _websocket_filters:
+                await ctx.route_web_socket(re.compile(".*"), lambda ws: _route_websocket(ctx, ws))
+            _websocket_filters[ctx] = self
+        ctx.on("requestfinished", self.on_finished)
+
+    async def detach(self, ctx: BrowserContext):
+        if self.opts.block:
+            await ctx.unroute("**/*", self.handle)
+            _websocket_filters[ctx] = None
+        ctx.remove_listener("requestfinished", self.on_finished)
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "blocked_requests": self.blocked,
+            "blocked_by": dict(self.blocked_by.most_common()),
+            "bytes_loaded": self.bytes_loaded,
+        }
+
+def write_bytes(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def load_urls(path: str) -> list[str]:
+    # 1行1URL、空行と「#」で始まる行は無視
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+def clear_pages(folder: str):
+    # 以前のキャプチャで保存したページ画像（page_*.png）を削除する
+    for path in glob.glob(os.path.join(folder, "page_*.png")):
+        os.remove(path)
+
+async def open_viewer(page: Page, url: str, opts: CaptureOptions, state: StorageState | None = None) -> Page:
+    # 1) アクセス
+    await page.goto(url, wait_until="domcontentloaded")
+
+    # 2) 年齢ゲート突破（複数回）
+    await bypass_age_gate(page, opts, state)
 
-        await view.wait_for_timeout(1200)
+    # 3) 試し読み起動（ポップアップ対応：async with）
+    view: Page = page
+    try:
+        # まずpopup期待で試す
+        async with page.expect_popup() as popup_info:
+            await click_if_visible(page, PREVIEW_TRIGGERS, opts)
+        popup = await popup_info.value
+        if popup:
+            view = popup
+    except Exception:
+        # ポップアップが無い or 既に同タブ遷移するタイプ
+        clicked = await click_if_visible(page, PREVIEW_TRIGGERS, opts)
+        if clicked:
+            view = page  # 同タブ
+
+    await post_click_wait(view, opts, 1200)
+
+    # 念のため再度ゲート突破（ビューア側で出る場合あり）
+    await bypass_age_gate(view, opts, state)
+    return view
+
+async def capture_pages(frame, viewer, folder: str, opts: CaptureOptions) -> tuple[int, list[float]]:
+    # スクリーンショットはメモリ上で知覚ハッシュを計算し、既存ページと異なる場合のみ書き出す
+    # 戻り値は (保存ページ数, ステップごとの待機ms)
+    index = FrameIndex(opts.dup_threshold)
+    waits: list[float] = []
+    for i in range(1, opts.max_pages + 1):
+        step_started = time.perf_counter()
+        # ★ 毎ページ開始時に中央クリックでUIを消す
+        await center_click(frame, viewer)
+        png, curr_hash, ui_wait = await settle(frame, viewer, opts, 200)
+        turn_wait = 0.0
+
+        if index.same_as_last(curr_hash):
+            # 直前と同じ画像 → 左クリックで送り再撮影
+            _, retry_wait = await left_advance(frame, viewer, opts, before=curr_hash)
+            png, curr_hash, shot_wait = await settle(frame, viewer, opts, 0)
+            turn_wait += retry_wait + shot_wait
+            if index.same_as_last(curr_hash):
+                print(f"[INFO] same image again at {i}, stopping.")
+                break
+
+        dup = index.find_duplicate(curr_hash)
+        if dup:
+            # 以前のページと同じ（見開きの戻り・アニメーション途中など）→ 保存せず次へ
+            print(f"[SKIP] step {i} duplicates {dup}")
+            metrics.inc("capture_duplicates")
+        else:
+            path = os.path.join(folder, f"page_{len(index.paths) + 1:02d}.png")
+            await asyncio.to_thread(write_bytes, path, png)
+            index.add(curr_hash, path)
+            print(f"[SHOT] {path}")
 
-        # 念のため再度ゲート突破（ビューア側で出る場合あり）
-        await bypass_age_gate(view)
+        # 次ページへ
+        moved, advance_wait = await left_advance(frame, viewer, opts, before=curr_hash)
+        turn_wait += advance_wait
+        waits.append(ui_wait + turn_wait)
+        metrics.observe("capture_page_seconds", time.perf_counter() - step_started, wait_mode=opts.wait_mode)
+        metrics.observe("capture_wait_seconds", (ui_wait + turn_wait) / 1000, wait_mode=opts.wait_mode)
+        print(f"[WAIT] step {i} ({opts.wait_mode}): ui {ui_wait:.0f}ms + turn {turn_wait:.0f}ms")
+        if not moved:
+            print("[INFO] cannot advance by left click, stopping.")
+            break
+    return len(index.paths), waits
+
+async def capture_work(ctx: BrowserContext, url: str, opts: CaptureOptions, state: StorageState | None = None) -> dict:
+    # 1作品分のキャプチャ。失敗しても例外は投げず、結果を辞書で返す
+    slug = slug_from_url(url)
+    folder = os.path.join(OUT_ROOT, slug)
+    os.makedirs(folder, exist_ok=True)
+    result = {"url": url, "slug": slug, "folder": folder, "status": "OK", "pages": 0, "error": "",
+              "elapsed_sec": 0.0, "wait_ms_total": 0.0, "wait_ms_per_step": 0.0}
+    started = time.perf_counter()
+    net = RequestFilter(opts)
+    try:
+        # 前回の撮影のページ画像が残っていると、今回より枚数が少ない場合に古いページが混ざるため消しておく
+        clear_pages(folder)
+        # ルーティングの登録失敗もこの作品のNGとして扱い、他の作品のキャプチャを止めない
+        await net.attach(ctx)
+        page = await ctx.new_page()
+        view = await open_viewer(page, url, opts, state)
 
         # 4) ビューア特定
         frame, viewer = await find_viewer(view)
-        await frame.wait_for_timeout(600)
-
-        prev_hash = None
-        for i in range(1, max_pages + 1):
-            # ★ 毎ページ開始時に中央クリックでUIを消す
-            await center_click(frame, viewer)
-            await frame.wait_for_timeout(200)
-
-            path = os.path.join(folder, f"page_{i:02d}.png")
-            await viewer.screenshot(path=path)
-            curr_hash = sha1file(path)
-
-            if prev_hash and curr_hash == prev_hash:
-                # 同じ画像 → 左クリックで送り再撮影
-                await left_advance(frame, viewer)
-                await viewer.screenshot(path=path)
-                curr_hash2 = sha1file(path)
-                if curr_hash2 == curr_hash:
-                    print(f"[INFO] same image again at {i}, stopping.")
-                    break
+        if not opts.adaptive:
+            # adaptive時は最初の撮影で描画の安定を待つため不要
+            await frame.wait_for_timeout(600)
 
-            print(f"[SHOT] {path}")
-            prev_hash = curr_hash
+        result["pages"], waits = await capture_pages(frame, viewer, folder, opts)
+        result["wait_ms_total"] = round(sum(waits))
+        result["wait_ms_per_step"] = round(sum(waits) / len(waits)) if waits else 0
+        if result["pages"] == 0:
+            result["status"] = "NG"
+            result["error"] = "no pages captured"
+    except Exception as e:
+        result["status"] = "NG"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        # ポップアップを含め、この作品で開いたページを閉じてコンテキストを次の作品に回す
+        for p in list(ctx.pages):
+            try:
+                await p.close()
+            except Exception:
+                pass
+        try:
+            await net.detach(ctx)
+        except Exception:
+            pass
+    result.update(net.summary())
+    result["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    metrics.observe("capture_work_seconds", result["elapsed_sec"], status=result["status"])
+    metrics.inc("capture_works", status=result["status"])
+    metrics.inc("capture_pages", result["pages"])
+    metrics.inc("capture_requests", result["requests"] - result["blocked_requests"], result="loaded")
+    metrics.inc("capture_requests", result["blocked_requests"], result="blocked")
+    metrics.inc("capture_bytes", result["bytes_loaded"])
+    if result["status"] == "OK":
+        print(f"[OK] {slug}: {result['pages']} pages ({result['elapsed_sec']}s, "
+              f"wait {result['wait_ms_total']}ms total / {result['wait_ms_per_step']}ms per step)")
+    else:
+        print(f"[NG] {slug}: {result['error']}")
+    if opts.block:
+        print(f"[NET] {slug}: blocked {result['blocked_requests']}/{result['requests']} requests, "
+              f"loaded {result['bytes_loaded'] / 1024:.0f} KB")
+    return result
 
-            # 次ページへ
-            moved = await left_advance(frame, viewer)
-            if not moved:
-                print("[INFO] cannot advance by left click, stopping.")
-                break
+async def capture_many(urls: list[str], opts: CaptureOptions, headful: bool, concurrency: int = CONCURRENCY_DEFAULT) -> list[dict]:
+    # ブラウザは1つだけ起動し、N個のコンテキストをプールして複数作品を同時にキャプチャ
+    results: list[dict] = [None] * len(urls)
+    started = time.perf_counter()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not headful)
+        state = StorageState(opts.storage_state, opts.state_ttl_sec) if opts.storage_state else None
+        pool: asyncio.Queue[BrowserContext] = asyncio.Queue()
+        for _ in range(max(1, min(concurrency, len(urls)))):
+            if state is not None:
+                pool.put_nowait(await state.new_context(browser, viewport=VIEWPORT))
+            else:
+                pool.put_nowait(await browser.new_context(viewport=VIEWPORT))
 
+        async def worker(index: int, url: str):
+            ctx = await pool.get()
+            try:
+                results[index] = await capture_work(ctx, url, opts, state)
+            finally:
+                pool.put_nowait(ctx)
+
+        await asyncio.gather(*(worker(i, url) for i, url in enumerate(urls)))
         await browser.close()
 
+    ok = sum(1 for r in results if r["status"] == "OK")
+    print(f"[DONE] {ok}/{len(results)} works captured in {time.perf_counter() - started:.1f}s")
+    if state is not None:
+        print(f"[STATE] age gate skipped {state.skipped} times, state saved {state.saved} times ({state.path})")
+    return results
+
+async def compare_blocking(url: str, opts: CaptureOptions, headful: bool = False) -> list[dict]:
+    # 同じページを遮断なし／ありで読み込み、読み込み時間・リクエスト数・転送量を比較する
+    rows = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not headful)
+        for block in (False, True):
+            run_opts = CaptureOptions(**{**opts.__dict__, "block": block})
+            ctx = await browser.new_context(viewport=VIEWPORT)
+            net = RequestFilter(run_opts)
+            await net.attach(ctx)
+            page = await ctx.new_page()
+            started = time.perf_counter()
+            await page.goto(url, wait_until="load")
+            load_ms = (time.perf_counter() - started) * 1000
+            await ctx.close()
+            rows.append({"block": block, "load_ms": round(load_ms), **net.summary()})
+        await browser.close()
+
+    base, blocked = rows
+    print(f"[COMPARE] {url}")
+    for r in rows:
+        print(f"  block={str(r['block']):5s} load {r['load_ms']:6d}ms  requests {r['requests'] - r['blocked_requests']:3d}  "
+              f"loaded {r['bytes_loaded'] / 1024:8.0f} KB")
+    print(f"  saved: {base['load_ms'] - blocked['load_ms']}ms, {blocked['blocked_requests']} requests, "
+          f"{(base['bytes_loaded'] - blocked['bytes_loaded']) / 1024:.0f} KB")
+    return rows
+
+async def main(url: str, max_pages: int, headful: bool):
+    return await capture_many([url], CaptureOptions(max_pages=max_pages), headful, concurrency=1)
+
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--url", required=True, help="FANZAブックス 作品URL（試し読み可能）")
+    ap.add_argument("--url", action="append", default=[], help="FANZAブックス 作品URL（試し読み可能、複数指定可）")
+    ap.add_argument("--url-file", help="作品URLのリストファイル（1行1URL）")
     ap.add_argument("--pages", type=int, default=MAX_PAGES_DEFAULT)
+    ap.add_argument("--dup-threshold", type=int, default=DUP_THRESHOLD_DEFAULT,
+                    help=f"同一ページとみなす知覚ハッシュのハミング距離（0-{HASH_SIZE * HASH_SIZE}）")
+    ap.add_argument("--wait", choices=WAIT_MODES, default="fixed",
+                    help="ページ送りの待機方法（fixed: 固定スリープ / adaptive: 描画が安定したら次へ）")
+    ap.add_argument("--max-wait-ms", type=int, default=MAX_WAIT_MS_DEFAULT, help="adaptive時の待機上限（ms）")
+    ap.add_argument("--no-block", action="store_true", help="広告・計測・フォント・WebSocket等のリクエスト遮断を無効にする")
+    ap.add_argument("--block-host", action="append", default=[], help="追加で遮断するホスト（fnmatch形式、複数指定可）")
+    ap.add_argument("--allow-host", action="append", default=[], help="常に許可するホスト（fnmatch形式、複数指定可）")
+    ap.add_argument("--compare-blocking", action="store_true", help="最初のURLを遮断なし／ありで読み込み、差分を表示して終了")
+    ap.add_argument("--state", default=STORAGE_STATE_PATH, help="年齢ゲート通過後のストレージ状態の保存先")
+    ap.add_argument("--state-ttl", type=int, default=STORAGE_STATE_TTL_SEC, help="保存した状態の有効期限（秒）")
+    ap.add_argument("--no-state", action="store_true", help="ストレージ状態を保存・再利用しない（毎回ゲートを突破する）")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY_DEFAULT, help="同時にキャプチャする作品数（コンテキスト数）")
+    ap.add_argument("--metrics", action="store_true", help="ページごとのキャプチャ時間などを計測し、JSONとPrometheus形式で書き出す")
+    ap.add_argument("--report", help="作品ごとの結果をJSONで書き出すファイル名")
     ap.add_argument("--show", action="store_true", help="ブラウザを表示（デバッグ用）")
     args = ap.parse_args()
-    asyncio.run(main(args.url, args.pages, args.show))
+    metrics.enable(args.metrics or metrics.is_enabled())
+
+    urls = list(args.url)
+    if args.url_file:
+        urls += load_urls(args.url_file)
+    if not urls:
+        ap.error("--url または --url-file を指定してください")
+
+    opts = CaptureOptions(max_pages=args.pages, dup_threshold=args.dup_threshold,
+                          wait_mode=args.wait, max_wait_ms=args.max_wait_ms, block=not args.no_block,
+                          block_hosts=BLOCK_HOST_PATTERNS + tuple(args.block_host),
+                          allow_hosts=ALLOW_HOST_PATTERNS + tuple(args.allow_host),
+                          storage_state=None if args.no_state else args.state, state_ttl_sec=args.state_ttl)
+    if args.compare_blocking:
+        asyncio.run(compare_blocking(urls[0], opts, args.show))
+        raise SystemExit
+    results = asyncio.run(capture_many(urls, opts, args.show, args.concurrency))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    metrics.dump()
@@ -1,34 +1,84 @@
 import os
-import pandas as pd
+import csv
+import argparse
+import functools
+import threading
+import time
+from collections import Counter
 import json
-from openai import OpenAI
 from dmm_api import fetch_dmm_data
-from config import MAX_FRAMES, LLM_MODEL, OLLAMA_BASE_URL
-
-# --- LLMクライアントの初期化 ---
-try:
-    # OllamaのローカルAPIを使用するように設定
-    # OllamaがOpenAI互換APIを提供しているため、OpenAIクライアントを再利用
-    client = OpenAI(
-        base_url=OLLAMA_BASE_URL,
-        api_key="ollama" # OllamaではAPIキーは不要だが、OpenAIクライアントの要件を満たすためにダミーを設定
-    )
-except Exception as e:
-    print(f"LLMクライアントの初期化に失敗しました: {e}")
-    print("config.pyのOLLAMA_BASE_URLが正しいか確認してください。")
-    exit()
+from llm_cache import LLMCache
+from llm_stream import ClipStreamParser, MalformedOutputError, validate_clip
+from frame_ranking import load_capture_images
+from asset_store import localize_csv
+from job_journal import JobJournal, work_fingerprint
+import metrics
+from rule_based_text_generator import generate_rule_based_text
+from config import (
+    MAX_FRAMES, LLM_MODEL, OLLAMA_BASE_URL, LLM_CACHE_ENABLED, METRICS_ENABLED,
+    LLM_STREAMING, LLM_STREAM_MAX_CHARS, LLM_CLIP_MAX_TOP_CHARS, LLM_CLIP_MAX_BOTTOM_CHARS,
+    LLM_PROMPT_LAYOUT, LLM_DESCRIPTION_TOKEN_BUDGET, LLM_KEEP_ALIVE, LLM_WARMUP, LLM_REQUEST_TIMEOUT_SEC,
+)
 
-# --- LLMを用いたテキスト生成関数 ---
-def generate_marketing_text(dmm_data, num_clips):
-    """LLMを用いてマーケティングテキストを生成する"""
+DEFAULT_OUTPUT_FILENAME = "canva_import_data.csv"
+
+# --- LLMクライアント ---
+# openaiのimportとクライアント生成は、最初にLLMを呼び出すときまで遅延させる
+# （モックデータやルールベース生成のみの実行、短命のワーカープロセスの起動を軽くするため）
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client(timeout=None):
+    """
+    OpenAI互換のLLMクライアントを返す（初回呼び出し時に生成し、以降は同じクライアントを共有する）。
     
-    # DMMデータがNoneの場合はフォールバック
-    if not dmm_data:
-        return [
-            {"clip_index": i + 1, "top_text": "【データエラー】", "bottom_text": "DMMデータが取得できませんでした。"}
-            for i in range(num_clips)
-        ]
+    Args:
+        timeout (float): 指定した場合、このタイムアウトでリトライしない設定のクライアントを返す。
+        
+    Raises:
+        Exception: クライアントの生成に失敗した場合。呼び出し元ではフォールバックのテキストに切り替わる。
+    """
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            from openai import OpenAI
+            try:
+                # OllamaのローカルAPIを使用するように設定
+                # OllamaがOpenAI互換APIを提供しているため、OpenAIクライアントを再利用
+                _llm_client = OpenAI(
+                    base_url=OLLAMA_BASE_URL,
+                    api_key="ollama" # OllamaではAPIキーは不要だが、OpenAIクライアントの要件を満たすためにダミーを設定
+                )
+            except Exception as e:
+                print(f"LLMクライアントの初期化に失敗しました: {e}")
+                print("config.pyのOLLAMA_BASE_URLが正しいか確認してください。")
+                raise
+    return _llm_client if timeout is None else _llm_client.with_options(timeout=timeout, max_retries=0)
 
+# --- LLM生成結果キャッシュ ---
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """LLM生成結果キャッシュを返す（初回呼び出し時に生成）。無効化されている場合はNone。"""
+    global _llm_cache
+    with _llm_cache_lock:
+        if LLM_CACHE_ENABLED and _llm_cache is None:
+            _llm_cache = LLMCache()
+        return _llm_cache
+
+def llm_request_options():
+    """chat.completions.createに追加で渡すオプション（Ollamaのkeep_alive）を返す。"""
+    return {"extra_body": {"keep_alive": LLM_KEEP_ALIVE}} if LLM_KEEP_ALIVE else {}
+
+# --- LLMを用いたテキスト生成関数 ---
+def build_messages(dmm_data, num_clips, layout=None):
+    """
+    LLMに送信するメッセージ（システムプロンプト + ユーザー指示）を組み立てる。
+    layoutがNoneの場合はconfig.LLM_PROMPT_LAYOUTの形式（"legacy" / "prefix"）。
+    """
+    if (layout or LLM_PROMPT_LAYOUT) == "prefix":
+        return build_prefix_messages(dmm_data, num_clips)
     system_prompt = f"""
 あなたは、YouTubeショート動画の視聴者の興味を最大限に惹きつけるプロのコピーライターです。
 与えられた動画のタイトルとあらすじ（説明文）を元に、以下の要件を満たすテキストを生成してください。
@@ -65,86 +115,331 @@ def generate_marketing_text(dmm_data, num_clips):
 ]
 ```
 """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "上記の要件に基づき、ショート動画のテキストを生成してください。"}
+    ]
+
+def estimate_tokens(text):
+    """トークン数を推定する（日本語などの非ASCII文字は1文字1トークン、ASCIIは4文字1トークン）。"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + -(-(len(text) - non_ascii) // 4)
+
+def trim_to_token_budget(text, budget):
+    """
+    textを推定トークン数budget以内に切り詰める。可能であれば文の区切り（。！？）で切り、末尾に「…」を付ける。
+    budgetが0以下の場合、または収まっている場合はそのまま返す。
+    """
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+    cut = 0
+    tokens = 0.0
+    for cut, ch in enumerate(text):
+        tokens += 1 if ord(ch) > 127 else 0.25
+        if tokens > budget - 1:  # 「…」の分を残す
+            break
+    trimmed = text[:cut]
+    sentence_end = max(trimmed.rfind(mark) for mark in "。！？!?\n")
+    if sentence_end >= len(trimmed) // 2:
+        trimmed = trimmed[:sentence_end + 1]
+    return trimmed.rstrip() + "…"
+
+@functools.lru_cache(maxsize=None)
+def prefix_system_prompt(num_clips):
+    """
+    prefix形式のシステムプロンプト。作品ごとのデータを含まないため、同じクリップ数であれば全作品で同一の文字列になる。
+    """
+    return f"""
+あなたは、YouTubeショート動画の視聴者の興味を最大限に惹きつけるプロのコピーライターです。
+ユーザーから与えられる動画のタイトルとあらすじ（説明文）を元に、以下の要件を満たすテキストを生成してください。
+
+## 要件
+1.  **構成**: 全{num_clips}つのクリップ分のテキストを生成してください。
+2.  **テキスト形式**: 各クリップは「上段テキスト（キャッチーな見出し）」と「下段テキスト（詳細な説明）」の2つの要素で構成されます。
+3.  **フック**: 最初のクリップは、視聴者が思わずタップしてしまうような、最も衝撃的で興味を惹く「フック」となる内容にしてください。
+4.  **展開**: 2つ目以降のクリップは、物語の核心に迫りつつ、情報を小出しにして期待感を高めてください。
+5.  **クリフハンガー**: 最後のクリップ（{num_clips}つ目）は、物語の結末や最も重要な情報に触れず、**「続きは本編で！」**と思わせるような**クリフハンガー**で終わらせてください。
+6.  **Canvaの制約**: Canvaの一括作成機能で表示されることを考慮し、**下段テキストは1行あたり15文字程度、最大4行程度**に収まるように、簡潔に記述してください。改行は「\n」を使用してください。
+7.  **出力形式**: 必ずJSON形式で出力してください。JSONのルート要素は配列（リスト）にしてください。
+
+## 出力JSON形式
+```json
+[
+    {{
+        "clip_index": 1,
+        "top_text": "フックとなるキャッチーな見出し",
+        "bottom_text": "フックの詳細な説明文\\n（15文字程度で改行）"
+    }},
+    // ... クリップ {num_clips} まで続く
+    {{
+        "clip_index": {num_clips},
+        "top_text": "クリフハンガーとなる見出し",
+        "bottom_text": "続きを見たくなるような煽り文\\n（15文字程度で改行）"
+    }}
+]
+```
+"""
+
+def build_prefix_messages(dmm_data, num_clips):
+    """
+    prefix形式のメッセージを組み立てる。共通の指示（システムプロンプト）を先頭に、作品ごとのデータを最後に置くことで、
+    LLMサーバーが共通部分のKVキャッシュを作品間で再利用できるようにする。
+    """
+    description = trim_to_token_budget(dmm_data.get('description', '説明なし'), LLM_DESCRIPTION_TOKEN_BUDGET)
+    user_prompt = f"""## 入力データ
+- タイトル: {dmm_data.get('title', 'タイトルなし')}
+- あらすじ（説明文）: {description}
+- ジャンル: {dmm_data.get('genre', 'ジャンルなし')}
+- キーワード: {', '.join(dmm_data.get('keywords', []))}
+
+上記の入力データについて、要件に基づきショート動画のテキストを生成してください。"""
+    return [
+        {"role": "system", "content": prefix_system_prompt(num_clips)},
+        {"role": "user", "content": user_prompt},
+    ]
+
+def warm_up_llm(num_clips, layout=None, timeout=LLM_REQUEST_TIMEOUT_SEC):
+    """
+    バッチ開始時に1トークンだけ生成する短いリクエストを送り、モデルを読み込ませておく（keep_aliveで保持される）。
+    prefix形式では共通のシステムプロンプトも処理されるため、以降のリクエストはKVキャッシュを再利用できる。
     
+    Returns:
+        float: ウォームアップにかかった秒数。失敗した場合はNone（バッチ処理は続行する）。
+    """
+    messages = build_messages({}, num_clips, layout)
+    started = time.perf_counter()
     try:
-        response = client.chat.completions.create(
+        get_llm_client(timeout).chat.completions.create(
             model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": "上記の要件に基づき、ショート動画のテキストを生成してください。"}
-            ],
-            response_format={"type": "json_object"}
+            messages=messages,
+            max_tokens=1,
+            **llm_request_options(),
         )
+    except Exception as e:
+        print(f"LLMのウォームアップに失敗しました（処理は続行します）: {e}")
+        return None
+    elapsed = time.perf_counter() - started
+    print(f"LLMのウォームアップが完了しました: {elapsed:.2f}秒")
+    return elapsed
+
+def parse_clips(json_string):
+    """LLMの出力（JSON文字列）をクリップのリストに変換する"""
+    parsed_data = json.loads(json_string)
+    
+    # LLMがresponseキーでラップしてくる場合があるため、対応
+    if isinstance(parsed_data, dict) and "response" in parsed_data:
+        return parsed_data["response"]
+    
+    # LLMがリスト形式で返さない場合（例: {"clip_1": {...}, "clip_2": {...}}）を考慮
+    if isinstance(parsed_data, dict) and all(isinstance(v, dict) for v in parsed_data.values()):
+        # clip_indexでソートしてリストに変換
+        sorted_clips = sorted(parsed_data.values(), key=lambda x: x.get("clip_index", 999))
+        return sorted_clips
         
-        json_string = response.choices[0].message.content
-        parsed_data = json.loads(json_string)
+    # それ以外の場合は、そのままリストとして返す（またはリストであることを期待）
+    if isinstance(parsed_data, list):
+        return parsed_data
         
-        # LLMがresponseキーでラップしてくる場合があるため、対応
-        if isinstance(parsed_data, dict) and "response" in parsed_data:
-            return parsed_data["response"]
+    # 予期せぬ形式の場合はエラーを出す
+    raise ValueError("LLMの出力形式が予期されたJSONリストまたはオブジェクトではありません。")
+
+def validate_clips(clips, num_clips):
+    """
+    parse_clipsの結果がクリップのリストとして使えるかを検証する（ストリーミング時と同じ基準）。
+    
+    Raises:
+        MalformedOutputError: リストでない、クリップ数が不足している、またはクリップに不正な項目がある場合。
+    """
+    if not isinstance(clips, list):
+        raise MalformedOutputError(f"クリップがリストではありません: {type(clips).__name__}")
+    if len(clips) < num_clips:
+        raise MalformedOutputError(f"クリップ数が不足しています（{len(clips)}/{num_clips}）")
+    for clip in clips:
+        validate_clip(clip, LLM_CLIP_MAX_TOP_CHARS, LLM_CLIP_MAX_BOTTOM_CHARS)
+
+def fallback_clips(dmm_data, num_clips):
+    """LLM呼び出しに失敗した場合のシンプルなテキストを返す"""
+    return [
+        {"clip_index": 1, "top_text": "【緊急速報】", "bottom_text": dmm_data.get('title', 'タイトルなし')},
+        {"clip_index": 2, "top_text": "物語の核心", "bottom_text": dmm_data.get('description', '説明なし')[:30] + "..."},
+        {"clip_index": 3, "top_text": "衝撃の展開", "bottom_text": "続きは本編で！"},
+        {"clip_index": 4, "top_text": "見逃し厳禁", "bottom_text": "今すぐDMMをチェック！"}
+    ][:num_clips]
+
+def stream_clips(messages, num_clips, timeout=None):
+    """
+    LLMの出力をストリーミングで受け取り、クリップが1つ完成するたびに検証する。
+    必要な数のクリップが揃った時点で残りの生成を待たずに接続を閉じる。
+    
+    Returns:
+        tuple: (クリップのリスト, 統計情報の辞書 {"ttft", "prompt_tokens", "completion_tokens"})。
         
-        # LLMがリスト形式で返さない場合（例: {"clip_1": {...}, "clip_2": {...}}）を考慮
-        if isinstance(parsed_data, dict) and all(isinstance(v, dict) for v in parsed_data.values()):
-            # clip_indexでソートしてリストに変換
-            sorted_clips = sorted(parsed_data.values(), key=lambda x: x.get("clip_index", 999))
-            return sorted_clips
-            
-        # それ以外の場合は、そのままリストとして返す（またはリストであることを期待）
-        if isinstance(parsed_data, list):
-            return parsed_data
-            
-        # 予期せぬ形式の場合はエラーを出す
-        raise ValueError("LLMの出力形式が予期されたJSONリストまたはオブジェクトではありません。")
+    Raises:
+        MalformedOutputError: 出力の形式が崩れた、長さの上限を超えた、またはクリップ数が不足した場合。
+    """
+    parser = ClipStreamParser(num_clips, LLM_STREAM_MAX_CHARS, LLM_CLIP_MAX_TOP_CHARS, LLM_CLIP_MAX_BOTTOM_CHARS)
+    llm = get_llm_client(timeout)
+    started = time.perf_counter()
+    stream = llm.chat.completions.create(
+        model=LLM_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"},
+        stream=True,
+        stream_options={"include_usage": True},
+        **llm_request_options(),
+    )
+    
+    stats = {"ttft": None, "prompt_tokens": 0, "completion_tokens": 0}
+    chunks = 0
+    try:
+        for chunk in stream:
+            if chunk.usage:
+                stats["prompt_tokens"] = chunk.usage.prompt_tokens or 0
+                stats["completion_tokens"] = chunk.usage.completion_tokens or 0
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if stats["ttft"] is None:
+                stats["ttft"] = time.perf_counter() - started
+            chunks += 1
+            parser.feed(chunk.choices[0].delta.content)
+            if parser.done:
+                break
+    finally:
+        stream.close()
+    
+    if len(parser.clips) < num_clips:
+        raise MalformedOutputError(f"クリップ数が不足しています（{len(parser.clips)}/{num_clips}）")
+    # usageが返されない場合（途中で打ち切った場合を含む）は、チャンク数を生成トークン数の近似値とする
+    stats["completion_tokens"] = stats["completion_tokens"] or chunks
+    return parser.clips[:num_clips], stats
+
+def generate_marketing_text_with_stats(dmm_data, num_clips, refresh=False, timeout=None, stream=LLM_STREAMING, layout=None):
+    """
+    generate_marketing_text()と同じ処理を行い、生成元とトークン使用量もあわせて返す。
+    
+    Args:
+        dmm_data (dict): DMMの作品データ。
+        num_clips (int): 生成するクリップ数。
+        refresh (bool): キャッシュを参照せずに再生成する。
+        timeout (float): LLMリクエストのタイムアウト秒数。Noneの場合はクライアントの既定値。
+        stream (bool): ストリーミングで出力を逐次検証し、失敗時はルールベース生成に切り替える。
+        layout (str): プロンプトの形式（"legacy" / "prefix"）。Noneの場合はconfig.LLM_PROMPT_LAYOUT。
         
-    except Exception as e:
-        print(f"LLM呼び出し中にエラーが発生しました: {e}")
-        # エラー時はフォールバックとしてシンプルなテキストを返す
-        return [
-            {"clip_index": 1, "top_text": "【緊急速報】", "bottom_text": dmm_data.get('title', 'タイトルなし')},
-            {"clip_index": 2, "top_text": "物語の核心", "bottom_text": dmm_data.get('description', '説明なし')[:30] + "..."},
-            {"clip_index": 3, "top_text": "衝撃の展開", "bottom_text": "続きは本編で！"},
-            {"clip_index": 4, "top_text": "見逃し厳禁", "bottom_text": "今すぐDMMをチェック！"}
-        ][:num_clips]
+    Returns:
+        tuple: (クリップのリスト, 統計情報の辞書)。
+               統計情報は {"source": "llm" / "cache" / "fallback" / "stream_fallback",
+               "prompt_tokens", "completion_tokens", "elapsed", "ttft", "layout"}。
+    """
+    clips, stats = _generate_marketing_text(dmm_data, num_clips, refresh, timeout, stream, layout or LLM_PROMPT_LAYOUT)
+    record_llm_metrics(stats, stream)
+    return clips, stats
 
-# --- メイン処理 ---
-def generate_canva_csv(cid, use_mock=True):
-    """Canvaの一括作成機能用のCSVデータを生成する"""
+def record_llm_metrics(stats, stream):
+    """generate_marketing_text_with_statsの統計をメトリクスに記録する。"""
+    if not metrics.is_enabled():
+        return
+    mode = "stream" if stream else "blocking"
+    metrics.inc("llm_generations", source=stats["source"], mode=mode)
+    if stats["source"] in ("llm", "fallback", "stream_fallback") and stats["elapsed"]:
+        metrics.observe("llm_request_seconds", stats["elapsed"], mode=mode, outcome=stats["source"])
+    if stats["ttft"] is not None:
+        metrics.observe("llm_ttft_seconds", stats["ttft"], mode=mode, layout=stats["layout"])
+    metrics.inc("llm_tokens", stats["prompt_tokens"], kind="prompt")
+    metrics.inc("llm_tokens", stats["completion_tokens"], kind="completion")
+
+def _generate_marketing_text(dmm_data, num_clips, refresh, timeout, stream, layout):
+    stats = {"source": "fallback", "prompt_tokens": 0, "completion_tokens": 0, "elapsed": 0.0, "ttft": None,
+             "layout": layout}
     
-    # 1. DMM APIからデータを取得
-    dmm_data = fetch_dmm_data(cid, use_mock=use_mock)
+    # DMMデータがNoneの場合はフォールバック
     if not dmm_data:
-        print("DMMデータの取得に失敗しました。処理を終了します。")
-        return
+        return [
+            {"clip_index": i + 1, "top_text": "【データエラー】", "bottom_text": "DMMデータが取得できませんでした。"}
+            for i in range(num_clips)
+        ], stats
 
-    # 2. LLMによるマーケティングテキストの生成
-    print("LLMによるマーケティングテキストの生成を開始...")
-    # MAX_FRAMESは動画の総ページ数。CTAページを1ページとして、テキストクリップは MAX_FRAMES - 1 ページ
-    clips_text_data = generate_marketing_text(dmm_data, MAX_FRAMES - 1) 
-    print("LLMによるテキスト生成が完了しました。")
+    messages = build_messages(dmm_data, num_clips, layout)
+    cache = get_llm_cache()
+    cache_key = LLMCache.make_key(LLM_MODEL, messages)
+    if cache is not None and not refresh:
+        cached_clips = cache.get(cache_key)
+        try:
+            if cached_clips is not None:
+                validate_clips(cached_clips, num_clips)
+                print("LLM生成結果のキャッシュを使用します。")
+                stats["source"] = "cache"
+                return cached_clips, stats
+        except MalformedOutputError as e:
+            # 検証を追加する前に保存された不正なエントリは使わずに再生成する（成功すれば上書きされる）
+            print(f"LLM生成結果のキャッシュが不正なため再生成します: {e}")
     
-    # 3. Canva用のデータフレームを初期化
-    columns = {}
+    started = time.perf_counter()
+    try:
+        if stream:
+            clips, stream_stats = stream_clips(messages, num_clips, timeout=timeout)
+            stats.update(stream_stats)
+        else:
+            llm = get_llm_client(timeout)
+            response = llm.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                **llm_request_options(),
+            )
+            
+            clips = parse_clips(response.choices[0].message.content)
+            # 形式が不正な出力はキャッシュに保存せず、フォールバックのテキストに切り替える
+            validate_clips(clips, num_clips)
+            if response.usage:
+                stats["prompt_tokens"] = response.usage.prompt_tokens or 0
+                stats["completion_tokens"] = response.usage.completion_tokens or 0
+        
+    except Exception as e:
+        stats["elapsed"] = time.perf_counter() - started
+        if stream:
+            # ストリーミング時は生成を打ち切った時点で、ルールベース生成に切り替える
+            # （接続エラーを含むLLMの失敗なので、"fallback"と同様にキャッシュせず、ジャーナルでは再試行の対象にする）
+            print(f"LLMの出力を打ち切り、ルールベース生成に切り替えます: {e}")
+            stats["source"] = "stream_fallback"
+            return generate_rule_based_text(dmm_data, num_clips), stats
+        print(f"LLM呼び出し中にエラーが発生しました: {e}")
+        # エラー時はフォールバックとしてシンプルなテキストを返す（キャッシュには保存しない）
+        return fallback_clips(dmm_data, num_clips), stats
+
+    stats["source"] = "llm"
+    stats["elapsed"] = time.perf_counter() - started
+    if cache is not None:
+        cache.set(cache_key, LLM_MODEL, clips)
+    return clips, stats
+
+def generate_marketing_text(dmm_data, num_clips, refresh=False, stream=LLM_STREAMING):
+    """
+    LLMを用いてマーケティングテキストを生成する。
+    同じプロンプトの生成結果がキャッシュにあればLLMを呼び出さずに返す。
+    refresh=Trueの場合はキャッシュを参照せずに再生成し、結果でキャッシュを上書きする。
+    stream=Trueの場合は出力を逐次検証し、形式が崩れた時点でルールベース生成に切り替える。
+    """
+    clips, _ = generate_marketing_text_with_stats(dmm_data, num_clips, refresh=refresh, stream=stream)
+    return clips
+
+# --- Canva CSVの列構成と行データ ---
+def canva_columns():
+    """Canva一括作成用CSVの列名リストを返す"""
+    columns = []
     for i in range(1, MAX_FRAMES): # クリップ 1 から MAX_FRAMES-1 まで
-        columns[f"frame_{i}_img"] = []
-        columns[f"frame_{i}_top"] = []
-        columns[f"frame_{i}_bottom"] = []
-    
+        columns += [f"frame_{i}_img", f"frame_{i}_top", f"frame_{i}_bottom"]
     # 最後のCTAページ用の列
-    columns["cta_img"] = [] # CTAページ用の画像
-    columns["title"] = []
-    columns["author"] = []
-    columns["cta_text"] = []
-    columns["affiliate_link"] = []
-    
-    df = pd.DataFrame(columns)
+    columns += ["cta_img", "title", "author", "cta_text", "affiliate_link"]
+    return columns
 
-    # 4. 各フレームのデータを生成
+def build_canva_row(dmm_data, clips_text_data):
+    """DMMデータとLLM生成テキストから、CSVの1行分の辞書を作成する"""
     new_row = {}
-    
+    image_urls = dmm_data.get("image_urls", [])
+
     # 画像URLとLLM生成テキストを割り当て
     for i in range(1, MAX_FRAMES):
         # 画像URLを割り当て (画像が足りない場合はループして使用)
-        image_urls = dmm_data.get("image_urls", [])
         if image_urls:
             image_index = (i - 1) % len(image_urls)
             new_row[f"frame_{i}_img"] = image_urls[image_index]
@@ -163,27 +458,335 @@ def generate_canva_csv(cid, use_mock=True):
             new_row[f"frame_{i}_top"] = "【エラー】"
             new_row[f"frame_{i}_bottom"] = "テキスト生成数が不足しています。"
 
-    # 5. 最後のCTAページのデータを設定
-    image_urls = dmm_data.get("image_urls", [])
+    # 最後のCTAページのデータを設定
     new_row["cta_img"] = image_urls[-1] if image_urls else "NO_IMAGE_URL"
     new_row["title"] = dmm_data.get("title", "タイトルなし")
     new_row["author"] = f"引用: {dmm_data.get('author', '作者不明')}"
     new_row["cta_text"] = "続きはDMMで！"
     new_row["affiliate_link"] = dmm_data.get("affiliate_link", "YOUR_DMM_AFFILIATE_LINK")
+    return new_row
+
+# --- メイン処理 ---
+def generate_canva_csv(cid, use_mock=True):
+    """Canvaの一括作成機能用のCSVデータを生成する"""
+    
+    # 1. DMM APIからデータを取得
+    dmm_data = fetch_dmm_data(cid, use_mock=use_mock)
+    if not dmm_data:
+        print("DMMデータの取得に失敗しました。処理を終了します。")
+        return
 
-    # 6. データフレームに行を追加
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+    # 2. LLMによるマーケティングテキストの生成
+    print("LLMによるマーケティングテキストの生成を開始...")
+    # MAX_FRAMESは動画の総ページ数。CTAページを1ページとして、テキストクリップは MAX_FRAMES - 1 ページ
+    clips_text_data = generate_marketing_text(dmm_data, MAX_FRAMES - 1) 
+    print("LLMによるテキスト生成が完了しました。")
+    
+    # 3. 各フレームのデータを生成し、データフレームを作成
+    # pandasはこの単発出力でのみ使用するため、ここでimportする（バッチ処理はcsvモジュールで書き出す）
+    import pandas as pd
+    new_row = build_canva_row(dmm_data, clips_text_data)
+    df = pd.DataFrame([new_row], columns=canva_columns())
 
-    # 7. CSVファイルとして出力
-    output_filename = "canva_import_data.csv"
+    # 4. CSVファイルとして出力
+    output_filename = DEFAULT_OUTPUT_FILENAME
     # CanvaがUTF-8 BOM付きCSVを推奨するため、'utf-8-sig'を使用
     df.to_csv(output_filename, index=False, encoding='utf-8-sig')
     print(f"\nCanva用の最終CSVファイルを生成しました: {output_filename}")
     return output_filename
 
+# --- バッチ処理 ---
+def load_cids(path):
+    """
+    CIDリストファイルを読み込む。1行に1つのCIDを記述し、空行と「#」で始まる行は無視する。
+    
+    Args:
+        path (str): CIDリストファイルのパス。
+        
+    Returns:
+        list: CIDのリスト。
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+def open_csv_writer(output_filename, columns, append=False):
+    """
+    行単位で追記するためのCSVライターを開く。
+    新規ファイル（または空ファイル）の場合のみヘッダー行を書き込む。
+    
+    Returns:
+        tuple: (ファイルオブジェクト, csv.DictWriter)
+    """
+    write_header = not (append and os.path.exists(output_filename) and os.path.getsize(output_filename) > 0)
+    # 追記時でもファイル先頭以外にBOMは書き込まれない（TextIOWrapperが位置を見て判定する）
+    f = open(output_filename, "a" if append else "w", encoding="utf-8-sig", newline="")
+    writer = csv.DictWriter(f, fieldnames=columns, lineterminator="\n")
+    if write_header:
+        writer.writeheader()
+        f.flush()
+    return f, writer
+
+def build_row_for_cid(cid, use_mock=True, refresh_llm=False, stream_llm=LLM_STREAMING, captures_dir=None,
+                      rule_based=False, journal=None, job=None, record=None, prompt_layout=None):
+    """
+    1作品分のCSVの行を作成する。journalを指定した場合、取得データと生成テキストを記録し、
+    recordに記録済みの段階（journal.getの戻り値）があればその結果を再利用する。
+    
+    Returns:
+        dict: CSVの1行分の辞書。DMMデータの取得に失敗した場合はNone。
+        
+    Raises:
+        RuntimeError: journal使用時に、LLM呼び出しに失敗した場合（フォールバックやストリーミング中断時の
+                      ルールベースのテキストは記録しない）。
+    """
+    record = record or {}
+    dmm_data = record.get("dmm_data")
+    if dmm_data is None:
+        with metrics.timer("stage_seconds", stage="fetch"):
+            dmm_data = fetch_dmm_data(cid, use_mock=use_mock)
+        if not dmm_data:
+            return None
+        if journal is not None:
+            journal.save_fetched(job, cid, dmm_data)
+
+    if captures_dir:
+        local_images = load_capture_images(cid, captures_dir)
+        if local_images:
+            dmm_data = dict(dmm_data, image_urls=local_images)
+
+    clips_text_data = record.get("clips")
+    if clips_text_data is None:
+        source = "rule_based"
+        with metrics.timer("stage_seconds", stage="generate"):
+            if rule_based:
+                clips_text_data = generate_rule_based_text(dmm_data, MAX_FRAMES - 1)
+            else:
+                clips_text_data, llm_stats = generate_marketing_text_with_stats(
+                    dmm_data, MAX_FRAMES - 1, refresh=refresh_llm, stream=stream_llm, layout=prompt_layout)
+                source = llm_stats["source"]
+        if journal is not None:
+            if source in ("fallback", "stream_fallback"):
+                raise RuntimeError("LLM呼び出しに失敗しました。次回の実行で再試行します。")
+            journal.save_generated(job, cid, clips_text_data)
+    return build_canva_row(dmm_data, clips_text_data)
+
+def refresh_journal_record(journal, job, cid, record, use_mock=True):
+    """
+    差分更新: 作品データを取得し直し、ジャーナルに記録された前回のフィンガープリントと比較する。
+    変更があった作品は新しいデータを記録し、クリップを再生成させる（CSVの行は書き込まれるまで前回のものを残す）。
+    
+    Returns:
+        tuple: (以降の処理に使う記録, 変更の種類 "skipped" / "updated" / "added")。取得に失敗した場合は (None, None)。
+    """
+    dmm_data = fetch_dmm_data(cid, use_mock=use_mock)
+    if not dmm_data:
+        return None, None
+    change = "updated" if record.get("row") else "added"
+    if work_fingerprint(dmm_data) == record.get("fingerprint"):
+        if record.get("stage") == "written":
+            return record, "skipped"
+        # 前回の実行が途中で中断した作品は、記録済みの段階から再開する
+        return record, change
+    journal.save_fetched(job, cid, dmm_data)
+    return {"dmm_data": dmm_data}, change
+
+def generate_canva_csv_batch(cids, output_filename=DEFAULT_OUTPUT_FILENAME, use_mock=True, append=False, status_filename=None,
+                             refresh_llm=False, stream_llm=LLM_STREAMING, captures_dir=None, rule_based=False,
+                             journal=None, job=None, incremental=False, prompt_layout=None):
+    """
+    複数のCIDからCanva一括作成用のCSVを生成する。
+    1作品の処理が終わるたびに1行ずつ追記・フラッシュするため、作品数が増えてもメモリ使用量は一定。
+    
+    journalを指定した場合、CIDごとの取得データ・生成テキスト・書き込んだ行をジャーナルに記録する。
+    中断後に同じジョブで再実行すると、書き込み済みの作品は飛ばし、それ以外は記録済みの段階から再開する。
+    LLM呼び出しに失敗した作品は（フォールバックのテキストで書き込まずに）失敗として記録し、次回の実行で再試行する。
+    終了時に、今回のCIDのジャーナルの書き込み済み行からCSVを作り直す。
+    
+    incremental=Trueの場合（journalが必要）、書き込み済みの作品も毎回取得し直してフィンガープリントを比較し、
+    新規・変更された作品だけクリップを再生成して、CSVの該当行を置き換える。
+    
+    Args:
+        cids (list): CIDのリスト。
+        output_filename (str): 出力先CSVファイル名。
+        use_mock (bool): モックデータを使用するかどうか。
+        append (bool): 既存のCSVに追記するかどうか。Falseの場合は上書きする。
+                       journalとは併用できない（終了時にジャーナルの行だけでCSVを作り直すため、既存の行が消える）。
+        status_filename (str): 指定した場合、CIDごとの処理結果（cid, status, message）をCSVで出力する。
+        refresh_llm (bool): LLM生成結果のキャッシュを使わずに再生成する。
+        stream_llm (bool): LLMの出力をストリーミングで検証し、失敗時はルールベース生成に切り替える。
+        captures_dir (str): 指定した場合、<captures_dir>/<cid>/ に frame_ranking.py で選んだフレーム（frames.json）
+                            または manifest.json の加工済み画像があれば、frame_{i}_img列・cta_img列に
+                            リモートURLの代わりにそのパスを使用する（postprocess_captures.py / frame_ranking.py）。
+        rule_based (bool): LLMを使わずにルールベースでテキストを生成する（openaiをimportしない軽量な実行）。
+        journal (JobJournal): 進行状況を記録するジャーナル。Noneの場合は記録しない。
+        job (str): ジャーナル上のジョブ名。Noneの場合は出力CSVの絶対パス。
+        incremental (bool): 変更のあった作品のみ再処理する（差分更新）。
+        prompt_layout (str): LLMプロンプトの形式（"legacy" / "prefix"）。Noneの場合はconfig.LLM_PROMPT_LAYOUT。
+        
+    Returns:
+        list: CIDごとの処理結果の辞書 {"cid", "status", "message"} のリスト。
+              statusは "OK" / "FETCH_ERROR" / "ERROR" のいずれか。
+    """
+    if incremental and journal is None:
+        raise ValueError("差分更新（incremental）にはjournalの指定が必要です。")
+    if append and journal is not None:
+        raise ValueError("journal使用時はCSVをジャーナルから作り直すため、append（追記）とは併用できません。")
+    columns = canva_columns()
+    results = []
+    changes = Counter()
+    if journal is not None:
+        job = job or os.path.abspath(output_filename)
+        journal.register(job, cids)
+    f, writer = open_csv_writer(output_filename, columns, append=append)
+    status_f = status_writer = None
+    if status_filename:
+        status_f, status_writer = open_csv_writer(status_filename, ["cid", "status", "message"], append=append)
+    if not rule_based and LLM_WARMUP:
+        warm_up_llm(MAX_FRAMES - 1, prompt_layout)
+
+    try:
+        for n, cid in enumerate(cids, start=1):
+            print(f"\n=== [{n}/{len(cids)}] CID: {cid} ===")
+            record = journal.get(job, cid) if journal is not None else {}
+            change = None
+            work_started = time.perf_counter()
+            try:
+                if incremental:
+                    record, change = refresh_journal_record(journal, job, cid, record, use_mock=use_mock)
+                if record is None:
+                    result = {"cid": cid, "status": "FETCH_ERROR", "message": "DMMデータの取得に失敗しました。"}
+                elif record.get("stage") == "written":
+                    message = "変更がないため省略しました。" if incremental else "ジャーナルに書き込み済みのため省略しました。"
+                    result = {"cid": cid, "status": "OK", "message": message}
+                else:
+                    row = build_row_for_cid(cid, use_mock=use_mock, refresh_llm=refresh_llm, stream_llm=stream_llm,
+                                            captures_dir=captures_dir, rule_based=rule_based,
+                                            journal=journal, job=job, record=record, prompt_layout=prompt_layout)
+                    if row is None:
+                        result = {"cid": cid, "status": "FETCH_ERROR", "message": "DMMデータの取得に失敗しました。"}
+                    else:
+                        with metrics.timer("stage_seconds", stage="write"):
+                            writer.writerow(row)
+                            f.flush()
+                        if journal is not None:
+                            journal.save_written(job, cid, row)
+                        result = {"cid": cid, "status": "OK", "message": ""}
+            except Exception as e:
+                result = {"cid": cid, "status": "ERROR", "message": str(e)}
+            if journal is not None and result["status"] != "OK":
+                journal.fail(job, cid, f"{result['status']}: {result['message']}")
+            changes[change if result["status"] == "OK" else "failed"] += 1
+            metrics.inc("works", status=result["status"])
+            metrics.observe("work_seconds", time.perf_counter() - work_started)
+
+            if result["status"] == "OK":
+                print(f"[OK] {cid}")
+            else:
+                print(f"[NG] {cid}: {result['status']} {result['message']}")
+            if status_writer:
+                status_writer.writerow(result)
+                status_f.flush()
+            results.append(result)
+    finally:
+        f.close()
+        if status_f:
+            status_f.close()
+
+    if journal is not None:
+        rebuild_csv_from_journal(journal, job, output_filename, cids)
+        print(f"ジャーナルの状態: {journal.summary(job)}")
+    if incremental:
+        print(f"差分更新: スキップ {changes['skipped']}件 / 更新 {changes['updated']}件 / "
+              f"追加 {changes['added']}件 / 失敗 {changes['failed']}件")
+
+    ok = sum(1 for r in results if r["status"] == "OK")
+    print(f"\nCanva用のCSVファイルを生成しました: {output_filename} (成功 {ok}件 / 失敗 {len(results) - ok}件)")
+    return results
+
+def rebuild_csv_from_journal(journal, job, output_filename, cids=None):
+    """
+    ジャーナルに記録された書き込み済みの行から、CSVを作り直す（CIDの登録順）。
+    一時ファイルに書き出してから置き換えるため、途中で失敗しても元のCSVは壊れない。
+    
+    Args:
+        cids (list): 指定した場合、このCIDの行だけでCSVを作る。Noneの場合はジョブの全ての書き込み済み行。
+    
+    Returns:
+        int: 書き込んだ行数。
+    """
+    rows = journal.rows(job, cids)
+    tmp = output_filename + ".tmp"
+    f, writer = open_csv_writer(tmp, canva_columns())
+    try:
+        writer.writerows(rows)
+    finally:
+        f.close()
+    os.replace(tmp, output_filename)
+    return len(rows)
+
 if __name__ == "__main__":
-    # 実行例: モックデータを使用
-    generate_canva_csv(cid="test_cid_001", use_mock=True)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cid", action="append", default=[], help="処理するCID（複数指定可）")
+    ap.add_argument("--cid-file", help="CIDリストファイル（1行1CID）")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT_FILENAME, help="出力CSVファイル名")
+    ap.add_argument("--status", help="CIDごとの処理結果を書き出すCSVファイル名")
+    ap.add_argument("--append", action="store_true", help="既存のCSVに追記する")
+    ap.add_argument("--live", action="store_true", help="モックではなく実際のDMM APIを使用する")
+    ap.add_argument("--refresh-llm", action="store_true", help="LLM生成結果のキャッシュを使わずに再生成する")
+    ap.add_argument("--stream", action=argparse.BooleanOptionalAction, default=LLM_STREAMING,
+                    help="LLMの出力をストリーミングで検証し、失敗時はルールベース生成に切り替える")
+    ap.add_argument("--rule-based", action="store_true",
+                    help="LLMを使わずにルールベースでテキストを生成する（pandas・openaiを読み込まない軽量な実行）")
+    ap.add_argument("--prompt-layout", choices=("legacy", "prefix"), default=LLM_PROMPT_LAYOUT,
+                    help="LLMプロンプトの形式（prefix: 共通の指示を先頭に固定し、作品ごとのデータを最後に置く）")
+    ap.add_argument("--captures", help="加工済みキャプチャ画像のフォルダ（frames.json・manifest.jsonがある作品はローカル画像を使用）")
+    ap.add_argument("--localize-assets", action="store_true",
+                    help="出力後に画像URLを事前取得・検証し、ローカルの画像パスに書き換える（asset_store.py）")
+    ap.add_argument("--journal", action="store_true",
+                    help="CIDごとの進行状況をジャーナルに記録し、中断したバッチを続きから再開する")
+    ap.add_argument("--incremental", action="store_true",
+                    help="作品データのフィンガープリントを比較し、新規・変更された作品だけ再生成してCSVの行を置き換える（--journalを含む）")
+    ap.add_argument("--job", help="ジャーナル上のジョブ名（省略時は出力CSVのパス）")
+    ap.add_argument("--reset-journal", action="store_true", help="ジョブの記録を削除して最初から処理する")
+    ap.add_argument("--rebuild-csv", action="store_true", help="ジャーナルの書き込み済み行からCSVを作り直して終了する（--cid / --cid-file指定時はそのCIDの行のみ）")
+    ap.add_argument("--metrics", action="store_true", default=METRICS_ENABLED,
+                    help="ステージごとの処理時間などを計測し、終了時にJSONとPrometheus形式で書き出す")
+    ap.add_argument("--clear-llm-cache", action="store_true", help="実行前にLLM生成結果のキャッシュを全て削除する")
+    args = ap.parse_args()
+    metrics.enable(args.metrics)
+    if args.append and (args.journal or args.incremental or args.rebuild_csv):
+        ap.error("--append は --journal / --incremental / --rebuild-csv と併用できません（CSVをジャーナルの行だけで作り直すため）")
+
+    if args.clear_llm_cache and get_llm_cache() is not None:
+        get_llm_cache().clear()
+
+    cids = list(args.cid)
+    if args.cid_file:
+        cids += load_cids(args.cid_file)
+
+    journal = JobJournal() if args.journal or args.incremental or args.rebuild_csv else None
+    job = args.job or os.path.abspath(args.output)
+    if journal is not None and args.reset_journal:
+        journal.reset(job)
+
+    if args.rebuild_csv:
+        # 実行例: python final_canva_csv_generator.py --rebuild-csv --output canva_import_data.csv
+        # --cid / --cid-file を指定した場合はそのCIDの行だけで作り直す
+        count = rebuild_csv_from_journal(journal, job, args.output, cids or None)
+        print(f"ジャーナルからCSVを作り直しました: {args.output} ({count}行)")
+    elif cids:
+        # 実行例: python final_canva_csv_generator.py --cid-file cids.txt --live --status status.csv
+        generate_canva_csv_batch(cids, output_filename=args.output, use_mock=not args.live,
+                                 append=args.append, status_filename=args.status, refresh_llm=args.refresh_llm,
+                                 stream_llm=args.stream, captures_dir=args.captures, rule_based=args.rule_based,
+                                 journal=journal, job=job, incremental=args.incremental,
+                                 prompt_layout=args.prompt_layout)
+        if args.localize_assets:
+            localize_csv(args.output)
+    else:
+        # 実行例: モックデータを使用
+        generate_canva_csv(cid="test_cid_001", use_mock=True)
     
-    # 実行例: 実際のDMM APIを使用 (config.pyに認証情報を設定後)
-    # generate_canva_csv(cid="実際のコンテンツID", use_mock=False)
+        # 実行例: 実際のDMM APIを使用 (config.pyに認証情報を設定後)
+        # generate_canva_csv(cid="実際のコンテンツID", use_mock=False)
+    metrics.dump()
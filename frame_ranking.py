@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from postprocess_captures import MANIFEST_NAME, find_capture_folders, list_sources, load_manifest_images, manifest_images
+from config import (
+    MAX_FRAMES, CAPTURES_DIR, FRAME_RANK_SIZE, FRAME_BLANK_STD, FRAME_BLANK_EDGES, FRAME_SPARSE_COVERAGE,
+    FRAME_DUP_DISTANCE, FRAME_DIVERSITY_WEIGHT, FRAME_RANK_WORKERS,
+)
+
+RANKING_NAME = "frames.json"
+EDGE_THRESHOLD = 0.1       # 隣接画素の明るさの差（0-1）がこれを超える画素をエッジとみなす
+BACKGROUND_TOLERANCE = 0.08  # 明るさの中央値（背景色）からこの範囲内の画素を背景とみなす
+SPARSE_PENALTY = 0.3       # 奥付・クレジット等の疎なページのスコアに掛ける係数
+DIVERSITY_CAP = 0.25       # この距離以上離れていれば、多様性の加点は満点
+POOL = 8                   # 重複判定用の特徴量を作るときの平均プーリングの大きさ（px）
+SCORE_CHUNK = 256          # 一度に採点するページ数（中間配列を小さく保つ方が、大きな配列を一度に処理するより速い）
+
+def page_sources(folder):
+    """
+    採点するページ画像の絶対パスをページ順に返す。manifest.jsonがあれば加工済み画像、無ければ page_NN.png。
+
+    Returns:
+        tuple: (画像パスのリスト, "processed" / "raw")
+    """
+    paths = manifest_images(folder)
+    if paths:
+        return paths, "processed"
+    return [os.path.abspath(path) for path in list_sources(folder)], "raw"
+
+def load_gray(path, size=FRAME_RANK_SIZE):
+    """画像をグレースケールでsize（幅, 高さ）に縮小して読み込む。"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as im:
+        im.draft("L", size)  # JPEGはデコード時に縮小される（他の形式では何もしない）
+        small = im.convert("L").resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(small, dtype=np.uint8)
+
+def load_pages(paths, size=FRAME_RANK_SIZE, workers=FRAME_RANK_WORKERS):
+    """
+    画像をスレッドプールで並列に読み込み、1つの配列にまとめる（PILのデコードはGILを解放する）。
+
+    Returns:
+        tuple: (uint8配列 (ページ数, 高さ, 幅), 読み込めたかどうかのbool配列)
+    """
+    import numpy as np
+
+    def load(path):
+        try:
+            return load_gray(path, size)
+        except Exception as e:
+            print(f"[NG] {path}: {type(e).__name__}: {e}")
+            return None
+
+    pages = np.zeros((len(paths), size[1], size[0]), dtype=np.uint8)
+    loaded = np.zeros(len(paths), dtype=bool)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, array in enumerate(executor.map(load, paths)):
+            if array is not None:
+                pages[i] = array
+                loaded[i] = True
+    return pages, loaded
+
+def score_pages(pages):
+    """
+    全ページをまとめて（ページ単位のループなしで）採点する。
+
+    Returns:
+        dict: ページごとの値の配列
+              contrast（明るさの標準偏差）, edges（エッジの割合）, coverage（背景色以外の割合）,
+              blank（白紙）, sparse（奥付・クレジット等の疎なページ）, quality（0-1のスコア）,
+              descriptors（重複判定用の縮小画像, (ページ数, 特徴量の次元)）
+    """
+    import numpy as np
+
+    x = pages.astype(np.float32) / 255.0
+    n, h, w = x.shape
+    contrast = x.std(axis=(1, 2))
+    dx = np.abs(np.diff(x, axis=2))[:, :-1, :]
+    dy = np.abs(np.diff(x, axis=1))[:, :, :-1]
+    edges = (np.maximum(dx, dy) > EDGE_THRESHOLD).mean(axis=(1, 2))
+    background = np.median(x.reshape(n, -1), axis=1)
+    coverage = (np.abs(x - background[:, None, None]) > BACKGROUND_TOLERANCE).mean(axis=(1, 2))
+
+    blank = (contrast < FRAME_BLANK_STD) | (edges < FRAME_BLANK_EDGES)
+    sparse = ~blank & (coverage < FRAME_SPARSE_COVERAGE)
+    quality = (0.4 * np.minimum(contrast / 0.25, 1.0)
+               + 0.4 * np.minimum(edges / 0.15, 1.0)
+               + 0.2 * np.minimum(coverage / 0.5, 1.0))
+    quality = np.where(sparse, quality * SPARSE_PENALTY, quality)
+
+    ph, pw = h // POOL, w // POOL
+    descriptors = x[:, :ph * POOL, :pw * POOL].reshape(n, ph, POOL, pw, POOL).mean(axis=(2, 4)).reshape(n, -1)
+    return {"contrast": contrast, "edges": edges, "coverage": coverage, "blank": blank, "sparse": sparse,
+            "quality": quality, "descriptors": descriptors}
+
+def score_in_chunks(pages, chunk=SCORE_CHUNK):
+    """score_pagesをchunkページずつ実行し、結果を連結する。"""
+    import numpy as np
+
+    parts = [score_pages(pages[start:start + chunk]) for start in range(0, len(pages), chunk)]
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]} if parts else {}
+
+def select_frames(quality, usable, descriptors, count=MAX_FRAMES, dup_distance=FRAME_DUP_DISTANCE,
+                  diversity_weight=FRAME_DIVERSITY_WEIGHT):
+    """
+    1作品分のページから、スコアが高く、選択済みのフレームと似ていないページをcount枚まで貪欲に選ぶ。
+    選択済みのフレームとの距離がdup_distance未満のページ（ほぼ重複）は候補から外す。
+
+    Returns:
+        list: 選んだページの番号（ページ順）。使えるページが足りない場合はcount枚未満。
+    """
+    import numpy as np
+
+    distance = np.abs(descriptors[:, None, :] - descriptors[None, :, :]).mean(axis=2)
+    nearest = np.full(len(quality), np.inf)
+    available = usable.copy()
+    chosen = []
+    while len(chosen) < count and available.any():
+        spread = np.minimum(nearest, DIVERSITY_CAP) / DIVERSITY_CAP
+        gain = np.where(available, quality + diversity_weight * spread, -np.inf)
+        pick = int(np.argmax(gain))
+        chosen.append(pick)
+        available[pick] = False
+        nearest = np.minimum(nearest, distance[pick])
+        available &= nearest >= dup_distance
+    return sorted(chosen)
+
+def write_ranking(folder, source, paths, scores, offset, chosen):
+    """フォルダの採点結果と選んだフレーム（frames.json）を書き出す。"""
+    pages = [{
+        "path": path,
+        "quality": round(float(scores["quality"][offset + i]), 4),
+        "contrast": round(float(scores["contrast"][offset + i]), 4),
+        "edges": round(float(scores["edges"][offset + i]), 4),
+        "coverage": round(float(scores["coverage"][offset + i]), 4),
+        "blank": bool(scores["blank"][offset + i]),
+        "sparse": bool(scores["sparse"][offset + i]),
+    } for i, path in enumerate(paths)]
+    ranking = {
+        "slug": os.path.basename(os.path.normpath(folder)),
+        "source": source,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "selected": [paths[i] for i in chosen],
+        "pages": pages,
+    }
+    path = os.path.join(folder, RANKING_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(ranking, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+    return ranking
+
+def rank_frames(folders, count=MAX_FRAMES, workers=FRAME_RANK_WORKERS):
+    """
+    バッチ内の全作品のページを1つの配列に読み込んでまとめて採点し、作品ごとにcount枚のフレームを選んで
+    <folder>/frames.json に書き出す。選んだ画像はページ順に並び、最後の1枚がcta_imgになる。
+
+    Args:
+        folders (list): captures/<cid> フォルダのリスト。
+        count (int): 1作品あたりに選ぶ枚数（frame_{i}_img の MAX_FRAMES-1 枚 + cta_img）。
+        workers (int): 画像を読み込むスレッド数。
+
+    Returns:
+        dict: 処理結果の集計 {"works", "pages", "blank", "sparse", "selected", "load_sec", "score_sec",
+              "elapsed_sec", "pages_per_min"}。
+    """
+    started = time.perf_counter()
+    works = [(folder, *page_sources(folder)) for folder in folders]
+    all_paths = [path for _, paths, _ in works for path in paths]
+    pages, loaded = load_pages(all_paths, workers=workers)
+    load_sec = time.perf_counter() - started
+
+    scores = score_in_chunks(pages)
+    stats = {"works": len(works), "pages": len(all_paths), "blank": 0, "sparse": 0, "selected": 0}
+    offset = 0
+    for folder, paths, source in works:
+        span = slice(offset, offset + len(paths))
+        if paths:
+            usable = loaded[span] & ~scores["blank"][span]
+            chosen = select_frames(scores["quality"][span], usable, scores["descriptors"][span], count)
+            write_ranking(folder, source, paths, scores, offset, chosen)
+            stats["blank"] += int(scores["blank"][span].sum())
+            stats["sparse"] += int(scores["sparse"][span].sum())
+            stats["selected"] += len(chosen)
+            print(f"[OK] {folder}: {len(chosen)}/{len(paths)} pages selected -> {os.path.join(folder, RANKING_NAME)}")
+        offset += len(paths)
+
+    elapsed = time.perf_counter() - started
+    stats.update({
+        "load_sec": round(load_sec, 3),
+        "score_sec": round(elapsed - load_sec, 3),
+        "elapsed_sec": round(elapsed, 3),
+        "pages_per_min": round(len(all_paths) / elapsed * 60, 1) if elapsed > 0 else 0.0,
+    })
+    metrics.inc("frame_pages", stats["blank"], verdict="blank")
+    metrics.inc("frame_pages", stats["sparse"], verdict="sparse")
+    metrics.inc("frame_pages", stats["pages"] - stats["blank"] - stats["sparse"], verdict="ok")
+    metrics.observe("stage_seconds", elapsed, stage="frame_rank")
+    return stats
+
+def read_ranking(folder):
+    """フォルダのframes.jsonを読み込む。存在しない・壊れている場合はNoneを返す。"""
+    try:
+        with open(os.path.join(folder, RANKING_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_capture_images(cid, root=CAPTURES_DIR):
+    """
+    作品のフレームに使うローカル画像の絶対パスを返す。
+    rank_framesで選んだフレーム（frames.json）があればそれを、無い・manifest.jsonより古い場合は
+    load_manifest_imagesの加工済み画像（ページ順）を返す。
+
+    Returns:
+        list: 画像パスのリスト。ローカル画像が無い場合は空リスト。
+    """
+    folder = os.path.join(root, cid)
+    ranking = read_ranking(folder)
+    if ranking and ranking.get("selected"):
+        manifest_path = os.path.join(folder, MANIFEST_NAME)
+        stale = (os.path.exists(manifest_path)
+                 and os.path.getmtime(manifest_path) > os.path.getmtime(os.path.join(folder, RANKING_NAME)))
+        if not stale and all(os.path.exists(path) for path in ranking["selected"]):
+            return [os.path.abspath(path) for path in ranking["selected"]]
+    return load_manifest_images(cid, root)
+
+def make_benchmark_pages(root, works, pages_per_work, size=(540, 960)):
+    """
+    ベンチマーク用に、絵柄のあるページ・白紙・奥付風の疎なページ・重複ページを含むキャプチャフォルダを作成する。
+    """
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    for w in range(works):
+        folder = os.path.join(root, f"bench{w:05d}")
+        os.makedirs(folder, exist_ok=True)
+        previous = None
+        for p in range(1, pages_per_work + 1):
+            if p == pages_per_work:
+                # 奥付: 白地に数行の文字のような短い線
+                page = np.full((size[1], size[0]), 250, dtype=np.uint8)
+                for line in range(5):
+                    page[400 + line * 30:404 + line * 30, 150:150 + int(rng.integers(80, 240))] = 30
+            elif p % 7 == 0:
+                page = np.full((size[1], size[0]), 255, dtype=np.uint8)  # 白紙
+            elif p % 5 == 0 and previous is not None:
+                page = previous  # 直前のページと同じ（ページ送りの失敗）
+            else:
+                page = np.full((size[1], size[0]), int(rng.integers(180, 240)), dtype=np.uint8)
+                for _ in range(25):
+                    y, x = rng.integers(0, size[1] - 120), rng.integers(0, size[0] - 160)
+                    page[y:y + int(rng.integers(20, 120)), x:x + int(rng.integers(20, 160))] = int(rng.integers(0, 120))
+                previous = page
+            Image.fromarray(page).save(os.path.join(folder, f"page_{p:02d}.png"))
+
+def benchmark(works=100, pages_per_work=20, workers=FRAME_RANK_WORKERS):
+    """合成したキャプチャフォルダに対してrank_framesを実行し、1分あたりの処理ページ数を表示する。"""
+    with tempfile.TemporaryDirectory() as root:
+        make_benchmark_pages(root, works, pages_per_work)
+        stats = rank_frames(find_capture_folders(root), workers=workers)
+    print(f"\n--- フレーム選択のベンチマーク（{works}作品 × {pages_per_work}ページ） ---")
+    print(f"読み込み {stats['load_sec']:.2f}秒 + 採点・選択 {stats['score_sec']:.2f}秒 = {stats['elapsed_sec']:.2f}秒 "
+          f"({stats['pages_per_min']:.0f} ページ/分)")
+    print(f"白紙 {stats['blank']}ページ / 疎なページ {stats['sparse']}ページ / 選択 {stats['selected']}枚")
+    return stats
+
+if __name__ == "__main__":
+    # 実行例: python postprocess_captures.py && python frame_ranking.py
+    #         python final_canva_csv_generator.py --cid-file cids.txt --live --captures captures
+    ap = argparse.ArgumentParser(description="キャプチャ画像を採点し、作品ごとにフレームに使う画像を選んでframes.jsonを作成する")
+    ap.add_argument("folders", nargs="*", help="処理する captures/<cid> フォルダ（省略時は --root 以下の全て）")
+    ap.add_argument("--root", default=CAPTURES_DIR, help="キャプチャのルートフォルダ")
+    ap.add_argument("--count", type=int, default=MAX_FRAMES, help="1作品あたりに選ぶ枚数（最後の1枚がcta_img）")
+    ap.add_argument("--workers", type=int, default=FRAME_RANK_WORKERS, help="画像を読み込むスレッド数")
+    ap.add_argument("--bench", type=int, nargs=2, metavar=("WORKS", "PAGES"),
+                    help="合成したWORKS作品 × PAGESページで処理速度を計測する")
+    args = ap.parse_args()
+
+    if args.bench:
+        benchmark(*args.bench, workers=args.workers)
+    else:
+        folders = args.folders or find_capture_folders(args.root)
+        if not folders:
+            ap.error(f"処理するフォルダがありません: {args.root}")
+        stats = rank_frames(folders, count=args.count, workers=args.workers)
+        print(f"\n{stats['works']}作品 {stats['pages']}ページを採点しました（白紙 {stats['blank']} / 疎なページ "
+              f"{stats['sparse']}）: {stats['elapsed_sec']}秒, {stats['pages_per_min']:.0f} ページ/分")
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+from config import HTTP_CACHE_PATH, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_TTLS
+
+class CachedResponse:
+    """
+    キャッシュから復元したレスポンス。requests.Responseのうち、本プロジェクトで使用する属性のみを持つ。
+    """
+
+    def __init__(self, url, status_code, headers, content, encoding):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+class HTTPCache:
+    """
+    SQLiteを使ったHTTPレスポンスのディスクキャッシュ。
+
+    - キーはURLとクエリパラメータ（ソート済み）のSHA-256。
+    - 有効期限はURLの前方一致でエンドポイントごとに設定する（config.HTTP_CACHE_TTLS）。
+    - 期限切れのエントリはETag/Last-Modifiedで再検証し、304なら本文を再利用する。
+    - 合計サイズがmax_bytesを超えた場合、最終アクセスが古いものから削除する（LRU）。
+
+    スレッドセーフ。DMMClientのAPI呼び出しとスクレイピングで共有される。
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH, max_bytes=HTTP_CACHE_MAX_BYTES, ttls=HTTP_CACHE_TTLS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status_code INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url, params=None):
+        """URLとクエリパラメータからキャッシュキーを生成する。"""
+        query = urlencode(sorted((params or {}).items()))
+        return hashlib.sha256(f"{url}?{query}".encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url):
+        """URLに最も長く前方一致したエンドポイントの有効期限（秒）を返す。"""
+        prefixes = [p for p in self.ttls if url.startswith(p)]
+        if not prefixes:
+            return 0
+        return self.ttls[max(prefixes, key=len)]
+
+    def lookup(self, key):
+        """
+        キャッシュエントリを取得する。
+
+        Returns:
+            tuple: (CachedResponse, is_fresh, validators) 。エントリが無い場合はNone。
+                   validatorsは再検証用のリクエストヘッダー（If-None-Match / If-Modified-Since）。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status_code, headers, body, encoding, etag, last_modified, expires_at "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        url, status_code, headers, body, encoding, etag, last_modified, expires_at = row
+        response = CachedResponse(url, status_code, json.loads(headers), body, encoding)
+        validators = {}
+        if etag:
+            validators["If-None-Match"] = etag
+        if last_modified:
+            validators["If-Modified-Since"] = last_modified
+        return response, time.time() < expires_at, validators
+
+    def store(self, key, response):
+        """requests.Responseをキャッシュに保存し、必要に応じてLRU削除を行う。"""
+        url = response.url
+        body = response.content
+        encoding = response.encoding or response.apparent_encoding
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status_code, headers, body, encoding, etag, last_modified, expires_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, response.status_code, json.dumps(dict(response.headers)), body, encoding,
+                 response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                 now + self.ttl_for(url), now, len(body)),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, key, url):
+        """304 Not Modifiedで再検証できたエントリの有効期限を延長する。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, last_access = ? WHERE key = ?",
+                (now + self.ttl_for(url), now, key),
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def clear(self):
+        """キャッシュを全て削除する。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
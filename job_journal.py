@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import JOB_JOURNAL_PATH
+
+# 作品ごとの進行状況。左から順に進み、どの段階で失敗しても "failed" になる
+STAGES = ("pending", "fetched", "generated", "written")
+
+def work_fingerprint(dmm_data):
+    """
+    作品データ（fetch_dmm_dataの戻り値）のフィンガープリント。
+    タイトル・あらすじ・キーワード・画像URLなど、いずれかの項目が変わると値が変わる。
+    """
+    payload = json.dumps(dmm_data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class JobJournal:
+    """
+    バッチ処理の進行状況をCIDごとに記録するSQLiteジャーナル。
+
+    - ジョブ名（既定では出力CSVの絶対パス）とCIDの組ごとに、段階（STAGES）と各段階の結果を保存する。
+        fetched:   DMMの作品データ（dmm_data）と画像URL（image_urls）
+        generated: 生成したクリップ（clips）
+        written:   CSVに書き込んだ行（row）
+    - 中断したジョブを再実行すると、保存済みの段階は結果を再利用し、失敗・未完了の段階から処理を再開する。
+    - 最終的なCSVは、書き込み済みの行をCIDの登録順に並べて再作成できる（rebuild_csv_from_journal）。
+      作品の再生成中や再生成に失敗した場合も、新しい行が書き込まれるまでは前回の行を残す。
+    - 取得データのフィンガープリントを記録し、差分更新（incremental）で変更の有無を判定する。
+
+    スレッドセーフ。
+    """
+
+    def __init__(self, path=JOB_JOURNAL_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                job TEXT NOT NULL,
+                cid TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                stage TEXT NOT NULL,
+                failed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                dmm_data TEXT,
+                image_urls TEXT,
+                clips TEXT,
+                row TEXT,
+                fingerprint TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job, cid)
+            )
+        """)
+        columns = {r[1] for r in self._conn.execute("PRAGMA table_info(items)")}
+        if "fingerprint" not in columns:
+            # 差分更新の追加前に作成されたジャーナル
+            self._conn.execute("ALTER TABLE items ADD COLUMN fingerprint TEXT")
+        self._conn.commit()
+
+    def register(self, job, cids):
+        """CIDをジョブに登録する。登録済みのCIDは状態を保ったまま、新しいCIDはpendingとして末尾に追加する。"""
+        now = time.time()
+        with self._lock:
+            start = self._conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM items WHERE job = ?", (job,)).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO items (job, cid, seq, stage, updated_at) VALUES (?, ?, ?, 'pending', ?)",
+                [(job, cid, start + i, now) for i, cid in enumerate(cids)],
+            )
+            self._conn.commit()
+
+    def get(self, job, cid):
+        """
+        CIDの記録を返す。未登録の場合は空の辞書。
+
+        Returns:
+            dict: {"stage", "failed", "error", "attempts", "dmm_data", "clips", "row", "fingerprint"}。
+                  dmm_dataには保存済みの image_urls を含める。未保存の項目はNone。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stage, failed, error, attempts, dmm_data, image_urls, clips, row, fingerprint "
+                "FROM items WHERE job = ? AND cid = ?",
+                (job, cid),
+            ).fetchone()
+        if row is None:
+            return {}
+        stage, failed, error, attempts, dmm_data, image_urls, clips, csv_row, fingerprint = row
+        record = {
+            "stage": stage, "failed": bool(failed), "error": error, "attempts": attempts,
+            "dmm_data": json.loads(dmm_data) if dmm_data else None,
+            "clips": json.loads(clips) if clips else None,
+            "row": json.loads(csv_row) if csv_row else None,
+            "fingerprint": fingerprint,
+        }
+        if record["dmm_data"] is not None and image_urls:
+            record["dmm_data"]["image_urls"] = json.loads(image_urls)
+        return record
+
+    def _update(self, job, cid, **columns):
+        columns["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        with self._lock:
+            self._conn.execute(f"UPDATE items SET {assignments} WHERE job = ? AND cid = ?",
+                               (*columns.values(), job, cid))
+            self._conn.commit()
+
+    def save_fetched(self, job, cid, dmm_data):
+        # 生成済みのクリップは取得データと対応しなくなるため破棄する（行は新しい行が書き込まれるまで残す）
+        data = {k: v for k, v in dmm_data.items() if k != "image_urls"}
+        self._update(job, cid, stage="fetched", failed=0, error=None, clips=None,
+                     dmm_data=json.dumps(data, ensure_ascii=False),
+                     image_urls=json.dumps(dmm_data.get("image_urls", []), ensure_ascii=False),
+                     fingerprint=work_fingerprint(dmm_data))
+
+    def save_generated(self, job, cid, clips):
+        self._update(job, cid, stage="generated", failed=0, error=None, clips=json.dumps(clips, ensure_ascii=False))
+
+    def save_written(self, job, cid, row):
+        self._update(job, cid, stage="written", failed=0, error=None, row=json.dumps(row, ensure_ascii=False))
+
+    def fail(self, job, cid, error):
+        """現在の段階のまま失敗として記録する。次回の実行でその段階から再試行される。"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE items SET failed = 1, error = ?, attempts = attempts + 1, updated_at = ? WHERE job = ? AND cid = ?",
+                (error, time.time(), job, cid),
+            )
+            self._conn.commit()
+
+    def rows(self, job, cids=None):
+        """
+        書き込み済みの行（再生成中の作品は前回の行）を、CIDの登録順に返す。
+        cidsを指定した場合はそのCIDの行だけを返す（同じジョブで以前に処理した別のCIDの行を含めない）。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT cid, row FROM items WHERE job = ? AND row IS NOT NULL ORDER BY seq", (job,)
+            ).fetchall()
+        wanted = set(cids) if cids is not None else None
+        return [json.loads(row) for cid, row in rows if wanted is None or cid in wanted]
+
+    def summary(self, job):
+        """段階ごとの件数と失敗件数を返す。例: {"written": 90, "fetched": 3, "pending": 7, "failed": 4}"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT stage, COUNT(*) FROM items WHERE job = ? GROUP BY stage", (job,)
+            ).fetchall())
+            counts["failed"] = self._conn.execute(
+                "SELECT COUNT(*) FROM items WHERE job = ? AND failed = 1", (job,)
+            ).fetchone()[0]
+        return counts
+
+    def reset(self, job):
+        """ジョブの記録を全て削除する（最初からやり直す）。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM items WHERE job = ?", (job,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
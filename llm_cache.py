@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES
+
+class LLMCache:
+    """
+    LLMが生成したクリップリストを保存するSQLiteキャッシュ。
+
+    キーはモデル名と送信メッセージ（システムプロンプトを含む）のSHA-256。
+    タイトル・あらすじ・ジャンル・キーワード・クリップ数が同じであれば同じキーになるため、
+    CSVのレイアウト変更後にバッチを再実行してもLLMを呼び出さずに済む。
+    エントリ数がmax_entriesを超えた場合、最終アクセスが古いものから削除する（LRU）。
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS clips (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                clips TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_clips_last_access ON clips(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model, messages):
+        """モデル名と送信メッセージからキャッシュキー（プロンプトのフィンガープリント）を生成する。"""
+        payload = json.dumps({"model": model, "messages": messages}, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """キャッシュ済みのクリップリストを返す。無い場合はNone。"""
+        with self._lock:
+            row = self._conn.execute("SELECT clips FROM clips WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE clips SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key, model, clips):
+        """クリップリストを保存し、必要に応じてLRU削除を行う。"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO clips (key, model, clips, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(clips, ensure_ascii=False), now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM clips").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM clips WHERE key IN (SELECT key FROM clips ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def invalidate(self, key):
+        """指定したキーのエントリを削除する。"""
+        with self._lock:
+            self._conn.execute("DELETE FROM clips WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self, model=None):
+        """キャッシュを削除する。modelを指定した場合はそのモデルのエントリのみ削除する。"""
+        with self._lock:
+            if model is None:
+                self._conn.execute("DELETE FROM clips")
+            else:
+                self._conn.execute("DELETE FROM clips WHERE model = ?", (model,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,125 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from final_canva_csv_generator import generate_marketing_text_with_stats, warm_up_llm
+from config import (
+    MAX_FRAMES, LLM_MAX_IN_FLIGHT, LLM_REQUEST_TIMEOUT_SEC, LLM_STREAMING, LLM_PROMPT_LAYOUT, LLM_WARMUP, MOCK_DMM_DATA,
+)
+
+def generate_marketing_texts(dmm_data_list, num_clips=MAX_FRAMES - 1, max_in_flight=LLM_MAX_IN_FLIGHT,
+                             timeout=LLM_REQUEST_TIMEOUT_SEC, refresh=False, stream=LLM_STREAMING, layout=None,
+                             warmup=LLM_WARMUP):
+    """
+    複数作品のマーケティングテキストを、同時実行数を制限しながら並列に生成する。
+    Ollamaの OLLAMA_NUM_PARALLEL に合わせて max_in_flight を設定すると、LLMサーバーの並列処理を活用できる。
+
+    Args:
+        dmm_data_list (list): DMMの作品データ（fetch_dmm_dataの戻り値）のリスト。
+        num_clips (int): 1作品あたりのクリップ数。
+        max_in_flight (int): 同時にLLMへ送信するリクエスト数の上限。
+        timeout (float): LLMリクエスト1件あたりのタイムアウト秒数。
+        refresh (bool): LLM生成結果のキャッシュを使わずに再生成する。
+        stream (bool): ストリーミングで出力を検証し、失敗時はルールベース生成に切り替える。
+        layout (str): プロンプトの形式（"legacy" / "prefix"）。Noneの場合はconfig.LLM_PROMPT_LAYOUT。
+        warmup (bool): 開始前にモデルを読み込むウォームアップのリクエストを送る（所要時間は統計に含めない）。
+
+    Returns:
+        tuple: (入力と同じ順序のクリップリストのリスト, スループット統計の辞書)。
+    """
+    def generate(dmm_data):
+        return generate_marketing_text_with_stats(dmm_data, num_clips, refresh=refresh, timeout=timeout, stream=stream,
+                                                  layout=layout)
+
+    warmup_sec = warm_up_llm(num_clips, layout, timeout) if warmup else None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        # mapは入力順に結果を返すため、完了順に関係なく作品の順序が保たれる
+        outputs = list(executor.map(generate, dmm_data_list))
+    elapsed = time.perf_counter() - started
+
+    results = [clips for clips, _ in outputs]
+    per_work = [stats for _, stats in outputs]
+    completion_tokens = sum(s["completion_tokens"] for s in per_work)
+    llm_elapsed = [s["elapsed"] for s in per_work if s["source"] == "llm"]
+    ttfts = sorted(s["ttft"] for s in per_work if s["ttft"] is not None)
+    stats = {
+        "works": len(dmm_data_list),
+        "elapsed_sec": elapsed,
+        "works_per_min": len(dmm_data_list) / elapsed * 60 if elapsed > 0 else 0.0,
+        "prompt_tokens": sum(s["prompt_tokens"] for s in per_work),
+        "completion_tokens": completion_tokens,
+        "tokens_per_sec": completion_tokens / elapsed if elapsed > 0 else 0.0,
+        "avg_request_sec": sum(llm_elapsed) / len(llm_elapsed) if llm_elapsed else 0.0,
+        "ttft_p50": statistics.median(ttfts) if ttfts else None,
+        "ttft_p95": ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.95))] if ttfts else None,
+        "layout": layout or LLM_PROMPT_LAYOUT,
+        "warmup_sec": warmup_sec,
+        "llm": sum(1 for s in per_work if s["source"] == "llm"),
+        "cache": sum(1 for s in per_work if s["source"] == "cache"),
+        "fallback": sum(1 for s in per_work if s["source"] in ("fallback", "stream_fallback")),
+        "max_in_flight": max_in_flight,
+    }
+    print_throughput(stats)
+    return results, stats
+
+def print_throughput(stats):
+    """generate_marketing_textsのスループット統計を表示する。"""
+    print("\n--- LLM並列生成の結果 ---")
+    print(f"作品数: {stats['works']} (LLM {stats['llm']} / キャッシュ {stats['cache']} / フォールバック {stats['fallback']})")
+    print(f"同時実行数: {stats['max_in_flight']}  所要時間: {stats['elapsed_sec']:.1f}秒")
+    print(f"スループット: {stats['works_per_min']:.1f} 作品/分, {stats['tokens_per_sec']:.1f} トークン/秒")
+    print(f"1リクエストあたりの平均時間: {stats['avg_request_sec']:.2f}秒")
+    if stats["ttft_p50"] is not None:
+        print(f"最初のトークンまでの時間（TTFT）: p50 {stats['ttft_p50']:.2f}秒 / p95 {stats['ttft_p95']:.2f}秒")
+
+def compare_prompt_layouts(dmm_data_list, max_in_flight=LLM_MAX_IN_FLIGHT, timeout=LLM_REQUEST_TIMEOUT_SEC):
+    """
+    従来のプロンプト形式（legacy、ウォームアップなし）と、prefix形式 + ウォームアップで同じ作品群を生成し、
+    TTFTと所要時間を比較する。TTFTを計測するためストリーミングモードで実行し、キャッシュは使わない。
+    前の計測でモデルが読み込まれた状態になるため、legacy（変更前）を先に計測する。
+
+    Returns:
+        list: [legacyの統計, prefixの統計]
+    """
+    runs = [("legacy", False), ("prefix", True)]
+    results = [generate_marketing_texts(dmm_data_list, max_in_flight=max_in_flight, timeout=timeout, refresh=True,
+                                        stream=True, layout=layout, warmup=warmup)[1]
+               for layout, warmup in runs]
+
+    def seconds(value):
+        return f"{value:.2f}秒" if value is not None else "-"
+
+    print("\n--- プロンプト形式の比較 ---")
+    print(f"{'形式':24s} {'TTFT p50':>10s} {'TTFT p95':>10s} {'所要時間':>8s} {'作品/分':>8s}  ウォームアップ")
+    for stats in results:
+        label = f"{stats['layout']}" + (" + ウォームアップ" if stats["warmup_sec"] is not None else "")
+        print(f"{label:24s} {seconds(stats['ttft_p50']):>10s} {seconds(stats['ttft_p95']):>10s} "
+              f"{stats['elapsed_sec']:7.1f}秒 {stats['works_per_min']:8.1f}  {seconds(stats['warmup_sec'])}")
+    return results
+
+if __name__ == "__main__":
+    # 実行例: モックLLMサーバーに対してスループットを計測する
+    #   python mock_llm_server.py --port 11435 --latency 2 &
+    #   (config.pyのOLLAMA_BASE_URLを http://localhost:11435/v1 に設定)
+    #   python llm_pool.py --works 20 --in-flight 4
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--works", type=int, default=10, help="生成する作品数（モックデータのタイトルを変えて作成）")
+    ap.add_argument("--in-flight", type=int, default=LLM_MAX_IN_FLIGHT, help="同時に送信するリクエスト数の上限")
+    ap.add_argument("--stream", action=argparse.BooleanOptionalAction, default=LLM_STREAMING, help="ストリーミングモードで生成する")
+    ap.add_argument("--timeout", type=float, default=LLM_REQUEST_TIMEOUT_SEC, help="リクエストあたりのタイムアウト秒数")
+    ap.add_argument("--prompt-layout", choices=("legacy", "prefix"), default=LLM_PROMPT_LAYOUT, help="プロンプトの形式")
+    ap.add_argument("--no-warmup", action="store_true", help="開始前のウォームアップを行わない")
+    # 実行例: python mock_llm_server.py --latency 0.5 --prefill-ms-per-char 2 --load-delay 3 &
+    #         python llm_pool.py --works 20 --compare-layouts
+    ap.add_argument("--compare-layouts", action="store_true",
+                    help="legacy形式（ウォームアップなし）とprefix形式（ウォームアップあり）のTTFT・所要時間を比較する")
+    args = ap.parse_args()
+
+    works = [dict(MOCK_DMM_DATA, title=f"{MOCK_DMM_DATA['title']} #{n}") for n in range(args.works)]
+    if args.compare_layouts:
+        compare_prompt_layouts(works, max_in_flight=args.in_flight, timeout=args.timeout)
+    else:
+        generate_marketing_texts(works, max_in_flight=args.in_flight, timeout=args.timeout, refresh=True,
+                                 stream=args.stream, layout=args.prompt_layout, warmup=not args.no_warmup)
@@ -0,0 +1,120 @@
+import json
+
+class MalformedOutputError(ValueError):
+    """ストリーミング中のLLM出力が、クリップ配列として解釈できない形式になった場合に送出される。"""
+
+def validate_clip(clip, max_top_chars, max_bottom_chars):
+    """
+    1クリップ分のオブジェクトを検証する。
+
+    Raises:
+        MalformedOutputError: top_text / bottom_text が無い、空、または長すぎる場合。
+    """
+    if not isinstance(clip, dict):
+        raise MalformedOutputError(f"クリップがオブジェクトではありません: {clip!r}")
+    for key, limit in (("top_text", max_top_chars), ("bottom_text", max_bottom_chars)):
+        value = clip.get(key)
+        if not isinstance(value, str) or not value.strip():
+            raise MalformedOutputError(f"クリップに{key}がありません: {clip!r}")
+        if len(value) > limit:
+            raise MalformedOutputError(f"{key}が長すぎます（{len(value)}文字 > {limit}文字）")
+
+class ClipStreamParser:
+    """
+    LLMのストリーミング出力を受け取りながら、クリップ配列を逐次パースするパーサー。
+
+    文字列・エスケープ・括弧の深さを追跡し、クリップのオブジェクトが閉じた時点でjson.loadsと検証を行う。
+    次のいずれの出力形式にも対応する（parse_clipsと同じ）。
+      - [{...}, {...}]
+      - {"response": [{...}, ...]}（キー名は問わない）
+      - {"clip_1": {...}, "clip_2": {...}}
+    形式が崩れた時点、またはmax_charsを超えた時点でMalformedOutputErrorを送出する。
+    """
+
+    def __init__(self, num_clips, max_chars, max_top_chars, max_bottom_chars):
+        self.num_clips = num_clips
+        self.max_chars = max_chars
+        self.max_top_chars = max_top_chars
+        self.max_bottom_chars = max_bottom_chars
+        self.clips = []
+        self._buffer = []
+        self._length = 0
+        self._stack = []          # 開いているコンテナ（"[" または "{"）
+        self._clip_start = None   # 現在のクリップオブジェクトの開始位置（_buffer内の文字位置）
+        self._clip_depth = None
+        self._in_string = False
+        self._escape = False
+        self._closed = False
+
+    @property
+    def done(self):
+        """必要な数のクリップが揃ったか、ルート要素が閉じた場合にTrue。"""
+        return len(self.clips) >= self.num_clips or self._closed
+
+    def _is_clip_container(self):
+        # ルート配列の直下、ルートオブジェクトの値、またはルートオブジェクト内の配列の直下がクリップ
+        return self._stack in (["["], ["{"], ["{", "["])
+
+    def feed(self, text):
+        """
+        出力の断片を追加し、新たに完成したクリップのリストを返す。
+
+        Raises:
+            MalformedOutputError: 出力が不正な形式になった場合、または長さの上限を超えた場合。
+        """
+        new_clips = []
+        for ch in text:
+            if self._closed:
+                break
+            position = self._length
+            self._buffer.append(ch)
+            self._length += 1
+            if self._length > self.max_chars:
+                raise MalformedOutputError(f"出力が長すぎます（{self.max_chars}文字超）")
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch.isspace():
+                continue
+            if not self._stack and ch not in "[{":
+                # ```json のようなコードフェンスを含め、ルートが配列・オブジェクト以外は不正とみなす
+                raise MalformedOutputError(f"出力がJSON配列/オブジェクトで始まっていません: {ch!r}")
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                if ch == "{" and self._clip_start is None and self._is_clip_container():
+                    self._clip_start = position
+                    self._clip_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch in "]}":
+                expected = "[" if ch == "]" else "{"
+                if not self._stack or self._stack[-1] != expected:
+                    raise MalformedOutputError(f"括弧の対応が不正です: {ch!r}")
+                self._stack.pop()
+                if ch == "}" and self._clip_start is not None and len(self._stack) == self._clip_depth:
+                    new_clips.append(self._complete_clip(position, len(self.clips) + len(new_clips) + 1))
+                if not self._stack:
+                    self._closed = True
+
+        self.clips.extend(new_clips)
+        return new_clips
+
+    def _complete_clip(self, end, clip_index):
+        raw = "".join(self._buffer[self._clip_start:end + 1])
+        self._clip_start = None
+        self._clip_depth = None
+        try:
+            clip = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise MalformedOutputError(f"クリップのJSONが不正です: {e}")
+        validate_clip(clip, self.max_top_chars, self.max_bottom_chars)
+        clip.setdefault("clip_index", clip_index)
+        return clip
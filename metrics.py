@@ -0,0 +1,281 @@
+import argparse
+import bisect
+import json
+import os
+import random
+import threading
+import time
+
+from config import METRICS_ENABLED, METRICS_JSON_PATH, METRICS_PROM_PATH
+
+# Prometheusのメトリクス名の接頭辞
+PREFIX = "canva_"
+
+# 名前が "_seconds" で終わるヒストグラムのバケット（秒）と、それ以外（トークン数・バイト数など）のバケット
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# パーセンタイル計算用に保持する観測値の最大数（超えたらリザーバーサンプリング）
+RESERVOIR_SIZE = 10_000
+
+class Histogram:
+    """累積バケット・合計・件数と、パーセンタイル計算用の観測値のサンプルを保持する。"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(value)
+        else:
+            i = random.randrange(self.count)
+            if i < RESERVOIR_SIZE:
+                self.samples[i] = value
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+        }
+
+class Registry:
+    """カウンターとヒストグラムをメトリクス名とラベルの組ごとに保持する。スレッドセーフ。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # (name, labels) -> 値
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.started_at = time.time()
+
+    def inc(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(
+                    LATENCY_BUCKETS if name.endswith("_seconds") else SIZE_BUCKETS)
+            histogram.observe(value)
+
+_registry = Registry()
+_enabled = METRICS_ENABLED
+
+def enable(on=True):
+    """計測を有効（または無効）にする。"""
+    global _enabled
+    _enabled = on
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """集計値を全て破棄する。"""
+    global _registry
+    _registry = Registry()
+
+def inc(name, value=1, **labels):
+    """カウンターにvalueを加算する。無効の場合は何もしない。"""
+    if not _enabled:
+        return
+    _registry.inc(name, value, labels)
+
+def observe(name, value, **labels):
+    """ヒストグラムに観測値を追加する。無効の場合は何もしない。"""
+    if not _enabled:
+        return
+    _registry.observe(name, value, labels)
+
+class _Timer:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _registry.observe(self.name, time.perf_counter() - self.started, self.labels)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name, **labels):
+    """
+    withブロックの経過時間（秒）をヒストグラムに記録するコンテキストマネージャー。
+    無効の場合は何もしない共有のオブジェクトを返す。
+
+    例:
+        with metrics.timer("stage_seconds", stage="fetch"):
+            dmm_data = fetch_dmm_data(cid)
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+def derived_metrics(counters, histograms):
+    """集計値から、トークン/秒やフォールバック率などの比率を計算する。"""
+    def counter_sum(name, **match):
+        return sum(v for (n, labels), v in counters.items()
+                   if n == name and all(dict(labels).get(k) == want for k, want in match.items()))
+
+    llm_seconds = sum(h.sum for (n, labels), h in histograms.items()
+                      if n == "llm_request_seconds" and dict(labels).get("outcome") == "llm")
+    completion = counter_sum("llm_tokens", kind="completion")
+    generations = counter_sum("llm_generations")
+    fallbacks = counter_sum("llm_generations", source="fallback") + counter_sum("llm_generations", source="stream_fallback")
+    http_total = counter_sum("http_responses")
+    return {
+        "llm_completion_tokens_per_sec": round(completion / llm_seconds, 2) if llm_seconds else None,
+        "llm_fallback_rate": round(fallbacks / generations, 4) if generations else None,
+        "http_error_rate": round((http_total - counter_sum("http_responses", status_class="2xx")
+                                  - counter_sum("http_responses", status_class="3xx")) / http_total, 4)
+                           if http_total else None,
+    }
+
+def report():
+    """集計値をJSONにできる辞書で返す。"""
+    registry = _registry
+    with registry._lock:
+        counters = dict(registry.counters)
+        histograms = {key: h for key, h in registry.histograms.items()}
+        result = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(registry.started_at)),
+            "elapsed_sec": round(time.time() - registry.started_at, 3),
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters.items())],
+            "histograms": [{"name": n, "labels": dict(l), **h.to_dict()}
+                           for (n, l), h in sorted(histograms.items(), key=lambda item: item[0])],
+        }
+        result["derived"] = derived_metrics(counters, histograms)
+    return result
+
+def _prom_escape(value):
+    # ラベル値ではバックスラッシュ・ダブルクォート・改行をエスケープする
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_prom_escape(v)}"' for k, v in items) + "}"
+
+def _prom_number(value):
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+def prometheus_text():
+    """Prometheusのテキスト形式（textfile collector用）で集計値を返す。"""
+    registry = _registry
+    lines = []
+    with registry._lock:
+        by_name = {}
+        for (name, labels), value in sorted(registry.counters.items()):
+            by_name.setdefault(name, []).append((labels, value))
+        for name, series in by_name.items():
+            metric = f"{PREFIX}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines += [f"{metric}{_prom_labels(labels)} {_prom_number(value)}" for labels, value in series]
+
+        by_name = {}
+        for (name, labels), histogram in sorted(registry.histograms.items(), key=lambda item: item[0]):
+            by_name.setdefault(name, []).append((labels, histogram))
+        for name, series in by_name.items():
+            metric = f"{PREFIX}{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, h in series:
+                cumulative = 0
+                for bound, count in zip(list(h.buckets) + [float("inf")], h.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_prom_labels(labels, {'le': _prom_number(bound)})} {cumulative}")
+                lines.append(f"{metric}_sum{_prom_labels(labels)} {_prom_number(h.sum)}")
+                lines.append(f"{metric}_count{_prom_labels(labels)} {h.count}")
+    lines.append(f"# TYPE {PREFIX}last_run_timestamp_seconds gauge")
+    lines.append(f"{PREFIX}last_run_timestamp_seconds {time.time():.0f}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    # textfile collectorが書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def dump(json_path=METRICS_JSON_PATH, prom_path=METRICS_PROM_PATH):
+    """
+    集計値をJSONのレポートとPrometheusのテキスト形式で書き出す。無効の場合は何もしない。
+    どちらかのパスにNoneを指定した場合、その形式は書き出さない。
+    """
+    if not _enabled:
+        return
+    if json_path:
+        _write_atomic(json_path, json.dumps(report(), ensure_ascii=False, indent=2))
+    if prom_path:
+        _write_atomic(prom_path, prometheus_text())
+    print(f"メトリクスを書き出しました: {json_path or '-'} / {prom_path or '-'}")
+
+def status_class(status_code):
+    """HTTPステータスコードを "2xx" などの分類に変換する（ラベルの種類を増やしすぎないため）。"""
+    return f"{status_code // 100}xx"
+
+def benchmark_overhead(calls=1_000_000):
+    """計測呼び出し1回あたりのコストを、無効時と有効時で比較する。"""
+    def run():
+        started = time.perf_counter()
+        for _ in range(calls):
+            inc("bench", stage="x")
+            with timer("bench_seconds", stage="x"):
+                pass
+        return (time.perf_counter() - started) / calls * 1e9
+
+    was_enabled = _enabled
+    try:
+        enable(False)
+        disabled_ns = run()
+        enable(True)
+        enabled_ns = run()
+    finally:
+        enable(was_enabled)
+        reset()
+    print(f"inc + timer 1回あたり: 無効 {disabled_ns:.0f}ns / 有効 {enabled_ns:.0f}ns ({calls:,}回)")
+    return disabled_ns, enabled_ns
+
+if __name__ == "__main__":
+    # 実行例: python metrics.py --bench 1000000
+    ap = argparse.ArgumentParser(description="メトリクス計測のオーバーヘッドを計測する")
+    ap.add_argument("--bench", type=int, default=200_000, help="計測呼び出しの回数")
+    args = ap.parse_args()
+    benchmark_overhead(args.bench)
@@ -0,0 +1,100 @@
+import argparse
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from mock_viewer_server import MockViewerHandler
+
+ITEM_LIST_PATH = "/affiliate/v3/ItemList"
+
+GENRES = ("SF/ファンタジー", "恋愛", "ミステリー", "コメディ", "ホラー")
+TAGS = ("AI美女", "未来都市", "幻想的", "学園", "異世界", "日常", "感動", "サスペンス")
+
+def build_item(base_url, cid, pages):
+    """CIDから決まった内容の、ItemListの1作品分のitemを作成する（extract_item_dataが読む項目のみ）。"""
+    n = sum(map(ord, cid))
+    return {
+        "content_id": cid,
+        "title": f"モック作品 {cid}【第{n % 12 + 1}巻】",
+        "affiliateURL": f"{base_url}/detail/cid={cid}/?pages={pages}",
+        "iteminfo": {
+            "description": (f"{cid}の物語。平凡な日常が、ある出会いをきっかけに一変する。"
+                            f"予想を裏切る展開の連続に目が離せない。シリーズ累計{n % 90 + 10}万部突破の話題作。"),
+            "maker": [{"name": f"モック出版{n % 7}"}],
+            "genre": [{"name": GENRES[n % len(GENRES)]}],
+            "tag": [{"name": TAGS[(n + i) % len(TAGS)]} for i in range(3)],
+        },
+    }
+
+class MockDMMHandler(MockViewerHandler):
+    """
+    DMM APIと作品詳細ページを模擬するハンドラー。MockViewerHandlerの作品詳細ページ・ビューアに加えて、
+      /affiliate/v3/ItemList?cid=<cid>           1作品分のitem
+      /affiliate/v3/ItemList?hits=N&offset=M     catalog_size件のカタログのページング
+    を返す。dmm_api.DMM_API_ENDPOINT を f"{base_url}/affiliate/v3/ItemList" に置き換えて使用する。
+    """
+
+    api_latency = 0.0
+    detail_latency = 0.0
+    catalog_size = 1000
+    pages = 8
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        base_url = f"http://{self.headers['Host']}"
+        if url.path == ITEM_LIST_PATH:
+            time.sleep(self.api_latency)
+            query = parse_qs(url.query)
+            if "cid" in query:
+                items = [build_item(base_url, query["cid"][0], self.pages)]
+                total = 1
+                offset = 1
+            else:
+                hits = int(query.get("hits", ["20"])[0])
+                offset = int(query.get("offset", ["1"])[0])
+                total = self.catalog_size
+                items = [build_item(base_url, f"mock{n:06d}", self.pages)
+                         for n in range(offset, min(offset + hits, total + 1))]
+            body = {"result": {"status": 200, "result_count": len(items), "total_count": total,
+                               "first_position": offset, "items": items}}
+            self._send(json.dumps(body, ensure_ascii=False), "application/json; charset=utf-8")
+            return
+        if url.path.startswith("/detail/"):
+            time.sleep(self.detail_latency)
+        super().do_GET()
+
+def start_mock_dmm_server(host="127.0.0.1", port=0, api_latency=0.0, detail_latency=0.0, catalog_size=1000, pages=8):
+    """
+    モックDMMサーバーをバックグラウンドスレッドで起動する。
+
+    Returns:
+        tuple: (ThreadingHTTPServer, base_url, ItemListのエンドポイントURL)
+    """
+    handler = type("Handler", (MockDMMHandler,), {
+        "api_latency": api_latency, "detail_latency": detail_latency, "catalog_size": catalog_size, "pages": pages,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    return server, base_url, base_url + ITEM_LIST_PATH
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="DMM API（ItemList）と作品詳細ページのモックサーバー")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--api-latency", type=float, default=0.0, help="ItemListの応答遅延（秒）")
+    ap.add_argument("--detail-latency", type=float, default=0.0, help="作品詳細ページの応答遅延（秒）")
+    ap.add_argument("--catalog-size", type=int, default=1000, help="ページング時の総作品数")
+    args = ap.parse_args()
+
+    server, base_url, endpoint = start_mock_dmm_server(args.host, args.port, args.api_latency,
+                                                       args.detail_latency, args.catalog_size)
+    print(f"モックDMMサーバーを起動しました: {endpoint}  (dmm_api.DMM_API_ENDPOINT に設定, Ctrl+Cで終了)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
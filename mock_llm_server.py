@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+KEEP_ALIVE_DEFAULT_SEC = 300  # Ollamaの既定値（5分）
+PREFIX_SLOTS = 4  # KVキャッシュを保持するプロンプトの数（OLLAMA_NUM_PARALLELに相当）
+
+def parse_keep_alive(value):
+    """keep_alive（"30m", "10s", "1h", 秒数）を秒に変換する。"""
+    if value is None:
+        return KEEP_ALIVE_DEFAULT_SEC
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", str(value).strip())
+    if not m:
+        return KEEP_ALIVE_DEFAULT_SEC
+    return float(m.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[m.group(2)]
+
+class MockLLMState:
+    """モックLLMサーバーの設定と計測値（リクエスト数・最大同時接続数）を保持する。"""
+
+    def __init__(self, latency=1.0, completion_tokens=120, chunk_chars=4, chunk_delay=0.0, malformed_rate=0.0, seed=None,
+                 prefill_ms_per_char=0.0, load_delay=0.0):
+        self.latency = latency
+        self.completion_tokens = completion_tokens
+        self.chunk_chars = chunk_chars    # ストリーミング時に1チャンクで送る文字数
+        self.chunk_delay = chunk_delay    # ストリーミング時のチャンク間の遅延（秒）
+        self.malformed_rate = malformed_rate  # 不正な形式の出力を返す割合（0.0-1.0）
+        self.malformed = 0
+        self._random = random.Random(seed)
+        # プロンプト処理とモデル読み込みの模擬: 直近のプロンプトと共通する先頭部分はKVキャッシュにあるとみなし、
+        # 残りの文字数 × prefill_ms_per_char だけ最初のトークンが遅れる。モデルはkeep_aliveの間だけ保持される
+        self.prefill_ms_per_char = prefill_ms_per_char
+        self.load_delay = load_delay
+        self.cold_loads = 0
+        self.prompt_chars = 0
+        self.cached_chars = 0
+        self._recent_prompts = deque(maxlen=PREFIX_SLOTS)
+        self._loaded_until = 0.0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def prepare(self, prompt, keep_alive=None):
+        """
+        プロンプトを受け付け、最初のトークンまでに追加でかかる時間（モデル読み込み + プロンプト処理、秒）を返す。
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            if self.load_delay and now >= self._loaded_until:
+                self.cold_loads += 1
+                delay += self.load_delay
+            cached = max((len(os.path.commonprefix([prompt, p])) for p in self._recent_prompts), default=0)
+            self.prompt_chars += len(prompt)
+            self.cached_chars += cached
+            self._recent_prompts.append(prompt)
+            self._loaded_until = now + delay + parse_keep_alive(keep_alive)
+        return delay + (len(prompt) - cached) * self.prefill_ms_per_char / 1000
+
+    def should_malform(self):
+        with self._lock:
+            if self.malformed_rate and self._random.random() < self.malformed_rate:
+                self.malformed += 1
+                return True
+            return False
+
+# 不正な出力の例: コードフェンス付き・途中で途切れたJSON・クリップに必須項目が無い
+MALFORMED_OUTPUTS = (
+    '```json\n[{"clip_index": 1, "top_text": "見出し"}]\n```',
+    '[{"clip_index": 1, "top_text": "【見出し】", "bottom_text": "途中で途切れ',
+    '[{"clip_index": 1, "headline": "見出し", "body": "本文"}]',
+)
+
+def build_clips(prompt):
+    """システムプロンプトからクリップ数とタイトルを読み取り、それらしいクリップリストを作成する。"""
+    m = re.search(r"全(\d+)つのクリップ", prompt)
+    num_clips = int(m.group(1)) if m else 4
+    m = re.search(r"タイトル: (.*)", prompt)
+    title = m.group(1).strip() if m else "タイトルなし"
+    return [
+        {"clip_index": i, "top_text": f"【見出し{i}】", "bottom_text": f"{title[:15]}\n（クリップ{i}）"}
+        for i in range(1, num_clips + 1)
+    ]
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI互換の /v1/chat/completions を模擬するハンドラー。"""
+
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+
+        self.state.enter()
+        try:
+            time.sleep(self.state.latency + self.state.prepare(prompt, request.get("keep_alive")))
+            content = json.dumps(build_clips(prompt), ensure_ascii=False)
+            if self.state.should_malform():
+                content = MALFORMED_OUTPUTS[self.state.requests % len(MALFORMED_OUTPUTS)]
+            if request.get("stream"):
+                self._send_stream(request, prompt, content)
+                return
+            body = json.dumps({
+                "id": f"chatcmpl-mock-{self.state.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }],
+                "usage": {
+                    "prompt_tokens": len(prompt),
+                    "completion_tokens": self.state.completion_tokens,
+                    "total_tokens": len(prompt) + self.state.completion_tokens,
+                },
+            }, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントがストリーミングを途中で打ち切った場合
+            pass
+        finally:
+            self.state.leave()
+
+    def _send_stream(self, request, prompt, content):
+        """Server-Sent Events形式でcontentをチャンクに分けて送信する。"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(payload):
+            self.wfile.write(f"data: {payload}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None, **extra):
+            return json.dumps(dict({
+                "id": f"chatcmpl-mock-{self.state.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }, **extra), ensure_ascii=False)
+
+        size = self.state.chunk_chars
+        for i in range(0, len(content), size):
+            send(chunk({"content": content[i:i + size]}))
+            if self.state.chunk_delay:
+                time.sleep(self.state.chunk_delay)
+        send(chunk({}, "stop"))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            usage = {
+                "prompt_tokens": len(prompt),
+                "completion_tokens": self.state.completion_tokens,
+                "total_tokens": len(prompt) + self.state.completion_tokens,
+            }
+            send(json.dumps({"id": f"chatcmpl-mock-{self.state.requests}", "object": "chat.completion.chunk",
+                             "created": int(time.time()), "model": request.get("model", "mock"),
+                             "choices": [], "usage": usage}))
+        send("[DONE]")
+
+def start_mock_llm_server(host="127.0.0.1", port=0, **options):
+    """
+    モックLLMサーバーをバックグラウンドスレッドで起動する。
+
+    Args:
+        host (str): 待ち受けアドレス。
+        port (int): 待ち受けポート。0の場合は空いているポートを使用する。
+        **options: MockLLMStateの設定（latency, completion_tokens, chunk_chars, chunk_delay, malformed_rate, seed,
+                   prefill_ms_per_char, load_delay）。
+
+    Returns:
+        tuple: (ThreadingHTTPServer, MockLLMState, base_url)。base_urlはOLLAMA_BASE_URLに設定できる形式。
+    """
+    handler = type("Handler", (MockLLMHandler,), {"state": MockLLMState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, handler.state, base_url
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="OpenAI互換のモックLLMサーバー（負荷試験・動作確認用）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency", type=float, default=1.0, help="1リクエストあたりの応答遅延（秒）")
+    ap.add_argument("--completion-tokens", type=int, default=120, help="usageに報告する生成トークン数")
+    ap.add_argument("--chunk-delay", type=float, default=0.0, help="ストリーミング時のチャンク間の遅延（秒）")
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="不正な形式の出力を返す割合（0.0-1.0）")
+    ap.add_argument("--prefill-ms-per-char", type=float, default=0.0,
+                    help="KVキャッシュに無いプロンプト1文字あたりの処理時間（ミリ秒）")
+    ap.add_argument("--load-delay", type=float, default=0.0, help="モデルが読み込まれていない場合の読み込み時間（秒）")
+    args = ap.parse_args()
+
+    server, state, base_url = start_mock_llm_server(args.host, args.port, latency=args.latency,
+                                                    completion_tokens=args.completion_tokens,
+                                                    chunk_delay=args.chunk_delay, malformed_rate=args.malformed_rate,
+                                                    prefill_ms_per_char=args.prefill_ms_per_char,
+                                                    load_delay=args.load_delay)
+    print(f"モックLLMサーバーを起動しました: {base_url}  (Ctrl+Cで終了)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\nリクエスト数: {state.requests}, 最大同時接続数: {state.max_in_flight}, 不正な出力: {state.malformed}, "
+              f"モデル読み込み: {state.cold_loads}回, キャッシュ済みプロンプト: {state.cached_chars}/{state.prompt_chars}文字")
+        server.shutdown()
@@ -0,0 +1,187 @@
+import argparse
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# 作品詳細ページ: 年齢確認ゲート（Cookieで通過済みなら非表示）と、ビューアをポップアップで開く「試し読み」ボタン。
+# 試し読み画像のimgタグも含む
+# {decoy_head} / {decoy_body} には広告・計測・フォント・動画を模した重いリソースが入る（リクエスト遮断の効果確認用）
+DETAIL_HTML = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>{cid} | モック作品詳細</title>{decoy_head}</head>
+<body>{decoy_body}
+<div id="gate" style="position:fixed;inset:0;background:rgba(0,0,0,.8)">
+<p style="color:#fff">18歳以上ですか？</p><button onclick="document.cookie='age_check_done=1; max-age=86400; path=/'; this.parentNode.remove()">はい</button>
+</div>
+<script>if (document.cookie.includes("age_check_done=1")) document.getElementById("gate").remove();</script>
+<h1>モック作品 {cid}</h1>
+<p><a id="preview" href="/viewer/cid={cid}/?{query}" target="_blank"><button>試し読み</button></a></p>
+<div class="samples">{samples}</div>
+</body></html>
+"""
+
+# 静的なページ送りビューア: canvasにページごとに異なる図柄を描画し、左半分クリックで次ページへ進む
+# dupに指定したページは1ページ目と同じ図柄になる（見開きの戻りなど、重複ページの検出確認用）
+# render_msを指定すると、ページを上から帯状に分けてrender_msかけて描画する（読み込み・デコード中のビューアを模す）
+VIEWER_HTML = """<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8"><title>{cid} | モックビューア</title>
+<style>body{{margin:0;background:#222}} .viewer{{width:1080px;height:1920px}} canvas{{display:block}}</style>
+</head>
+<body>
+<div class="viewer" id="viewer"><canvas id="page" width="1080" height="1920"></canvas></div>
+<script>
+const total = {pages};
+const dup = {dup};
+const renderMs = {render_ms};
+const renderSteps = 8;
+let current = 1;
+let rendering = 0;
+const canvas = document.getElementById("page");
+const g = canvas.getContext("2d");
+const offscreen = document.createElement("canvas");
+offscreen.width = canvas.width;
+offscreen.height = canvas.height;
+function draw(page, ctx) {{
+  const n = page === dup ? 1 : page;
+  ctx.fillStyle = "hsl(" + (n * 47 % 360) + ", 40%, 85%)";
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  ctx.fillStyle = "#111";
+  for (let i = 0; i < 12; i++) {{
+    ctx.fillRect(60 + ((n * 131 + i * 83) % 900), 200 + i * 130, 40 + (n * 29 + i * 17) % 180, 60);
+  }}
+  ctx.font = "bold 160px sans-serif";
+  ctx.fillText("PAGE " + n, 200, 1000);
+}}
+function render(page) {{
+  if (!renderMs) {{
+    draw(page, g);
+    return;
+  }}
+  const token = ++rendering;
+  draw(page, offscreen.getContext("2d"));
+  g.fillStyle = "#888";
+  g.fillRect(0, 0, canvas.width, canvas.height);
+  for (let s = 1; s <= renderSteps; s++) {{
+    setTimeout(() => {{
+      if (token !== rendering) return;
+      const h = canvas.height * s / renderSteps;
+      g.drawImage(offscreen, 0, 0, canvas.width, h, 0, 0, canvas.width, h);
+    }}, renderMs * s / renderSteps);
+  }}
+}}
+canvas.addEventListener("click", (e) => {{
+  const rect = canvas.getBoundingClientRect();
+  if (e.clientX - rect.left < rect.width / 2 && current < total) {{
+    current += 1;
+    render(current);
+  }}
+}});
+render(current);
+</script>
+</body></html>
+"""
+
+# 別ホスト（localhost）から配信することで、ホスト名による遮断も確認できるようにする
+DECOY_HEAD = """
+<script src="http://localhost:{port}/decoy/analytics.js?cid={cid}"></script>
+<link rel="stylesheet" href="http://localhost:{port}/decoy/ads.css?cid={cid}">
+<style>@font-face {{ font-family: DecoyFont; src: url(/decoy/font.woff2?cid={cid}); }} h1 {{ font-family: DecoyFont, sans-serif; }}</style>
+"""
+DECOY_BODY = """
+<img src="http://localhost:{port}/decoy/banner.gif?cid={cid}" width="728" height="90">
+<video src="/decoy/promo.mp4?cid={cid}" autoplay muted></video>
+<iframe src="http://localhost:{port}/decoy/tracker.html?cid={cid}" width="1" height="1"></iframe>
+"""
+DECOY_TYPES = {
+    ".js": "application/javascript", ".css": "text/css", ".woff2": "font/woff2",
+    ".gif": "image/gif", ".mp4": "video/mp4", ".html": "text/html",
+}
+
+class MockViewerHandler(BaseHTTPRequestHandler):
+    """
+    FANZAブックスの作品詳細ページと試し読みビューアを模擬するハンドラー。
+      /detail/cid=<cid>/?pages=N  作品詳細ページ（クエリはそのまま試し読みのURLに引き継ぐ）
+      /viewer/cid=<cid>/?pages=N  ページ送りビューア（Nページ。&dup=K でKページ目を1ページ目と同じ図柄に、&render_ms=T で各ページをTミリ秒かけて描画する）
+      /decoy/<name>               遅延付きの重いダミーリソース（decoy_kb KB, decoy_delay 秒）
+    """
+
+    decoys = False
+    decoy_kb = 300
+    decoy_delay = 0.3
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        pages = int(query.get("pages", ["8"])[0])
+        dup = int(query.get("dup", ["0"])[0])
+        render_ms = int(query.get("render_ms", ["0"])[0])
+        parts = [p for p in url.path.split("/") if p]
+        cid = parts[1].split("=", 1)[-1] if len(parts) >= 2 else "mock"
+
+        if parts and parts[0] == "detail":
+            samples = "".join(
+                f'<img class="sample-image" data-src="http://{self.headers["Host"]}/image/{cid}/{i}.jpg">'
+                for i in range(1, pages + 1)
+            )
+            port = self.server.server_address[1]
+            decoy_head = DECOY_HEAD.format(port=port, cid=cid) if self.decoys else ""
+            decoy_body = DECOY_BODY.format(port=port, cid=cid) if self.decoys else ""
+            self._send(DETAIL_HTML.format(cid=cid, query=url.query or f"pages={pages}", samples=samples,
+                                          decoy_head=decoy_head, decoy_body=decoy_body))
+        elif parts and parts[0] == "decoy":
+            time.sleep(self.decoy_delay)
+            ext = os.path.splitext(parts[-1])[1]
+            self._send(b"/*" + b"x" * (self.decoy_kb * 1024) + b"*/", DECOY_TYPES.get(ext, "application/octet-stream"))
+        elif parts and parts[0] == "viewer":
+            self._send(VIEWER_HTML.format(cid=cid, pages=pages, dup=dup, render_ms=render_ms))
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type="text/html; charset=utf-8"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_mock_viewer_server(host="127.0.0.1", port=0, decoys=False, decoy_kb=300, decoy_delay=0.3):
+    """
+    モックビューアサーバーをバックグラウンドスレッドで起動する。
+    decoys=Trueの場合、作品詳細ページに広告・計測・フォント・動画を模した重いリソースを埋め込む。
+
+    Returns:
+        tuple: (ThreadingHTTPServer, base_url)。作品URLは f"{base_url}/detail/cid=<cid>/" の形式。
+    """
+    handler = type("Handler", (MockViewerHandler,), {"decoys": decoys, "decoy_kb": decoy_kb, "decoy_delay": decoy_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="試し読みビューアのモックサーバー（キャプチャの動作確認用）")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--works", type=int, default=5, help="URLリストに出力する作品数")
+    ap.add_argument("--pages", type=int, default=8, help="1作品あたりのページ数")
+    ap.add_argument("--decoys", action="store_true", help="作品詳細ページに重いダミーの広告・計測リソースを埋め込む")
+    args = ap.parse_args()
+
+    server, base_url = start_mock_viewer_server(args.host, args.port, decoys=args.decoys)
+    # 実行例: python fanza_capture_preview.py --url-file mock_urls.txt --concurrency 4
+    # 遮断効果の確認（--decoys で起動）: python fanza_capture_preview.py --url-file mock_urls.txt --block-host localhost --compare-blocking
+    with open("mock_urls.txt", "w", encoding="utf-8") as f:
+        for n in range(1, args.works + 1):
+            f.write(f"{base_url}/detail/cid=mock{n:03d}/?pages={args.pages}\n")
+    print(f"モックビューアサーバーを起動しました: {base_url}  (作品URLを mock_urls.txt に出力, Ctrl+Cで終了)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dmm_api import get_default_client
+from final_canva_csv_generator import (
+    DEFAULT_OUTPUT_FILENAME, build_canva_row, canva_columns, generate_marketing_text_with_stats, load_cids,
+    open_csv_writer, warm_up_llm,
+)
+from frame_ranking import load_capture_images
+from rule_based_text_generator import generate_rule_based_text
+import metrics
+from config import (
+    MAX_FRAMES, MOCK_DMM_DATA, LLM_STREAMING, LLM_PROMPT_LAYOUT, LLM_WARMUP, METRICS_ENABLED,
+    PIPELINE_FETCH_CONCURRENCY, PIPELINE_SCRAPE_CONCURRENCY, PIPELINE_GENERATE_CONCURRENCY, PIPELINE_QUEUE_SIZE,
+)
+
+_DONE = object()  # ステージの終了を次のステージに伝える目印
+
+class Stage:
+    """
+    パイプラインの1ステージ。funcは作品ごとの辞書を受け取って書き換える同期関数で、
+    concurrency本のスレッドで同時に実行される。
+
+    前のステージで失敗した作品（item["error"]あり）はfuncを呼ばずに次へ渡す。
+    always=Trueのステージ（CSV書き込みなど）は失敗した作品にもfuncを呼ぶ。
+    """
+
+    def __init__(self, name, func, concurrency=1, always=False):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.always = always
+        self.processed = 0
+        self.errors = 0
+        self.busy_sec = 0.0
+
+class Pipeline:
+    """
+    ステージを上限付きのasyncio.Queueで接続して実行するパイプライン。
+
+    - 各ステージはconcurrency個のワーカーで、専用のスレッドプールを使って同期関数を実行する。
+    - キューが満杯になると前のステージのput()が待機するため、遅いステージに作品が溜まりすぎない。
+    - 実行中、monitor_interval秒ごとに各ステージの入力キューの長さを記録し、
+      終了後にステージごとの稼働率（処理時間 / (経過時間 × 同時実行数)）とあわせて報告する。
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE, monitor_interval=0.1):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.monitor_interval = monitor_interval
+
+    async def _worker(self, stage, executor, inbox, outbox):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            if stage.always or not item.get("error"):
+                started = time.perf_counter()
+                try:
+                    await loop.run_in_executor(executor, stage.func, item)
+                except Exception as e:
+                    stage.errors += 1
+                    item["error"] = item.get("error") or f"{stage.name}: {type(e).__name__}: {e}"
+                busy = time.perf_counter() - started
+                stage.busy_sec += busy
+                stage.processed += 1
+                metrics.observe("stage_seconds", busy, stage=stage.name)
+            await outbox.put(item)
+
+    async def _run_stage(self, stage, inbox, outbox, next_workers):
+        with ThreadPoolExecutor(max_workers=stage.concurrency, thread_name_prefix=stage.name) as executor:
+            await asyncio.gather(*(self._worker(stage, executor, inbox, outbox) for _ in range(stage.concurrency)))
+        for _ in range(next_workers):
+            await outbox.put(_DONE)
+
+    async def _feed(self, items, inbox):
+        for item in items:
+            await inbox.put(item)
+        for _ in range(self.stages[0].concurrency):
+            await inbox.put(_DONE)
+
+    async def _monitor(self, queues, samples):
+        while True:
+            for name, queue in queues:
+                samples[name].append(queue.qsize())
+                metrics.observe("queue_depth", queue.qsize(), stage=name)
+            await asyncio.sleep(self.monitor_interval)
+
+    async def run(self, items):
+        """
+        作品の辞書のリストをパイプラインに流す。
+
+        Returns:
+            tuple: (最後のステージを通過した順の作品の辞書のリスト, ステージごとの統計のリスト)
+        """
+        # 最後のステージの出力は全件を受け取るため上限なし
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages] + [asyncio.Queue()]
+        samples = {stage.name: [] for stage in self.stages}
+        started = time.perf_counter()
+
+        monitor = asyncio.create_task(self._monitor([(s.name, q) for s, q in zip(self.stages, queues)], samples))
+        next_workers = [s.concurrency for s in self.stages[1:]] + [0]
+        await asyncio.gather(
+            self._feed(items, queues[0]),
+            *(self._run_stage(stage, queues[i], queues[i + 1], next_workers[i]) for i, stage in enumerate(self.stages)),
+        )
+        monitor.cancel()
+        elapsed = time.perf_counter() - started
+
+        results = []
+        while not queues[-1].empty():
+            results.append(queues[-1].get_nowait())
+        report = [{
+            "stage": s.name,
+            "concurrency": s.concurrency,
+            "processed": s.processed,
+            "errors": s.errors,
+            "busy_sec": round(s.busy_sec, 2),
+            "utilization": s.busy_sec / (elapsed * s.concurrency) if elapsed > 0 else 0.0,
+            "queue_avg": sum(samples[s.name]) / len(samples[s.name]) if samples[s.name] else 0.0,
+            "queue_max": max(samples[s.name], default=0),
+        } for s in self.stages]
+        return results, {"elapsed_sec": elapsed, "stages": report}
+
+def print_pipeline_report(stats, queue_size=PIPELINE_QUEUE_SIZE):
+    """Pipeline.runの統計を表示する。稼働率が100%に近いステージがボトルネック。"""
+    print(f"\n--- パイプラインの統計（所要時間 {stats['elapsed_sec']:.1f}秒） ---")
+    print(f"{'ステージ':10s} {'同時実行':>6s} {'処理数':>6s} {'失敗':>4s} {'稼働率':>7s}  入力キュー 平均/最大（上限{queue_size}）")
+    for r in stats["stages"]:
+        print(f"{r['stage']:12s} {r['concurrency']:6d} {r['processed']:8d} {r['errors']:6d} {r['utilization']:8.0%}"
+              f"  {r['queue_avg']:8.1f} / {r['queue_max']}")
+
+def build_canva_stages(writer, f, status_writer=None, status_f=None, use_mock=True, refresh_llm=False,
+                       stream_llm=LLM_STREAMING, rule_based=False, captures_dir=None, prompt_layout=None,
+                       fetch_concurrency=PIPELINE_FETCH_CONCURRENCY, scrape_concurrency=PIPELINE_SCRAPE_CONCURRENCY,
+                       generate_concurrency=PIPELINE_GENERATE_CONCURRENCY):
+    """
+    Canva用CSVを作成するステージ（fetch → scrape → generate → write）を作成する。
+    各作品の辞書には "cid" のほか、ステージの進行にあわせて "dmm_data", "clips", "status", "message" が入る。
+    """
+    client = None if use_mock else get_default_client()
+
+    def fetch(item):
+        if use_mock:
+            item["dmm_data"] = dict(MOCK_DMM_DATA)
+            return
+        item["dmm_data"] = client.fetch_item(item["cid"])
+        if item["dmm_data"] is None:
+            item["error"] = "DMMデータの取得に失敗しました。"
+            item["status"] = "FETCH_ERROR"
+
+    def scrape(item):
+        dmm_data = item["dmm_data"]
+        local_images = load_capture_images(item["cid"], captures_dir) if captures_dir else []
+        if local_images:
+            dmm_data["image_urls"] = local_images
+        elif not use_mock:
+            dmm_data["image_urls"] = client.fetch_sample_images(dmm_data["affiliate_link"])
+
+    def generate(item):
+        if rule_based:
+            item["clips"] = generate_rule_based_text(item["dmm_data"], MAX_FRAMES - 1)
+        else:
+            item["clips"], item["llm_stats"] = generate_marketing_text_with_stats(
+                item["dmm_data"], MAX_FRAMES - 1, refresh=refresh_llm, stream=stream_llm, layout=prompt_layout)
+
+    def write(item):
+        # 書き込みは1スレッドのみで実行されるため、ファイルへのアクセスは競合しない
+        if item.get("error"):
+            item.setdefault("status", "ERROR")
+            item["message"] = item["error"]
+            print(f"[NG] {item['cid']}: {item['status']} {item['message']}")
+        else:
+            writer.writerow(build_canva_row(item["dmm_data"], item["clips"]))
+            f.flush()
+            item["status"], item["message"] = "OK", ""
+            print(f"[OK] {item['cid']}")
+        metrics.inc("works", status=item["status"])
+        if status_writer:
+            status_writer.writerow({"cid": item["cid"], "status": item["status"], "message": item["message"]})
+            status_f.flush()
+
+    return [
+        Stage("fetch", fetch, fetch_concurrency),
+        Stage("scrape", scrape, scrape_concurrency),
+        Stage("generate", generate, generate_concurrency),
+        Stage("write", write, 1, always=True),
+    ]
+
+def run_canva_pipeline(cids, output_filename=DEFAULT_OUTPUT_FILENAME, use_mock=True, append=False,
+                       status_filename=None, queue_size=PIPELINE_QUEUE_SIZE, **stage_options):
+    """
+    generate_canva_csv_batchと同じCSVを、ステージを並行に動かすパイプラインで作成する。
+    行は処理が完了した順に書き込まれる（CIDリストの順序とは異なる場合がある）。
+
+    Args:
+        cids (list): CIDのリスト。
+        output_filename (str): 出力先CSVファイル名。
+        use_mock (bool): モックデータを使用するかどうか。
+        append (bool): 既存のCSVに追記するかどうか。
+        status_filename (str): 指定した場合、CIDごとの処理結果（cid, status, message）をCSVで出力する。
+        queue_size (int): ステージ間のキューの最大長。
+        **stage_options: build_canva_stagesの引数（各ステージの同時実行数、rule_based、captures_dirなど）。
+
+    Returns:
+        tuple: (CIDごとの処理結果の辞書 {"cid", "status", "message"} のリスト, パイプラインの統計)
+    """
+    f, writer = open_csv_writer(output_filename, canva_columns(), append=append)
+    status_f = status_writer = None
+    if status_filename:
+        status_f, status_writer = open_csv_writer(status_filename, ["cid", "status", "message"], append=append)
+    if not stage_options.get("rule_based") and LLM_WARMUP:
+        warm_up_llm(MAX_FRAMES - 1, stage_options.get("prompt_layout"))
+    try:
+        stages = build_canva_stages(writer, f, status_writer, status_f, use_mock=use_mock, **stage_options)
+        items, stats = asyncio.run(Pipeline(stages, queue_size).run([{"cid": cid} for cid in cids]))
+    finally:
+        f.close()
+        if status_f:
+            status_f.close()
+
+    # 書き込みステージ自体が失敗した作品には status / message が入っていない
+    results = [{"cid": item["cid"], "status": item.get("status", "ERROR"), "message": item.get("message", item.get("error", ""))}
+               for item in items]
+    ok = sum(1 for r in results if r["status"] == "OK")
+    print(f"\nCanva用のCSVファイルを生成しました: {output_filename} (成功 {ok}件 / 失敗 {len(results) - ok}件)")
+    print_pipeline_report(stats, queue_size)
+    return results, stats
+
+if __name__ == "__main__":
+    # 実行例: python pipeline.py --cid-file cids.txt --live --generate-concurrency 4 --status status.csv
+    ap = argparse.ArgumentParser(description="取得・スクレイピング・テキスト生成・CSV書き込みを並行に動かしてCSVを作成する")
+    ap.add_argument("--cid", action="append", default=[], help="処理するCID（複数指定可）")
+    ap.add_argument("--cid-file", help="CIDリストファイル（1行1CID）")
+    ap.add_argument("--output", default=DEFAULT_OUTPUT_FILENAME, help="出力CSVファイル名")
+    ap.add_argument("--status", help="CIDごとの処理結果を書き出すCSVファイル名")
+    ap.add_argument("--append", action="store_true", help="既存のCSVに追記する")
+    ap.add_argument("--live", action="store_true", help="モックではなく実際のDMM APIを使用する")
+    ap.add_argument("--refresh-llm", action="store_true", help="LLM生成結果のキャッシュを使わずに再生成する")
+    ap.add_argument("--stream", action=argparse.BooleanOptionalAction, default=LLM_STREAMING,
+                    help="LLMの出力をストリーミングで検証する（--no-streamで無効）")
+    ap.add_argument("--rule-based", action="store_true", help="LLMを使わずにルールベースでテキストを生成する")
+    ap.add_argument("--prompt-layout", choices=("legacy", "prefix"), default=LLM_PROMPT_LAYOUT,
+                    help="LLMプロンプトの形式（prefix: 共通の指示を先頭に固定し、作品ごとのデータを最後に置く）")
+    ap.add_argument("--captures", help="加工済みキャプチャ画像のフォルダ（frames.json・manifest.jsonがある作品はローカル画像を使用）")
+    ap.add_argument("--fetch-concurrency", type=int, default=PIPELINE_FETCH_CONCURRENCY)
+    ap.add_argument("--scrape-concurrency", type=int, default=PIPELINE_SCRAPE_CONCURRENCY)
+    ap.add_argument("--generate-concurrency", type=int, default=PIPELINE_GENERATE_CONCURRENCY)
+    ap.add_argument("--metrics", action="store_true", default=METRICS_ENABLED,
+                    help="ステージごとの処理時間などを計測し、終了時にJSONとPrometheus形式で書き出す")
+    ap.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE, help="ステージ間のキューの最大長")
+    args = ap.parse_args()
+    metrics.enable(args.metrics)
+
+    cids = list(args.cid)
+    if args.cid_file:
+        cids += load_cids(args.cid_file)
+    if not cids:
+        ap.error("--cid または --cid-file を指定してください")
+
+    run_canva_pipeline(cids, output_filename=args.output, use_mock=not args.live, append=args.append,
+                       status_filename=args.status, queue_size=args.queue_size, refresh_llm=args.refresh_llm,
+                       stream_llm=args.stream, rule_based=args.rule_based, captures_dir=args.captures,
+                       prompt_layout=args.prompt_layout,
+                       fetch_concurrency=args.fetch_concurrency, scrape_concurrency=args.scrape_concurrency,
+                       generate_concurrency=args.generate_concurrency)
+    metrics.dump()
@@ -0,0 +1,251 @@
+import argparse
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (CAPTURES_DIR, POSTPROCESS_CROP, POSTPROCESS_WIDTH, POSTPROCESS_FORMAT, POSTPROCESS_QUALITY,
+                    POSTPROCESS_MAX_KB, POSTPROCESS_WORKERS)
+
+MANIFEST_NAME = "manifest.json"
+OUTPUT_SUBDIR = "processed"
+FORMAT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+MIN_QUALITY = 30  # 目標サイズに収めるために下げる品質の下限
+
+def default_settings():
+    """config.pyの後処理設定を辞書で返す。マニフェストに保存し、設定変更時の再生成判定に使う。"""
+    return {
+        "crop": list(POSTPROCESS_CROP),
+        "width": POSTPROCESS_WIDTH,
+        "format": POSTPROCESS_FORMAT,
+        "quality": POSTPROCESS_QUALITY,
+        "max_kb": POSTPROCESS_MAX_KB,
+    }
+
+def encode_image(image, fmt, quality, max_kb=0):
+    """
+    画像をWebPまたはJPEGにエンコードする。
+    max_kbが指定されている場合、サイズが収まるまで品質を二分探索で下げる（下限はMIN_QUALITY。
+    qualityがそれより低い場合はqualityのまま）。
+
+    Returns:
+        tuple: (エンコード済みのバイト列, 使用した品質)
+    """
+    def encode(q):
+        buf = io.BytesIO()
+        if fmt == "jpeg":
+            image.convert("RGB").save(buf, "JPEG", quality=q, optimize=True, progressive=True)
+        else:
+            image.save(buf, "WEBP", quality=q, method=4)
+        return buf.getvalue()
+
+    data = encode(quality)
+    if max_kb <= 0 or len(data) <= max_kb * 1024:
+        return data, quality
+
+    # 指定された品質が下限より低い場合に、指定より高い品質で出力しないようにする
+    floor = min(MIN_QUALITY, quality)
+    best, best_q = None, floor
+    low, high = floor, quality - 1
+    while low <= high:
+        q = (low + high) // 2
+        candidate = encode(q)
+        if len(candidate) <= max_kb * 1024:
+            best, best_q = candidate, q
+            low = q + 1
+        else:
+            high = q - 1
+    if best is None:
+        # 下限の品質でも収まらない場合は、下限の品質で出力する
+        best = data if floor == quality else encode(floor)
+    return best, best_q
+
+def process_image(src, dst, settings):
+    """
+    1枚の画像を切り抜き・縮小・エンコードしてdstに保存する。ProcessPoolExecutorのワーカーで実行される。
+
+    Returns:
+        dict: マニフェストに記録する画像情報。
+    """
+    from PIL import Image
+
+    with Image.open(src) as im:
+        im.load()
+    left, top, right, bottom = settings["crop"]
+    if any((left, top, right, bottom)):
+        im = im.crop((left, top, im.width - right, im.height - bottom))
+    if settings["width"] and im.width > settings["width"]:
+        height = round(im.height * settings["width"] / im.width)
+        im = im.resize((settings["width"], height), Image.LANCZOS)
+
+    data, quality = encode_image(im, settings["format"], settings["quality"], settings["max_kb"])
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dst)
+    return {"src": src, "path": dst, "width": im.width, "height": im.height, "bytes": len(data), "quality": quality}
+
+def list_sources(folder):
+    """キャプチャフォルダ内の page_NN.png をページ順に返す。"""
+    names = sorted(n for n in os.listdir(folder) if n.startswith("page_") and n.endswith(".png"))
+    return [os.path.join(folder, n) for n in names]
+
+def read_manifest(folder):
+    """フォルダのマニフェストを読み込む。存在しない・壊れている場合はNoneを返す。"""
+    try:
+        with open(os.path.join(folder, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest_images(folder, manifest=None):
+    """
+    マニフェストの加工済み画像の絶対パスをページ順に返す（存在しない画像は除く）。
+    マニフェストのパスはフォルダからの相対パスで記録されているため、実行時のカレントディレクトリに依存しない。
+    """
+    manifest = manifest if manifest is not None else read_manifest(folder)
+    if not manifest:
+        return []
+    paths = [os.path.abspath(os.path.join(folder, entry["path"])) for entry in manifest.get("images", [])]
+    return [path for path in paths if os.path.exists(path)]
+
+def is_up_to_date(src, dst, previous, settings):
+    """出力が存在し、元画像より新しく、同じ設定で作られている場合にTrue。"""
+    if previous is None or previous.get("settings") != settings:
+        return False
+    try:
+        return os.path.getmtime(dst) >= os.path.getmtime(src)
+    except OSError:
+        return False
+
+def plan_folder(folder, settings, force=False):
+    """
+    1作品分のフォルダについて、処理が必要な画像と再利用できる画像を振り分ける。
+
+    Returns:
+        tuple: (処理が必要な (src, dst) のリスト, 再利用できる画像情報の辞書 {元画像のファイル名: 画像情報})
+    """
+    out_dir = os.path.join(folder, OUTPUT_SUBDIR)
+    os.makedirs(out_dir, exist_ok=True)
+    previous = read_manifest(folder)
+    known = {entry["src"]: entry for entry in (previous or {}).get("images", [])}
+    ext = FORMAT_EXTENSIONS[settings["format"]]
+
+    todo, reused = [], {}
+    for src in list_sources(folder):
+        name = os.path.basename(src)
+        dst = os.path.join(out_dir, os.path.splitext(name)[0] + ext)
+        if not force and name in known and is_up_to_date(src, dst, previous, settings):
+            reused[name] = known[name]
+        else:
+            todo.append((src, dst))
+    return todo, reused
+
+def write_manifest(folder, settings, images):
+    """フォルダのマニフェスト（設定と、ページ順の出力画像リスト）を書き出す。画像のパスはフォルダからの相対パス。"""
+    manifest = {
+        "slug": os.path.basename(os.path.normpath(folder)),
+        "settings": settings,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "images": images,
+    }
+    path = os.path.join(folder, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+def postprocess_captures(folders, settings=None, workers=POSTPROCESS_WORKERS, force=False):
+    """
+    キャプチャフォルダ群の画像を、プロセスプールで並列に後処理する。
+    出力が最新の画像は処理を省略し、フォルダごとにmanifest.jsonを書き出す。
+
+    Args:
+        folders (list): captures/<cid> フォルダのリスト。
+        settings (dict): 後処理設定。Noneの場合はconfig.pyの設定（default_settings）。
+        workers (int): プロセス数。0の場合はCPUコア数。
+        force (bool): 最新かどうかに関わらず全て再処理する。
+
+    Returns:
+        dict: 処理結果の集計 {"folders", "processed", "skipped", "failed", "bytes_in", "bytes_out", "elapsed_sec"}。
+    """
+    settings = settings or default_settings()
+    if settings["format"] not in FORMAT_EXTENSIONS:
+        raise ValueError(f"未対応の出力形式です: {settings['format']}")
+
+    started = time.perf_counter()
+    plans = {folder: plan_folder(folder, settings, force) for folder in folders}
+    done = {folder: dict(reused) for folder, (_, reused) in plans.items()}
+    stats = {"folders": len(folders), "processed": 0, "skipped": sum(len(r) for _, r in plans.values()),
+             "failed": 0, "bytes_in": 0, "bytes_out": 0}
+
+    jobs = [(folder, src, dst) for folder, (todo, _) in plans.items() for src, dst in todo]
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers or None) as executor:
+            futures = [(folder, src, executor.submit(process_image, src, dst, settings)) for folder, src, dst in jobs]
+            for folder, src, future in futures:
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"[NG] {src}: {type(e).__name__}: {e}")
+                    continue
+                # マニフェストにはフォルダからの相対パスで記録する
+                entry.update(src=os.path.basename(src), path=os.path.relpath(entry["path"], folder))
+                done[folder][entry["src"]] = entry
+                stats["processed"] += 1
+                stats["bytes_in"] += os.path.getsize(src)
+                stats["bytes_out"] += entry["bytes"]
+
+    for folder in folders:
+        names = [os.path.basename(src) for src in list_sources(folder)]
+        images = [done[folder][name] for name in names if name in done[folder]]
+        write_manifest(folder, settings, images)
+        print(f"[OK] {folder}: {len(images)} images -> {os.path.join(folder, MANIFEST_NAME)}")
+
+    stats["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    return stats
+
+def find_capture_folders(root=CAPTURES_DIR):
+    """root直下で page_NN.png を含むフォルダを返す。"""
+    if not os.path.isdir(root):
+        return []
+    folders = [os.path.join(root, n) for n in sorted(os.listdir(root))]
+    return [f for f in folders if os.path.isdir(f) and list_sources(f)]
+
+def load_manifest_images(cid, root=CAPTURES_DIR):
+    """
+    作品のマニフェストから、加工済み画像の絶対パスをページ順に返す。
+    build_canva_rowに渡すdmm_dataの image_urls をこのリストに置き換えると、frame_{i}_img列がローカル画像になる。
+
+    Returns:
+        list: 画像パスのリスト。マニフェストが無い場合や画像が無い場合は空リスト。
+    """
+    return manifest_images(os.path.join(root, cid))
+
+if __name__ == "__main__":
+    # 実行例: python postprocess_captures.py --crop 0 60 0 80 --width 720 --format webp --max-kb 150
+    ap = argparse.ArgumentParser(description="キャプチャ画像を切り抜き・縮小・再エンコードし、manifest.jsonを作成する")
+    ap.add_argument("folders", nargs="*", help="処理する captures/<cid> フォルダ（省略時は --root 以下の全て）")
+    ap.add_argument("--root", default=CAPTURES_DIR, help="キャプチャのルートフォルダ")
+    ap.add_argument("--crop", type=int, nargs=4, default=list(POSTPROCESS_CROP), metavar=("LEFT", "TOP", "RIGHT", "BOTTOM"),
+                    help="削る幅（px）")
+    ap.add_argument("--width", type=int, default=POSTPROCESS_WIDTH, help="出力の幅（px）")
+    ap.add_argument("--format", choices=sorted(FORMAT_EXTENSIONS), default=POSTPROCESS_FORMAT)
+    ap.add_argument("--quality", type=int, default=POSTPROCESS_QUALITY)
+    ap.add_argument("--max-kb", type=int, default=POSTPROCESS_MAX_KB, help="1枚あたりの目標サイズ（KB）。0で品質固定")
+    ap.add_argument("--workers", type=int, default=POSTPROCESS_WORKERS, help="プロセス数（0でCPUコア数）")
+    ap.add_argument("--force", action="store_true", help="出力が最新でも全て再処理する")
+    args = ap.parse_args()
+
+    folders = args.folders or find_capture_folders(args.root)
+    if not folders:
+        ap.error(f"処理するフォルダがありません: {args.root}")
+    settings = {"crop": args.crop, "width": args.width, "format": args.format,
+                "quality": args.quality, "max_kb": args.max_kb}
+    stats = postprocess_captures(folders, settings, workers=args.workers, force=args.force)
+    print(f"\n処理 {stats['processed']}枚 / スキップ {stats['skipped']}枚 / 失敗 {stats['failed']}枚 "
+          f"({stats['folders']}作品, {stats['elapsed_sec']}秒)")
+    if stats["bytes_in"]:
+        print(f"サイズ: {stats['bytes_in'] / 1024:.0f} KB -> {stats['bytes_out'] / 1024:.0f} KB")
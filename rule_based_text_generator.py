@@ -1,4 +1,15 @@
 import re
+import argparse
+import time
+
+# generate_rule_based_text_batch用: 句読点と空白を読み飛ばしながら、先頭から3つの文（前後の空白を除く）を抽出する。
+# 1件版の re.split(r'[。、．\.]') + strip + 空文除外 と同じ文が得られ、存在しない文はNoneになる
+_SENTENCE = r"([^。、．.\s](?:[^。、．.]*[^。、．.\s])?)"
+_SKIP = r"[。、．.\s]*"
+FIRST_SENTENCES_PATTERN = re.compile(f"{_SKIP}{_SENTENCE}?" * 3)
+
+FILLER_TOP = "【見逃し厳禁】"
+FILLER_BOTTOM = "今すぐDMMをチェック！"
 
 def generate_rule_based_text(dmm_data, num_clips):
     """
@@ -65,7 +76,117 @@ def generate_rule_based_text(dmm_data, num_clips):
         
     return clips_text_data[:num_clips]
 
+def generate_rule_based_text_batch(df, num_clips):
+    """
+    generate_rule_based_text()のバッチ版。数千〜数十万件の作品を列単位でまとめて処理する。
+    
+    pandasの.str演算はpyarrowが無い環境では行ごとのPythonループになるため、
+    コンパイル済みの正規表現で先頭3文だけを切り出し、列ごとのリストから結果を組み立てる。
+    
+    Args:
+        df (pandas.DataFrame): 作品データ。title / description / genre 列を使用する
+                               （列が無い、または値が欠損している場合は1件版と同じ既定値を使う）。
+        num_clips (int): 生成するクリップの数（CTAクリップを除く）。
+        
+    Returns:
+        pandas.DataFrame: dfと同じインデックスを持ち、frame_{i}_top / frame_{i}_bottom 列（i = 1..num_clips）を含む。
+                          各行の値は generate_rule_based_text() の結果と一致する。
+    """
+    import pandas as pd
+    
+    def column(name, default):
+        if name not in df:
+            return [default] * len(df)
+        values = df[name].astype(object)
+        return [str(v) for v in values.where(values.notna(), default)]
+    
+    title = column('title', '衝撃の新作')
+    description = column('description', '物語の核心に迫る！')
+    genre = column('genre', 'ジャンル不明')
+    
+    # 1. あらすじの先頭から3つの文を取り出す（存在しない文はNone）
+    sentences = [m.groups() for m in map(FIRST_SENTENCES_PATTERN.match, description)]
+    first, second, third = zip(*sentences) if sentences else ((), (), ())
+    
+    # 2. クリップごとのテキスト（文が足りない行は汎用クリップで埋める）
+    def clip(top, bottoms):
+        return (
+            [FILLER_TOP if b is None else top for b in bottoms],
+            [FILLER_BOTTOM if b is None else b for b in bottoms],
+        )
+    
+    clips = [
+        ([f"【{g}】の常識を覆す！" for g in genre], [f"衝撃の新作『{t}』\n見逃し厳禁！" for t in title]),
+        clip("物語の始まりは…", first),
+        clip("そして、運命の歯車が回り出す", second),
+        # クリフハンガー: 3つ目の文を文字数の半分でカットする
+        clip("この結末は、誰も予想できない…", [None if s is None else s[:len(s) // 2] + "…続きは本編で！" for s in third]),
+    ]
+    filler = ([FILLER_TOP] * len(df), [FILLER_BOTTOM] * len(df))
+    
+    columns = {}
+    for i in range(1, num_clips + 1):
+        top, bottom = clips[i - 1] if i <= len(clips) else filler
+        columns[f"frame_{i}_top"] = top
+        columns[f"frame_{i}_bottom"] = bottom
+    return pd.DataFrame(columns, index=df.index, dtype=object)
+
+def clips_to_frame(clips_list, index=None):
+    """generate_rule_based_text()の結果のリストを、バッチ版と同じ列構成のDataFrameに変換する。"""
+    import pandas as pd
+    
+    rows = [{f"frame_{c['clip_index']}_{k}": c[f"{k}_text"] for c in clips for k in ("top", "bottom")} for clips in clips_list]
+    return pd.DataFrame(rows, index=index, dtype=object)
+
+def benchmark_batch(n_rows, num_clips=4):
+    """
+    DataFrameの各行に1件版を適用する場合とバッチ版の処理時間を比較し、結果が一致することを確認する。
+    """
+    import pandas as pd
+    from config import MOCK_DMM_DATA
+    
+    descriptions = [
+        MOCK_DMM_DATA['description'],
+        "運命の出会い。 二人の秘密、そして裏切り．最後に残るのは",
+        "短いあらすじ",
+        "  。、 空白だけの文を含む.あらすじ。  ",
+        "　全角空白。　。次",
+        "",
+    ]
+    df = pd.DataFrame([
+        {
+            "title": f"{MOCK_DMM_DATA['title']} #{n}",
+            "description": descriptions[n % len(descriptions)] + ("。追加の一文" * (n % 3)),
+            "genre": MOCK_DMM_DATA['genre'],
+        }
+        for n in range(n_rows)
+    ])
+    
+    started = time.perf_counter()
+    expected = clips_to_frame([generate_rule_based_text(r, num_clips) for r in df.to_dict('records')], index=df.index)
+    loop_sec = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    batch = generate_rule_based_text_batch(df, num_clips)
+    batch_sec = time.perf_counter() - started
+    
+    matched = expected[batch.columns].equals(batch)
+    
+    print(f"行数: {n_rows}")
+    print(f"1件ずつ処理: {loop_sec:.2f}秒")
+    print(f"バッチ処理:  {batch_sec:.2f}秒 ({loop_sec / batch_sec:.1f}倍)")
+    print(f"結果の一致: {'OK' if matched else 'NG'}")
+    return {"rows": n_rows, "loop_sec": loop_sec, "batch_sec": batch_sec, "matched": matched}
+
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bench", type=int, metavar="ROWS", help="指定した行数で1件版とバッチ版の処理時間を比較する")
+    args = ap.parse_args()
+    if args.bench:
+        # 実行例: python rule_based_text_generator.py --bench 100000
+        benchmark_batch(args.bench)
+        raise SystemExit
+    
     # モックデータ (config.pyからインポート)
     from config import MOCK_DMM_DATA
     
@@ -76,5 +197,6 @@ if __name__ == "__main__":
     for item in generated_texts:
         print(f"クリップ {item['clip_index']}:")
         print(f"  上段: {item['top_text']}")
-        print(f"  下段: {item['bottom_text'].replace('\n', ' ')}")
+        bottom_text = item['bottom_text'].replace('\n', ' ')
+        print(f"  下段: {bottom_text}")
         print("-" * 20)
@@ -0,0 +1,68 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 起動時に読み込まれていないことを確認する重いモジュール
+HEAVY_MODULES = ("pandas", "numpy", "openai", "bs4")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def run_with_importtime(args, cwd):
+    """
+    python -X importtime でコマンドを実行し、(所要時間（秒）, 読み込まれたトップレベルモジュールの集合) を返す。
+    """
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd,
+                          capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=HERE))
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"実行に失敗しました: {' '.join(args)}\n{proc.stderr[-2000:]}")
+    modules = set(re.findall(r"^import time:\s+\d+ \|\s+\d+ \|\s*([\w.]+)", proc.stderr, re.MULTILINE))
+    return elapsed, {m.split(".")[0] for m in modules}
+
+def measure(label, args, repeat, cwd):
+    """同じコマンドをrepeat回、新しいプロセスで実行し、所要時間の中央値と読み込まれた重いモジュールを返す。"""
+    times, loaded = [], set()
+    for _ in range(repeat):
+        elapsed, modules = run_with_importtime(args, cwd)
+        times.append(elapsed)
+        loaded |= modules & set(HEAVY_MODULES)
+    return {"label": label, "median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000,
+            "heavy_modules": sorted(loaded)}
+
+def run_startup_benchmark(repeat=5):
+    """
+    final_canva_csv_generator の起動コストを計測する。
+      - python自体の起動（基準）
+      - final_canva_csv_generator のimport
+      - ルールベース・モックデータでのCSV出力（--rule-based、pandas・openaiを読み込まない軽量な実行）
+      - LLM関連のモジュール（openai）も含めたimport（比較用）
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "out.csv")
+        cases = [
+            ("python -c pass (基準)", ["-c", "pass"]),
+            ("import final_canva_csv_generator", ["-c", "import final_canva_csv_generator"]),
+            ("CLI --rule-based (2作品)", [os.path.join(HERE, "final_canva_csv_generator.py"),
+                                         "--cid", "a", "--cid", "b", "--rule-based", "--output", output]),
+            ("import + openai + pandas (比較用)", ["-c", "import final_canva_csv_generator, openai, pandas"]),
+        ]
+        rows = [measure(label, args, repeat, tmp) for label, args in cases]
+
+    print(f"\n--- 起動時間（{repeat}回の中央値） ---")
+    for r in rows:
+        heavy = ", ".join(r["heavy_modules"]) or "なし"
+        print(f"{r['label']:40s} {r['median_ms']:7.0f}ms (最小 {r['min_ms']:.0f}ms)  重いモジュール: {heavy}")
+    return rows
+
+if __name__ == "__main__":
+    # 実行例: python startup_benchmark.py --repeat 10
+    ap = argparse.ArgumentParser(description="final_canva_csv_generatorの起動時間とimportされる重いモジュールを計測する")
+    ap.add_argument("--repeat", type=int, default=5, help="各ケースの実行回数")
+    args = ap.parse_args()
+    run_startup_benchmark(args.repeat)
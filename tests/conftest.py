@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# テストはリポジトリ直下のモジュール（dmm_api.py など）をそのままimportする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def chromium():
+    # PlaywrightのChromiumがインストールされていない環境では、ブラウザを使うテストをスキップする
+    pytest.importorskip("playwright.async_api")
+    from playwright.async_api import async_playwright, Error
+
+    async def probe():
+        async with async_playwright() as p:
+            try:
+                browser = await p.chromium.launch()
+            except Error as e:
+                if "Executable doesn't exist" in str(e):
+                    return str(e).splitlines()[0]
+                raise
+            await browser.close()
+
+    missing = asyncio.run(probe())
+    if missing:
+        pytest.skip(f"Playwrightのブラウザがありません（playwright install chromium）: {missing}")
+
+
+@pytest.fixture
+def mock_viewer():
+    from mock_viewer_server import start_mock_viewer_server
+    server, base_url = start_mock_viewer_server()
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def capture_root(tmp_path, monkeypatch):
+    # キャプチャ画像と保存した状態（.cache/）をtmp_path以下に書き出す
+    import fanza_capture_preview
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(fanza_capture_preview, "OUT_ROOT", str(tmp_path / "captures"))
+    return tmp_path / "captures"
+
+
+@pytest.fixture
+def llm(tmp_path, monkeypatch):
+    """
+    モックLLMサーバーを起動し、final_canva_csv_generatorの接続先とLLMキャッシュ（tmp_path内）を差し替える。
+    llm(**options) でサーバーを起動し、MockLLMStateを返す。
+    """
+    import final_canva_csv_generator as gen
+    from llm_cache import LLMCache
+    from mock_llm_server import start_mock_llm_server
+
+    servers = []
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(gen, "_llm_cache", cache)
+    monkeypatch.setattr(gen, "_llm_client", None)
+
+    def start(**options):
+        server, state, base_url = start_mock_llm_server(**{"latency": 0.0, "seed": 0, **options})
+        servers.append(server)
+        monkeypatch.setattr(gen, "OLLAMA_BASE_URL", base_url)
+        monkeypatch.setattr(gen, "_llm_client", None)
+        return state
+
+    start.cache = cache
+    yield start
+    for server in servers:
+        server.shutdown()
+    cache.close()
@@ -0,0 +1,149 @@
+import csv
+import io
+import os
+
+import pytest
+import requests
+from PIL import Image
+
+import asset_store
+
+
+def image_bytes(fmt, size=(32, 32)):
+    # 単色の画像はWebPだとASSET_MIN_BYTES未満になるため、ノイズ画像にする
+    buf = io.BytesIO()
+    Image.effect_noise(size, 40).convert("RGB").save(buf, fmt)
+    return buf.getvalue()
+
+
+JPEG = image_bytes("JPEG")
+PNG = image_bytes("PNG")
+WEBP = image_bytes("WEBP")
+GIF = image_bytes("GIF")
+
+
+def response(body, content_type="image/jpeg", status=200, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body
+    r._content_consumed = True  # iter_contentを_contentから返す
+    r.headers.update({"Content-Type": content_type, **(headers or {})})
+    return r
+
+
+class UrlSession:
+    # URLごとに用意したレスポンス（または例外）を返す。prefetchは複数スレッドから呼ぶためURLで引く
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    def get(self, url, timeout=None, stream=False):
+        self.calls.append(url)
+        reply = self.replies[url]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = asset_store.AssetStore(str(tmp_path / "assets"), max_workers=4, max_bytes=4096, min_bytes=100)
+    yield s
+    s.close()
+
+
+def stub(store, replies):
+    store.session = UrlSession(replies)
+    return store.session
+
+
+@pytest.mark.parametrize("body, content_type, ext", [
+    (JPEG, "image/jpeg", ".jpg"),
+    (PNG, "image/png", ".png"),
+    (WEBP, "image/webp", ".webp"),
+    (GIF, "image/gif; charset=binary", ".gif"),
+])
+def test_valid_images_are_stored_by_hash(store, body, content_type, ext):
+    stub(store, {"https://img/a": response(body, content_type)})
+    path = store.fetch("https://img/a")
+    assert path.endswith(ext) and os.path.dirname(path).startswith(store.root)
+    with open(path, "rb") as f:
+        assert f.read() == body
+
+
+@pytest.mark.parametrize("reply, message", [
+    (response(JPEG, headers={"Content-Length": "999999"}), "サイズが大きすぎます（999999 bytes）"),
+    (response(JPEG * 200), "サイズが大きすぎます（4096 bytes超）"),
+    (response(JPEG[:50]), "サイズが小さすぎます（50 bytes）"),
+    (response(JPEG, "text/html"), "画像ではありません（Content-Type: text/html）"),
+    (response(JPEG, ""), "画像ではありません（Content-Type: 不明）"),
+    (response(b"<html>" + b"x" * 200, "image/jpeg"), "画像として解釈できません"),
+    (response(b"RIFF\0\0\0\0WAVE" + b"\0" * 200, "image/webp"), "画像として解釈できません"),
+    (response(b"", status=404), "HTTP 404"),
+])
+def test_invalid_images_are_rejected(store, reply, message):
+    stub(store, {"https://img/bad": reply})
+    with pytest.raises(asset_store.AssetError) as e:
+        store.fetch("https://img/bad")
+    assert str(e.value) == message
+    assert store.lookup("https://img/bad") is None
+
+
+def test_same_content_is_stored_once(store):
+    session = stub(store, {
+        "https://img/a": response(JPEG),
+        "https://cdn/b?x=1": response(JPEG),
+        "https://img/c": response(PNG, "image/png"),
+    })
+    fetched = store.prefetch(["https://img/a", "https://cdn/b?x=1", "https://img/a", "https://img/c", "", "local.jpg"])
+    assert set(fetched) == {"https://img/a", "https://cdn/b?x=1", "https://img/c"}
+    assert fetched["https://img/a"] == fetched["https://cdn/b?x=1"] != fetched["https://img/c"]
+    assert sorted(session.calls) == ["https://cdn/b?x=1", "https://img/a", "https://img/c"]
+    files = [n for _, _, names in os.walk(store.root) for n in names if not n.startswith("index.sqlite3")]
+    assert len(files) == 2
+
+    # 検証済みのURLは再ダウンロードしない（ストアを開き直しても同じ）
+    reopened = asset_store.AssetStore(store.root)
+    try:
+        reopened.session = UrlSession({})
+        assert reopened.fetch("https://img/a") == fetched["https://img/a"][0]
+        assert reopened.session.calls == []
+    finally:
+        reopened.close()
+
+
+def test_prefetch_records_network_errors_per_url(store):
+    stub(store, {
+        "https://img/ok": response(JPEG),
+        "https://img/down": requests.exceptions.ConnectionError("connection refused"),
+        "https://img/length": response(JPEG, headers={"Content-Length": "abc"}),
+        "https://img/value": ValueError("Invalid URL"),
+    })
+    fetched = store.prefetch(["https://img/ok", "https://img/down", "https://img/length", "https://img/value"])
+    assert fetched["https://img/ok"][1] == "" and os.path.exists(fetched["https://img/ok"][0])
+    assert fetched["https://img/down"] == (None, "ConnectionError: connection refused")
+    assert fetched["https://img/length"] == (None, "Content-Lengthが不正です（abc）")
+    assert fetched["https://img/value"] == (None, "ValueError: Invalid URL")
+    # 失敗したURLは記録せず、次回の実行で再試行する
+    assert store.lookup("https://img/down") is None
+
+
+def test_localize_csv_marks_rows(store, tmp_path):
+    stub(store, {"https://img/a": response(JPEG), "https://img/bad": response(b"x" * 200, "text/html")})
+    src = tmp_path / "in.csv"
+    with open(src, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["cid", "frame_1_img", "cta_img"])
+        writer.writeheader()
+        writer.writerow({"cid": "ok", "frame_1_img": "https://img/a", "cta_img": "https://img/a"})
+        writer.writerow({"cid": "ng", "frame_1_img": "https://img/bad", "cta_img": ""})
+
+    stats = asset_store.localize_csv(str(src), str(tmp_path / "out.csv"), store)
+    assert (stats["rows"], stats["ok_rows"], stats["ng_rows"], stats["downloaded"], stats["failed"]) == (2, 1, 1, 1, 1)
+    with open(tmp_path / "out.csv", encoding="utf-8-sig", newline="") as f:
+        ok, ng = list(csv.DictReader(f))
+    assert ok["asset_status"] == "OK" and ok["frame_1_img"] == ok["cta_img"] == os.path.abspath(store.lookup("https://img/a"))
+    assert ng["frame_1_img"] == "https://img/bad"
+    assert ng["asset_status"] == "NG: frame_1_img: 画像ではありません（Content-Type: text/html）; cta_img: 画像がありません（空）"
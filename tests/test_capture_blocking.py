@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+import fanza_capture_preview as fcp
+
+# Playwrightの request.resource_type が取りうる値
+PLAYWRIGHT_RESOURCE_TYPES = {
+    "document", "stylesheet", "image", "media", "font", "script", "texttrack",
+    "xhr", "fetch", "eventsource", "websocket", "manifest", "other", "ping",
+}
+
+
+class FakeWebSocket:
+    def __init__(self, url):
+        self.url = url
+        self.closed = False
+        self.connected = False
+
+    async def close(self, code=None, reason=None):
+        self.closed = True
+
+    def connect_to_server(self):
+        self.connected = True
+        return self
+
+
+def reason(url, resource_type, **options):
+    net = fcp.RequestFilter(fcp.CaptureOptions(**options))
+    return net.block_reason(SimpleNamespace(url=url, resource_type=resource_type))
+
+
+def test_block_types_are_playwright_resource_types():
+    assert set(fcp.BLOCK_RESOURCE_TYPES) <= PLAYWRIGHT_RESOURCE_TYPES
+    assert "websocket" in fcp.BLOCK_RESOURCE_TYPES
+
+
+@pytest.mark.parametrize("resource_type", fcp.BLOCK_RESOURCE_TYPES)
+def test_blocks_by_resource_type(resource_type):
+    assert reason("https://book.example.com/x", resource_type) == f"type:{resource_type}"
+
+
+@pytest.mark.parametrize("resource_type", ["document", "script", "stylesheet", "image", "fetch", "xhr"])
+def test_viewer_resources_pass(resource_type):
+    assert reason("https://book.example.com/x", resource_type) is None
+
+
+def test_block_and_allow_hosts():
+    assert reason("https://stats.g.doubleclick.net/r", "script") == "host:stats.g.doubleclick.net"
+    assert reason("https://doubleclick.net/r", "image") == "host:doubleclick.net"
+    assert reason("https://cdn.example.com/f.woff2", "font", allow_hosts=("*.example.com",)) is None
+
+
+def test_websockets_are_blocked_and_counted():
+    net = fcp.RequestFilter(fcp.CaptureOptions(allow_hosts=("chat.example.com",)))
+    blocked, allowed = FakeWebSocket("wss://push.example.net/ws"), FakeWebSocket("wss://chat.example.com/ws")
+    asyncio.run(net.handle_websocket(blocked))
+    asyncio.run(net.handle_websocket(allowed))
+
+    assert blocked.closed and not blocked.connected
+    assert allowed.connected and not allowed.closed
+    assert net.summary()["requests"] == 2
+    assert net.summary()["blocked_by"] == {"type:websocket": 1}
+
+
+def test_capture_reports_blocked_decoys(chromium, capture_root):
+    from mock_viewer_server import start_mock_viewer_server
+    server, base_url = start_mock_viewer_server(decoys=True, decoy_kb=50, decoy_delay=0.05)
+    try:
+        opts = fcp.CaptureOptions(max_pages=2, storage_state=None, wait_mode="adaptive",
+                                  block_hosts=fcp.BLOCK_HOST_PATTERNS + ("localhost",))
+        (result,) = asyncio.run(fcp.capture_many([f"{base_url}/detail/cid=decoy/?pages=2"], opts, headful=False, concurrency=1))
+    finally:
+        server.shutdown()
+
+    assert result["status"] == "OK", result["error"]
+    # フォント・動画は種別で、別ホスト（localhost）の広告・計測はホスト名で遮断される
+    assert {"type:font", "type:media", "host:localhost"} <= set(result["blocked_by"])
+    assert result["blocked_requests"] == sum(result["blocked_by"].values())
+    assert result["requests"] > result["blocked_requests"]
+    assert result["bytes_loaded"] < 50 * 1024
+
+
+class BrokenRoutingContext:
+    # ルーティングの登録に失敗するコンテキスト（閉じられた直後など）
+    pages = []
+
+    async def route(self, pattern, handler):
+        raise RuntimeError("Target page, context or browser has been closed")
+
+    async def unroute(self, pattern, handler):
+        raise RuntimeError("Target page, context or browser has been closed")
+
+    def on(self, event, handler):
+        pass
+
+    def remove_listener(self, event, handler):
+        pass
+
+
+def test_routing_failure_is_reported_as_ng(capture_root):
+    opts = fcp.CaptureOptions(block=True)
+    result = asyncio.run(fcp.capture_work(BrokenRoutingContext(), "https://example.com/detail/cid=broken/", opts))
+    assert result["status"] == "NG"
+    assert result["error"].startswith("RuntimeError: Target page")
+    assert result["pages"] == 0
+
+
+def test_stale_pages_are_cleared_before_capture(capture_root):
+    folder = capture_root / "stale"
+    folder.mkdir(parents=True)
+    for name in ("page_01.png", "page_07.png", "cover.png"):
+        (folder / name).write_bytes(b"old")
+    opts = fcp.CaptureOptions(block=True)
+    result = asyncio.run(fcp.capture_work(BrokenRoutingContext(), "https://example.com/detail/cid=stale/", opts))
+    assert result["folder"] == str(folder)
+    assert sorted(p.name for p in folder.iterdir()) == ["cover.png"]
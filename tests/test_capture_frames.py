@@ -0,0 +1,58 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("playwright.async_api")
+
+import fanza_capture_preview as fcp
+
+
+def page_png(seed, brightness=0.0, noise=0.0):
+    # 低解像度の乱数画像を拡大した、なめらかな図柄のページ（noiseで再エンコード・描画のわずかな揺れを模す）
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray((rng.random((16, 17)) * 255).astype(np.uint8))
+    page = np.asarray(small.resize((340, 320), Image.BILINEAR), dtype=np.float32) + brightness
+    if noise:
+        page += np.random.default_rng(seed + 1000).normal(0, noise, page.shape)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(page, 0, 255).astype(np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def distance(a, b):
+    return int(np.count_nonzero(fcp.perceptual_hash(a) != fcp.perceptual_hash(b)))
+
+
+def test_perceptual_hash_shape():
+    h = fcp.perceptual_hash(page_png(1))
+    assert h.dtype == bool and h.shape == (fcp.HASH_SIZE * fcp.HASH_SIZE,)
+
+
+def test_perceptual_hash_tolerates_small_changes():
+    assert distance(page_png(1), page_png(1)) == 0
+    assert distance(page_png(1), page_png(1, brightness=12)) <= fcp.DUP_THRESHOLD_DEFAULT
+    assert distance(page_png(1), page_png(1, noise=10)) <= fcp.DUP_THRESHOLD_DEFAULT
+
+
+def test_perceptual_hash_separates_pages():
+    for seed in range(2, 12):
+        assert distance(page_png(1), page_png(seed)) > fcp.DUP_THRESHOLD_DEFAULT * 4
+
+
+def test_frame_index_finds_duplicates_of_any_earlier_page():
+    index = fcp.FrameIndex(fcp.DUP_THRESHOLD_DEFAULT)
+    cover, second, third = (fcp.perceptual_hash(page_png(seed)) for seed in (1, 2, 3))
+    assert index.find_duplicate(cover) is None
+    assert not index.same_as_last(cover)
+
+    index.add(cover, "page_01.png")
+    index.add(second, "page_02.png")
+
+    assert index.same_as_last(fcp.perceptual_hash(page_png(2, noise=10)))
+    assert not index.same_as_last(cover)
+    # 直前のページではなくても、以前のページと同じなら重複として検出する
+    assert index.find_duplicate(fcp.perceptual_hash(page_png(1, brightness=12))) == "page_01.png"
+    assert index.find_duplicate(third) is None
+    assert index.distances(second).tolist() == [distance(page_png(1), page_png(2)), 0]
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+import fanza_capture_preview as fcp
+
+PAGES = 5
+
+
+def work_urls(base_url, works, pages=PAGES, **query):
+    extra = "".join(f"&{k}={v}" for k, v in query.items())
+    return [f"{base_url}/detail/cid=mock{n:03d}/?pages={pages}{extra}" for n in range(1, works + 1)]
+
+
+def saved_pages(result):
+    return sorted(name for name in os.listdir(result["folder"]) if name.endswith(".png"))
+
+
+def page_hashes(result):
+    return [fcp.perceptual_hash(open(os.path.join(result["folder"], name), "rb").read()) for name in saved_pages(result)]
+
+
+def capture(urls, concurrency=2, **options):
+    # 最終ページで「同じ画像」を検出して止まることも確認するため、ページ数より多めに送る
+    opts = fcp.CaptureOptions(**{"max_pages": PAGES + 2, "storage_state": None, **options})
+    return asyncio.run(fcp.capture_many(urls, opts, headful=False, concurrency=concurrency))
+
+
+def test_capture_many_against_mock_viewer(chromium, mock_viewer, capture_root):
+    results = capture(work_urls(mock_viewer, 3))
+
+    assert [r["slug"] for r in results] == ["mock001", "mock002", "mock003"]
+    for r in results:
+        assert r["status"] == "OK", r["error"]
+        assert r["folder"] == os.path.join(str(capture_root), r["slug"])
+        assert r["pages"] == PAGES
+        assert saved_pages(r) == [f"page_{i:02d}.png" for i in range(1, PAGES + 1)]
+
+
+def test_capture_skips_page_identical_to_an_earlier_one(chromium, mock_viewer, capture_root):
+    # 3ページ目が1ページ目と同じ図柄のビューア: 直前のページとは異なるが、保存済みのページと重複する
+    (result,) = capture(work_urls(mock_viewer, 1, dup=3), concurrency=1)
+
+    assert result["status"] == "OK", result["error"]
+    assert result["pages"] == PAGES - 1
+    assert saved_pages(result) == [f"page_{i:02d}.png" for i in range(1, PAGES)]
+    index = fcp.FrameIndex(fcp.DUP_THRESHOLD_DEFAULT)
+    for i, h in enumerate(page_hashes(result)):
+        assert index.find_duplicate(h) is None
+        index.add(h, f"page_{i + 1:02d}.png")
+
+
+def test_adaptive_wait_captures_fully_rendered_pages_sooner(chromium, mock_viewer, capture_root):
+    # 各ページを300msかけて描画するビューア。固定待機（800ms）で撮った画像を正解として比較する
+    urls = work_urls(mock_viewer, 1, render_ms=300)
+    (fixed,) = capture(urls, concurrency=1, wait_mode="fixed")
+    expected = page_hashes(fixed)
+    shutil.rmtree(fixed["folder"])
+    (adaptive,) = capture(urls, concurrency=1, wait_mode="adaptive")
+
+    assert fixed["status"] == adaptive["status"] == "OK", (fixed["error"], adaptive["error"])
+    assert fixed["pages"] == adaptive["pages"] == PAGES
+    # 描画途中（上半分だけ・背景だけ）の画像を撮っていれば、固定待機の画像と一致しない
+    for want, got in zip(expected, page_hashes(adaptive)):
+        assert int((want != got).sum()) <= fcp.DUP_THRESHOLD_DEFAULT
+    assert adaptive["wait_ms_per_step"] < fixed["wait_ms_per_step"]
+
+
+def test_settle_polls_until_screenshots_stop_changing(chromium, mock_viewer):
+    from playwright.async_api import async_playwright
+
+    async def run():
+        async with async_playwright() as p:
+            browser = await p.chromium.launch()
+            page = await browser.new_page(viewport=fcp.VIEWPORT)
+            await page.goto(f"{mock_viewer}/viewer/cid=settle/?pages=2&render_ms=400")
+            viewer = page.locator("canvas").first
+            opts = fcp.CaptureOptions(wait_mode="adaptive")
+            _, before, _ = await fcp.settle(page, viewer, opts, 0)
+            await viewer.click(position={"x": 100, "y": 960})
+            png, after, waited = await fcp.settle(page, viewer, opts, 0, changed_from=before)
+            await page.wait_for_timeout(800)
+            final = await viewer.screenshot()
+            await browser.close()
+            return before, png, after, waited, final
+
+    before, png, after, waited, final = asyncio.run(run())
+    assert png == final
+    assert (before != after).any()
+    assert 400 <= waited < fcp.MAX_WAIT_MS_DEFAULT
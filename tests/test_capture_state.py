@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import re
+import time
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+import fanza_capture_preview as fcp
+
+AGE_COOKIE = {"name": "age_check_done", "value": "1", "domain": "127.0.0.1", "path": "/"}
+
+
+def write_state(path, cookies=(), age_sec=0):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"cookies": list(cookies), "origins": []}, f)
+    saved_at = time.time() - age_sec
+    os.utime(path, (saved_at, saved_at))
+    return saved_at
+
+
+class FakeContext:
+    # storage_state()の書き込み中に別のsave()が割り込まないかを記録する
+    active = 0
+    max_active = 0
+
+    def __init__(self, cookies):
+        self.cookies = cookies
+
+    async def storage_state(self, path):
+        FakeContext.active += 1
+        FakeContext.max_active = max(FakeContext.max_active, FakeContext.active)
+        await asyncio.sleep(0.01)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"cookies": self.cookies, "origins": []}, f)
+        FakeContext.active -= 1
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.calls = []
+
+    async def new_context(self, **kwargs):
+        self.calls.append(kwargs)
+        return object()
+
+
+def test_missing_or_broken_state_is_expired(tmp_path):
+    state = fcp.StorageState(str(tmp_path / "state.json"))
+    assert state.expires_at() == 0.0 and not state.valid()
+    (tmp_path / "state.json").write_text("{", encoding="utf-8")
+    assert not state.valid()
+
+
+def test_expiry_is_ttl_or_earliest_cookie(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = fcp.StorageState(path, ttl_sec=3600)
+
+    saved_at = write_state(path, [{**AGE_COOKIE, "expires": -1}])
+    assert state.expires_at() == pytest.approx(saved_at + 3600, abs=1)
+    assert state.valid()
+
+    cookie_expiry = time.time() + 60
+    write_state(path, [{**AGE_COOKIE, "expires": cookie_expiry}, {"name": "session", "expires": -1}])
+    assert state.expires_at() == pytest.approx(cookie_expiry)
+
+    write_state(path, [AGE_COOKIE], age_sec=3601)
+    assert not state.valid()
+    write_state(path, [{**AGE_COOKIE, "expires": time.time() - 1}])
+    assert not state.valid()
+
+
+def test_new_context_loads_only_valid_state(tmp_path):
+    path = str(tmp_path / "state.json")
+    state = fcp.StorageState(path)
+    browser = FakeBrowser()
+
+    ctx = asyncio.run(state.new_context(browser, viewport=fcp.VIEWPORT))
+    assert browser.calls[-1] == {"viewport": fcp.VIEWPORT}
+    assert not state.loaded(ctx)
+
+    write_state(path, [AGE_COOKIE])
+    ctx = asyncio.run(state.new_context(browser, viewport=fcp.VIEWPORT))
+    assert browser.calls[-1] == {"storage_state": path, "viewport": fcp.VIEWPORT}
+    assert state.loaded(ctx)
+
+    state.invalidate()
+    assert not os.path.exists(path)
+    assert not state.loaded(ctx)
+    state.invalidate()   # ファイルが無くてもよい
+
+
+def test_concurrent_saves_are_serialized(tmp_path):
+    path = str(tmp_path / "nested" / "state.json")
+    state = fcp.StorageState(path)
+    contexts = [FakeContext([{**AGE_COOKIE, "value": str(i)}]) for i in range(5)]
+
+    async def save_all():
+        await asyncio.gather(*(state.save(ctx) for ctx in contexts))
+
+    asyncio.run(save_all())
+    assert FakeContext.max_active == 1
+    assert state.saved == len(contexts)
+    assert not os.path.exists(path + ".tmp")
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["cookies"][0]["name"] == "age_check_done"
+    assert all(state.loaded(ctx) for ctx in contexts)
+
+
+def run_captures(urls, state_path, capsys):
+    opts = fcp.CaptureOptions(max_pages=2, wait_mode="adaptive", storage_state=state_path)
+    results = asyncio.run(fcp.capture_many(urls, opts, headful=False, concurrency=2))
+    skipped, saved = map(int, re.search(r"age gate skipped (\d+) times, state saved (\d+) times", capsys.readouterr().out).groups())
+    return results, skipped, saved
+
+
+def saved_cookies(path):
+    with open(path, encoding="utf-8") as f:
+        return {c["name"] for c in json.load(f)["cookies"]}
+
+
+def test_saved_state_skips_the_age_gate(chromium, mock_viewer, capture_root, capsys):
+    path = str(capture_root.parent / "state.json")
+    urls = [f"{mock_viewer}/detail/cid=state{n}/?pages=2" for n in range(3)]
+
+    results, _, saved = run_captures(urls, path, capsys)
+    assert all(r["status"] == "OK" for r in results)
+    assert saved >= 1
+    assert "age_check_done" in saved_cookies(path)
+
+    results, skipped, saved = run_captures(urls, path, capsys)
+    assert all(r["status"] == "OK" for r in results)
+    assert saved == 0
+    assert skipped >= len(urls)
+
+
+def test_state_rejected_by_site_is_invalidated_and_saved_again(chromium, mock_viewer, capture_root, capsys):
+    # 有効期限内だが、サイト側ではもう通らない状態（年齢確認のCookieが無い）
+    path = str(capture_root.parent / "state.json")
+    write_state(path, [{"name": "other", "value": "1", "domain": "127.0.0.1", "path": "/", "expires": -1}])
+
+    results, _, saved = run_captures([f"{mock_viewer}/detail/cid=stale/?pages=2"], path, capsys)
+    assert results[0]["status"] == "OK", results[0]["error"]
+    assert saved == 1
+    assert "age_check_done" in saved_cookies(path)
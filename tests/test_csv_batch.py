@@ -0,0 +1,234 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+import final_canva_csv_generator as gen
+from job_journal import JobJournal
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def count_rows(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return len(list(csv.DictReader(f)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_append_keeps_existing_rows(workdir):
+    gen.generate_canva_csv_batch(["a"], "out.csv", rule_based=True)
+    gen.generate_canva_csv_batch(["b"], "out.csv", rule_based=True, append=True)
+    assert count_rows("out.csv") == 2
+
+
+def test_append_with_journal_is_rejected(workdir):
+    gen.generate_canva_csv_batch(["a"], "out.csv", rule_based=True)
+    with pytest.raises(ValueError):
+        gen.generate_canva_csv_batch(["b"], "out.csv", rule_based=True, append=True,
+                                     journal=JobJournal(str(workdir / "journal.sqlite3")))
+    # 既存の行は消えない
+    assert count_rows("out.csv") == 1
+
+
+@pytest.mark.parametrize("flag", ["--journal", "--incremental", "--rebuild-csv"])
+def test_cli_rejects_append_with_journal(workdir, flag):
+    proc = subprocess.run([sys.executable, os.path.join(REPO, "final_canva_csv_generator.py"),
+                           "--cid", "a", "--rule-based", "--append", flag],
+                          cwd=workdir, capture_output=True, text=True)
+    assert proc.returncode == 2
+    assert "--append" in proc.stderr
+
+
+def read_cids(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return [row["title"] for row in csv.DictReader(f)]
+
+
+@pytest.fixture
+def journal(workdir):
+    j = JobJournal(str(workdir / "journal.sqlite3"))
+    yield j
+    j.close()
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    # fetch_dmm_dataの呼び出しを記録し、failに入れたCIDは取得失敗にする。changesの項目で作品データを書き換える
+    fetch = gen.fetch_dmm_data
+    calls, fail, changes = [], set(), {}
+
+    def fake(cid, use_mock=True):
+        calls.append(cid)
+        if cid in fail:
+            return None
+        return dict(fetch(cid, use_mock=use_mock), title=f"作品{cid}", **changes.get(cid, {}))
+
+    monkeypatch.setattr(gen, "fetch_dmm_data", fake)
+    fake.calls, fake.fail, fake.changes = calls, fail, changes
+    return fake
+
+
+def batch(cids, journal, **options):
+    return gen.generate_canva_csv_batch(cids, "out.csv", rule_based=True, journal=journal, **options)
+
+
+def test_resume_skips_written_items(journal, fetches):
+    batch(["a", "b"], journal)
+    assert fetches.calls == ["a", "b"]
+    results = batch(["a", "b", "c"], journal)
+    assert fetches.calls == ["a", "b", "c"]
+    assert [r["message"] for r in results[:2]] == ["ジャーナルに書き込み済みのため省略しました。"] * 2
+    assert read_cids("out.csv") == ["作品a", "作品b", "作品c"]
+
+
+def test_failed_items_are_retried(journal, fetches):
+    fetches.fail.add("b")
+    results = batch(["a", "b", "c"], journal)
+    assert [r["status"] for r in results] == ["OK", "FETCH_ERROR", "OK"]
+    job = os.path.abspath("out.csv")
+    assert journal.get(job, "b")["failed"] and journal.get(job, "b")["attempts"] == 1
+    assert read_cids("out.csv") == ["作品a", "作品c"]
+
+    fetches.fail.clear()
+    results = batch(["a", "b", "c"], journal)
+    assert [r["status"] for r in results] == ["OK"] * 3
+    assert fetches.calls == ["a", "b", "c", "b"]
+    assert journal.get(job, "b")["stage"] == "written" and not journal.get(job, "b")["failed"]
+    # CSVはCIDの登録順に作り直される
+    assert read_cids("out.csv") == ["作品a", "作品b", "作品c"]
+
+
+def test_csv_is_rebuilt_from_journal(journal, fetches):
+    batch(["a", "b"], journal)
+    with open("out.csv", "w", encoding="utf-8") as f:
+        f.write("壊れたCSV")
+    batch(["a", "b"], journal)
+    assert fetches.calls == ["a", "b"]
+    assert read_cids("out.csv") == ["作品a", "作品b"]
+    assert gen.rebuild_csv_from_journal(journal, os.path.abspath("out.csv"), "rebuilt.csv") == 2
+    assert read_cids("rebuilt.csv") == ["作品a", "作品b"]
+
+
+def test_rebuild_only_includes_current_cids(journal, fetches):
+    batch(["a", "b"], journal)
+    batch(["c"], journal)
+    # 同じ出力先（同じジョブ名）でも、以前の実行のCIDの行は含めない
+    assert read_cids("out.csv") == ["作品c"]
+    assert gen.rebuild_csv_from_journal(journal, os.path.abspath("out.csv"), "all.csv") == 3
+    assert read_cids("all.csv") == ["作品a", "作品b", "作品c"]
+
+
+def test_stream_abort_is_not_journaled_as_written(journal, workdir, monkeypatch):
+    import socket
+    from openai import OpenAI
+    from llm_cache import LLMCache
+
+    # 使われていないポート（接続拒否）
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    monkeypatch.setattr(gen, "LLM_WARMUP", False)
+    monkeypatch.setattr(gen, "_llm_client", OpenAI(base_url=f"http://127.0.0.1:{port}/v1", api_key="x", max_retries=0))
+    cache = LLMCache(str(workdir / "llm.sqlite3"))
+    monkeypatch.setattr(gen, "_llm_cache", cache)
+
+    results = gen.generate_canva_csv_batch(["a"], "out.csv", stream_llm=True, journal=journal)
+    assert results[0]["status"] == "ERROR"
+    record = journal.get(os.path.abspath("out.csv"), "a")
+    assert record["stage"] == "fetched" and record["failed"] and record["row"] is None
+    assert count_rows("out.csv") == 0
+    cache.close()
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    # ルールベース生成の呼び出し（作品のタイトル）を記録する。failに入れたタイトルは生成に失敗させる
+    generate = gen.generate_rule_based_text
+    calls, fail = [], set()
+
+    def fake(dmm_data, num_clips):
+        calls.append(dmm_data["title"])
+        if dmm_data["title"] in fail:
+            raise RuntimeError("生成を中断しました")
+        return generate(dmm_data, num_clips)
+
+    monkeypatch.setattr(gen, "generate_rule_based_text", fake)
+    fake.calls, fake.fail = calls, fail
+    return fake
+
+
+def incremental(cids, journal, capsys):
+    capsys.readouterr()
+    results = batch(cids, journal, incremental=True)
+    summary = [line for line in capsys.readouterr().out.splitlines() if line.startswith("差分更新:")]
+    return results, summary[0]
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return {row["title"]: row for row in csv.DictReader(f)}
+
+
+def test_incremental_regenerates_only_changed_works(journal, fetches, generations, capsys):
+    job = os.path.abspath("out.csv")
+    _, summary = incremental(["a", "b"], journal, capsys)
+    assert summary == "差分更新: スキップ 0件 / 更新 0件 / 追加 2件 / 失敗 0件"
+    before = read_rows("out.csv")
+    fingerprints = {cid: journal.get(job, cid)["fingerprint"] for cid in "ab"}
+
+    results, summary = incremental(["a", "b"], journal, capsys)
+    assert summary == "差分更新: スキップ 2件 / 更新 0件 / 追加 0件 / 失敗 0件"
+    assert [r["message"] for r in results] == ["変更がないため省略しました。"] * 2
+    assert fetches.calls == ["a", "b", "a", "b"]   # 変更の確認のため毎回取得する
+    assert generations.calls == ["作品a", "作品b"]
+
+    fetches.changes["b"] = {"description": "新しいあらすじ。二文目。三文目"}
+    _, summary = incremental(["a", "b", "c"], journal, capsys)
+    assert summary == "差分更新: スキップ 1件 / 更新 1件 / 追加 1件 / 失敗 0件"
+    assert generations.calls == ["作品a", "作品b", "作品b", "作品c"]
+    assert journal.get(job, "a")["fingerprint"] == fingerprints["a"]
+    assert journal.get(job, "b")["fingerprint"] != fingerprints["b"]
+
+    after = read_rows("out.csv")
+    assert list(after) == ["作品a", "作品b", "作品c"]
+    assert after["作品a"] == before["作品a"]
+    assert after["作品b"] != before["作品b"]
+    assert after["作品b"]["frame_2_bottom"] == "新しいあらすじ"
+
+
+def test_incremental_resumes_interrupted_update(journal, fetches, generations, capsys):
+    job = os.path.abspath("out.csv")
+    incremental(["a", "b"], journal, capsys)
+    before = read_rows("out.csv")
+
+    # 変更を取得した後、生成の途中で失敗した（前回の行はCSVに残る）
+    fetches.changes["a"] = {"description": "変更後のあらすじ。続き"}
+    generations.fail.add("作品a")
+    results, summary = incremental(["a", "b"], journal, capsys)
+    assert [r["status"] for r in results] == ["ERROR", "OK"]
+    assert summary == "差分更新: スキップ 1件 / 更新 0件 / 追加 0件 / 失敗 1件"
+    record = journal.get(job, "a")
+    assert record["stage"] == "fetched" and record["failed"]
+    assert record["dmm_data"]["description"] == "変更後のあらすじ。続き"
+    assert read_rows("out.csv") == before
+
+    # 再実行すると、フィンガープリントは記録済みと同じでも、記録済みの段階から生成をやり直す
+    generations.fail.clear()
+    _, summary = incremental(["a", "b"], journal, capsys)
+    assert summary == "差分更新: スキップ 1件 / 更新 1件 / 追加 0件 / 失敗 0件"
+    assert generations.calls == ["作品a", "作品b", "作品a", "作品a"]
+    assert journal.get(job, "a")["stage"] == "written"
+    after = read_rows("out.csv")
+    assert after["作品a"]["frame_2_bottom"] == "変更後のあらすじ" and after["作品b"] == before["作品b"]
+
+
+def test_incremental_requires_journal(workdir):
+    with pytest.raises(ValueError):
+        gen.generate_canva_csv_batch(["a"], "out.csv", rule_based=True, incremental=True)
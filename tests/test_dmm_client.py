@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import dmm_api
+
+
+def response(status, body=b"{}", headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body
+    r.headers.update(headers or {})
+    r.url = "https://example.com/"
+    return r
+
+
+class StubSession:
+    # 用意したレスポンス（または例外）を順に返す
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append({"url": url, "params": params, "headers": headers})
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(dmm_api.time, "sleep", waits.append)
+    return waits
+
+
+def client(*replies, max_retries=2):
+    c = dmm_api.DMMClient(use_cache=False, max_retries=max_retries, backoff_sec=0.01)
+    c.session = StubSession(*replies)
+    return c
+
+
+def test_token_bucket_allows_burst_then_limits_rate():
+    bucket = dmm_api.TokenBucket(rate=20, capacity=3)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    for _ in range(4):
+        bucket.acquire()
+    # バースト3件の後は1件あたり1/20秒
+    assert time.monotonic() - started >= 4 / 20 * 0.9
+
+
+def test_token_bucket_is_shared_between_threads():
+    bucket = dmm_api.TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(3)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.monotonic() - started >= 11 / 50 * 0.9
+
+
+@pytest.mark.parametrize("status", sorted(dmm_api.RETRY_STATUS_CODES))
+def test_retries_on_429_and_5xx(status, sleeps):
+    c = client(response(status), response(200, b'{"ok": 1}'))
+    assert c.get("https://example.com/api").json() == {"ok": 1}
+    assert len(c.session.calls) == 2
+    assert len(sleeps) == 1
+
+
+def test_retry_after_is_respected(sleeps):
+    c = client(response(429, headers={"Retry-After": "3"}), response(200))
+    c.get("https://example.com/api")
+    assert sleeps == [3]
+
+
+def test_backoff_grows_exponentially(sleeps):
+    c = dmm_api.DMMClient(use_cache=False, max_retries=3, backoff_sec=1.0)
+    c.session = StubSession(response(503), response(503), response(503), response(200))
+    c.get("https://example.com/api")
+    assert [int(w) for w in sleeps] == [1, 2, 4]
+
+
+def test_gives_up_after_max_retries(sleeps):
+    c = client(response(503), response(503), response(503))
+    with pytest.raises(requests.exceptions.HTTPError):
+        c.get("https://example.com/api")
+    assert len(c.session.calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_connection_errors_are_retried_then_raised(sleeps):
+    c = client(requests.exceptions.ConnectionError("refused"), requests.exceptions.Timeout("slow"),
+               requests.exceptions.ConnectionError("refused"))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        c.get("https://example.com/api")
+    assert len(c.session.calls) == 3
+
+
+def test_client_errors_are_not_retried(sleeps):
+    c = client(response(404))
+    with pytest.raises(requests.exceptions.HTTPError):
+        c.get("https://example.com/api")
+    assert len(c.session.calls) == 1
+    assert sleeps == []
+
+
+def test_rate_limited_requests_take_a_token(sleeps):
+    c = client(response(200), response(200))
+    acquired = []
+    c.rate_limiter.acquire = lambda: acquired.append(1)
+    c.get("https://example.com/api", rate_limited=True)
+    c.get("https://example.com/detail")
+    assert len(acquired) == 1
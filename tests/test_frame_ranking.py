@@ -0,0 +1,145 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import frame_ranking as fr
+import postprocess_captures as pp
+from config import FRAME_RANK_SIZE, MAX_FRAMES
+
+W, H = FRAME_RANK_SIZE
+
+
+def rich(seed):
+    # 絵柄のあるページ: 中間調の背景に濃い矩形を多数置く
+    rng = np.random.default_rng(seed)
+    page = np.full((H, W), int(rng.integers(180, 230)), dtype=np.uint8)
+    for _ in range(12):
+        y, x = rng.integers(0, H - 30), rng.integers(0, W - 20)
+        page[y:y + int(rng.integers(8, 30)), x:x + int(rng.integers(6, 20))] = int(rng.integers(0, 100))
+    return page
+
+
+def blank(value=255):
+    return np.full((H, W), value, dtype=np.uint8)
+
+
+def sparse():
+    # 奥付風: 白地に数本の短い線
+    page = blank(250)
+    for line in range(3):
+        page[50 + line * 10:52 + line * 10, 10:40] = 30
+    return page
+
+
+def noisy_blank(seed=0):
+    # スキャンのムラ程度のごく弱いノイズ（白紙とみなす）
+    rng = np.random.default_rng(seed)
+    return (250 + rng.integers(-2, 3, (H, W))).astype(np.uint8)
+
+
+def test_score_pages_flags_blank_and_sparse():
+    pages = np.stack([rich(0), blank(), blank(0), noisy_blank(), sparse(), rich(1)])
+    scores = fr.score_pages(pages)
+    assert scores["blank"].tolist() == [False, True, True, True, False, False]
+    assert scores["sparse"].tolist() == [False, False, False, False, True, False]
+    assert scores["descriptors"].shape == (6, (H // fr.POOL) * (W // fr.POOL))
+    quality = scores["quality"]
+    assert ((0 <= quality) & (quality <= 1)).all()
+    assert min(quality[0], quality[5]) > quality[4] > 0
+    # 疎なページは減点される（減点後の上限はSPARSE_PENALTY）
+    assert quality[4] <= fr.SPARSE_PENALTY
+
+
+def test_score_in_chunks_matches_single_pass():
+    pages = np.stack([rich(i) if i % 3 else blank() for i in range(7)])
+    whole = fr.score_pages(pages)
+    chunked = fr.score_in_chunks(pages, chunk=3)
+    for key in whole:
+        np.testing.assert_allclose(chunked[key], whole[key], rtol=1e-6)
+    assert fr.score_in_chunks(pages[:0]) == {}
+
+
+def test_select_skips_near_duplicates_and_unusable_pages():
+    a = rich(0)
+    shifted = a.copy()
+    shifted[0, 0] ^= 1   # ほぼ同じ画像
+    pages = np.stack([a, shifted, rich(1), blank(), rich(2)])
+    scores = fr.score_pages(pages)
+    usable = ~scores["blank"]
+    chosen = fr.select_frames(scores["quality"], usable, scores["descriptors"], count=5)
+    assert len(chosen) == 3 and chosen == sorted(chosen)
+    assert 3 not in chosen
+    assert len({0, 1} & set(chosen)) == 1
+    assert {2, 4} <= set(chosen)
+    # 重複判定を無効にすると、ほぼ同じページも両方選ばれる
+    assert fr.select_frames(scores["quality"], usable, scores["descriptors"], count=5, dup_distance=0) == [0, 1, 2, 4]
+
+
+def test_diversity_prefers_distinct_pages():
+    quality = np.array([1.0, 0.95, 0.8])
+    descriptors = np.array([[0.0, 0.0], [0.05, 0.05], [1.0, 1.0]])
+    usable = np.ones(3, dtype=bool)
+    # 2枚目は、わずかに違うだけの高得点のページより、離れたページを選ぶ
+    assert fr.select_frames(quality, usable, descriptors, count=2, dup_distance=0.03) == [0, 2]
+    assert fr.select_frames(quality, usable, descriptors, count=2, dup_distance=0.03, diversity_weight=0) == [0, 1]
+    # 重複とみなす距離を広げると、近いページは候補から外れる
+    assert fr.select_frames(quality, usable, descriptors, count=3, dup_distance=0.1) == [0, 2]
+
+
+@pytest.fixture
+def captures(tmp_path):
+    fr.make_benchmark_pages(str(tmp_path), works=2, pages_per_work=9)
+    return tmp_path
+
+
+def test_rank_frames_writes_selection(captures):
+    folders = fr.find_capture_folders(str(captures))
+    stats = fr.rank_frames(folders, count=4, workers=2)
+    assert stats["works"] == 2 and stats["pages"] == 18
+    assert stats["blank"] == 2 and stats["sparse"] == 2
+    for folder in folders:
+        ranking = fr.read_ranking(folder)
+        assert ranking["source"] == "raw" and len(ranking["pages"]) == 9
+        assert 0 < len(ranking["selected"]) <= 4
+        blank_pages = {p["path"] for p in ranking["pages"] if p["blank"]}
+        assert blank_pages == {os.path.join(folder, "page_07.png")}
+        assert not blank_pages & set(ranking["selected"])
+        assert all(os.path.isabs(path) for path in ranking["selected"])
+
+
+def test_load_capture_images_falls_back_to_manifest(captures, monkeypatch):
+    root = str(captures)
+    cid = "bench00000"
+    folder = os.path.join(root, cid)
+    assert fr.load_capture_images(cid, root) == []
+
+    settings = dict(pp.default_settings(), crop=[0, 0, 0, 0], width=W, max_kb=0)
+    pp.postprocess_captures([folder], settings, workers=1)
+    manifest_images = pp.load_manifest_images(cid, root)
+    assert len(manifest_images) == 9
+    # frames.jsonが無い場合は加工済み画像（ページ順）
+    assert fr.load_capture_images(cid, root) == manifest_images
+
+    fr.rank_frames([folder], count=MAX_FRAMES, workers=1)
+    ranking = fr.read_ranking(folder)
+    assert ranking["source"] == "processed"
+    monkeypatch.chdir(captures)   # カレントディレクトリに依存しない
+    assert fr.load_capture_images(cid, root) == ranking["selected"]
+    assert set(ranking["selected"]) <= set(manifest_images)
+
+    # manifest.jsonの方が新しい（再加工後に採点し直していない）場合は加工済み画像に戻る
+    ranking_mtime = os.path.getmtime(os.path.join(folder, fr.RANKING_NAME))
+    os.utime(os.path.join(folder, pp.MANIFEST_NAME), (ranking_mtime + 10, ranking_mtime + 10))
+    assert fr.load_capture_images(cid, root) == manifest_images
+
+    # 選んだ画像が消えている場合も加工済み画像に戻る
+    os.utime(os.path.join(folder, pp.MANIFEST_NAME), (ranking_mtime - 10, ranking_mtime - 10))
+    with open(os.path.join(folder, fr.RANKING_NAME), encoding="utf-8") as f:
+        data = json.load(f)
+    data["selected"][0] = os.path.join(folder, "missing.webp")
+    with open(os.path.join(folder, fr.RANKING_NAME), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.utime(os.path.join(folder, fr.RANKING_NAME), (ranking_mtime, ranking_mtime))
+    assert fr.load_capture_images(cid, root) == manifest_images
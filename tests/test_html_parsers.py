@@ -0,0 +1,74 @@
+import glob
+import os
+
+import pytest
+from bs4 import FeatureNotFound
+
+import dmm_api
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "detail_pages", "*.html")))
+
+
+def _available(report):
+    return {backend: result for backend, result in report.items() if "error" not in result}
+
+
+@pytest.mark.parametrize("selector", ["img.sample-image", "img:first-child", ".sample-row img", "img[data-src]"])
+def test_parsers_agree_on_detail_pages(selector):
+    report = dmm_api.compare_html_parsers(FIXTURES, repeat=1, selector=selector)
+    assert set(report) == set(dmm_api.HTML_PARSER_BACKENDS)
+    assert "html.parser" in _available(report)
+    for backend, result in _available(report).items():
+        assert result["matched"], f"{backend} の結果がhtml.parserと一致しない（{selector}）"
+
+
+def test_sample_images_from_fixtures():
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", "detail_pages", "mixed_src.html"), encoding="utf-8") as f:
+        html = f.read()
+    assert dmm_api.parse_sample_images(html, "html.parser") == [
+        "https://example.com/digital/comic/k987xyz00010/k987xyz00010js-001.jpg",
+        "https://example.com/digital/comic/k987xyz00010/k987xyz00010js-002.jpg",
+        "https://example.com/digital/comic/k987xyz00010/k987xyz00010js-003.jpg",
+    ]
+
+
+def test_first_child_is_not_strained():
+    html = "<div><img src='http://a/1'><img src='http://a/2'></div><p><b></b><img src='http://a/3'></p>"
+    expected = ["http://a/1"]
+    for backend in dmm_api.HTML_PARSER_BACKENDS:
+        try:
+            assert dmm_api.parse_sample_images(html, backend, "img:first-child") == expected, backend
+        except (ImportError, FeatureNotFound):
+            continue
+
+
+@pytest.mark.parametrize("selector, strained", [
+    ("img.sample-image", True),
+    ("img#cover", True),
+    ("img[data-src]", True),
+    ("img.sample-image:first-child", False),
+    ("img:not(.thumb)", False),
+    ("div img", False),
+    ("ul > img", False),
+    ("img, a", False),
+    (".sample-image", False),
+])
+def test_strainer_only_for_simple_selectors(selector, strained):
+    assert (dmm_api._strainer_for(selector) is not None) == strained
+
+
+def test_missing_backend_is_reported_unavailable(monkeypatch):
+    parse = dmm_api._parse_sample_images
+
+    def without_lxml(html, backend, selector):
+        if backend == "lxml":
+            raise FeatureNotFound("Couldn't find a tree builder with the features you requested: lxml.")
+        if backend == "selectolax":
+            raise ImportError("No module named 'selectolax'")
+        return parse(html, backend, selector)
+
+    monkeypatch.setattr(dmm_api, "_parse_sample_images", without_lxml)
+    report = dmm_api.compare_html_parsers(FIXTURES, repeat=1)
+    assert "lxml" in report["lxml"]["error"]
+    assert "selectolax" in report["selectolax"]["error"]
+    assert report["html.parser"]["matched"]
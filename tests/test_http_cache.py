@@ -0,0 +1,123 @@
+import json
+
+import pytest
+
+import dmm_api
+import http_cache
+from http_cache import HTTPCache
+from test_dmm_client import StubSession, response
+
+API = dmm_api.DMM_API_ENDPOINT
+DETAIL = "https://book.example.com/detail/cid=a/"
+
+
+def api_body(status=200, items=({"content_id": "a"},)):
+    return json.dumps({"result": {"status": status, "items": list(items)}}).encode()
+
+
+def with_url(r, url):
+    r.url = url
+    return r
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(http_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = HTTPCache(str(tmp_path / "http.sqlite3"), max_bytes=10_000, ttls={API: 60, "https://book.example.com/": 600})
+    yield c
+    c.close()
+
+
+def cached_client(cache, *replies):
+    c = dmm_api.DMMClient(cache=cache, max_retries=0)
+    c.session = StubSession(*(with_url(r, API) for r in replies))
+    return c
+
+
+def test_ttl_uses_longest_prefix(cache):
+    assert cache.ttl_for(API + "?cid=a") == 60
+    assert cache.ttl_for(DETAIL) == 600
+    assert cache.ttl_for("https://other.example.com/") == 0
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    key = cache.make_key(API, {"cid": "a"})
+    cache.store(key, with_url(response(200, api_body(), {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}), API))
+
+    cached, fresh, validators = cache.lookup(key)
+    assert fresh and cached.json()["result"]["items"] == [{"content_id": "a"}]
+    clock[0] += 61
+    _, fresh, validators = cache.lookup(key)
+    assert not fresh
+    assert validators == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+
+
+def test_make_key_ignores_param_order():
+    assert HTTPCache.make_key(API, {"a": 1, "b": 2}) == HTTPCache.make_key(API, {"b": 2, "a": 1})
+    assert HTTPCache.make_key(API, {"a": 1}) != HTTPCache.make_key(API, {"a": 2})
+
+
+def test_lru_eviction_by_bytes(tmp_path, clock):
+    cache = HTTPCache(str(tmp_path / "lru.sqlite3"), max_bytes=250, ttls={DETAIL: 600})
+    keys = [cache.make_key(DETAIL, {"n": n}) for n in range(3)]
+    for n in range(2):
+        clock[0] += 1
+        cache.store(keys[n], with_url(response(200, b"x" * 100), DETAIL))
+    clock[0] += 1
+    cache.lookup(keys[0])   # 0番を最近使ったことにする
+    clock[0] += 1
+    cache.store(keys[2], with_url(response(200, b"x" * 100), DETAIL))
+
+    assert cache.lookup(keys[0]) is not None
+    assert cache.lookup(keys[1]) is None
+    assert cache.lookup(keys[2]) is not None
+    cache.close()
+
+
+def test_fresh_hit_skips_network(cache, clock):
+    c = cached_client(cache, response(200, api_body()))
+    c.get(API, {"cid": "a"})
+    assert c.get(API, {"cid": "a"}).from_cache
+    assert len(c.session.calls) == 1
+
+
+def test_304_revalidates_with_etag_and_extends_ttl(cache, clock):
+    c = cached_client(cache, response(200, api_body(), {"ETag": '"v1"'}), response(304))
+    c.get(API, {"cid": "a"})
+    clock[0] += 61
+
+    revalidated = c.get(API, {"cid": "a"})
+    assert revalidated.json()["result"]["items"] == [{"content_id": "a"}]
+    assert c.session.calls[1]["headers"] == {"If-None-Match": '"v1"'}
+    # 再検証後は再び有効期限内
+    assert c.get(API, {"cid": "a"}).from_cache
+    assert len(c.session.calls) == 2
+
+
+def test_304_revalidates_with_last_modified(cache, clock):
+    c = cached_client(cache, response(200, api_body(), {"Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}), response(304))
+    c.get(API, {"cid": "a"})
+    clock[0] += 61
+    c.get(API, {"cid": "a"})
+    assert c.session.calls[1]["headers"] == {"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+
+
+@pytest.mark.parametrize("body", [api_body(status=400, items=()), api_body(items=()), b"not json"])
+def test_api_errors_and_empty_results_are_not_cached(cache, clock, body):
+    c = cached_client(cache, response(200, body), response(200, api_body()))
+    c.get(API, {"cid": "a"})
+    assert c.get(API, {"cid": "a"}).json()["result"]["status"] == 200
+    assert len(c.session.calls) == 2
+
+
+def test_detail_pages_are_cached(cache, clock):
+    c = dmm_api.DMMClient(cache=cache, max_retries=0)
+    c.session = StubSession(with_url(response(200, b"<html></html>"), DETAIL))
+    c.get(DETAIL)
+    assert c.get(DETAIL).from_cache
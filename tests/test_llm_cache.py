@@ -0,0 +1,102 @@
+import pytest
+
+import final_canva_csv_generator as gen
+from config import MOCK_DMM_DATA
+from llm_cache import LLMCache
+
+MESSAGES = [{"role": "system", "content": "指示"}, {"role": "user", "content": "生成して"}]
+CLIPS = [{"clip_index": i, "top_text": f"見出し{i}", "bottom_text": f"本文{i}"} for i in range(1, 5)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = LLMCache(str(tmp_path / "llm.sqlite3"), max_entries=3)
+    yield c
+    c.close()
+
+
+def test_key_is_stable_and_depends_on_model_and_messages():
+    key = LLMCache.make_key("llama3", MESSAGES)
+    assert key == LLMCache.make_key("llama3", [dict(m) for m in MESSAGES])
+    assert key == LLMCache.make_key("llama3", [dict(reversed(list(m.items()))) for m in MESSAGES])
+    assert key != LLMCache.make_key("mistral", MESSAGES)
+    assert key != LLMCache.make_key("llama3", MESSAGES[:1])
+    # 同じ作品データからは同じプロンプト・同じキーになる
+    assert LLMCache.make_key("llama3", gen.build_messages(MOCK_DMM_DATA, 4)) == \
+        LLMCache.make_key("llama3", gen.build_messages(dict(MOCK_DMM_DATA), 4))
+
+
+def test_set_get_invalidate_and_clear(cache):
+    cache.set("a", "llama3", CLIPS)
+    cache.set("b", "mistral", CLIPS)
+    assert cache.get("a") == CLIPS
+    assert cache.get("missing") is None
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    cache.set("a", "llama3", CLIPS)
+    cache.clear(model="llama3")
+    assert cache.get("a") is None and cache.get("b") == CLIPS
+    cache.clear()
+    assert cache.get("b") is None
+
+
+def test_lru_eviction_by_entry_count(cache, monkeypatch):
+    import llm_cache
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    for key in ("a", "b", "c"):
+        now[0] += 1
+        cache.set(key, "llama3", CLIPS)
+    now[0] += 1
+    cache.get("a")   # aを最近使ったことにする
+    now[0] += 1
+    cache.set("d", "llama3", CLIPS)
+
+    assert [k for k in "abcd" if cache.get(k) is not None] == ["a", "c", "d"]
+
+
+def test_second_call_is_served_from_cache(llm):
+    state = llm()
+    clips, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, stream=False)
+    assert stats["source"] == "llm"
+    cached, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, stream=False)
+    assert stats["source"] == "cache"
+    assert cached == clips
+    assert state.requests == 1
+
+
+def test_refresh_bypasses_and_overwrites_cache(llm):
+    state = llm()
+    key = LLMCache.make_key(gen.LLM_MODEL, gen.build_messages(MOCK_DMM_DATA, 4))
+    llm.cache.set(key, gen.LLM_MODEL, CLIPS)
+
+    clips, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, refresh=True, stream=False)
+    assert stats["source"] == "llm"
+    assert state.requests == 1
+    assert clips != CLIPS
+    assert llm.cache.get(key) == clips
+
+
+@pytest.mark.parametrize("entry", [
+    CLIPS[:2],                                                    # クリップ数が不足
+    [{"clip_index": i, "headline": "見出し"} for i in range(1, 5)],  # 必須項目が無い
+    {"clips": CLIPS},                                             # リストではない
+])
+def test_invalid_cached_entry_is_regenerated(llm, entry):
+    state = llm()
+    key = LLMCache.make_key(gen.LLM_MODEL, gen.build_messages(MOCK_DMM_DATA, 4))
+    llm.cache.set(key, gen.LLM_MODEL, entry)
+
+    clips, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, stream=False)
+    assert stats["source"] == "llm"
+    assert state.requests == 1
+    gen.validate_clips(clips, 4)
+    assert llm.cache.get(key) == clips
+
+
+def test_malformed_output_is_not_cached(llm):
+    llm(malformed_rate=1.0)
+    clips, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, stream=False)
+    assert stats["source"] == "fallback"
+    assert clips == gen.fallback_clips(MOCK_DMM_DATA, 4)
+    assert llm.cache.get(LLMCache.make_key(gen.LLM_MODEL, gen.build_messages(MOCK_DMM_DATA, 4))) is None
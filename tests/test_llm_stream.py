@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+import final_canva_csv_generator as gen
+from config import MOCK_DMM_DATA
+from llm_stream import ClipStreamParser, MalformedOutputError, validate_clip
+from rule_based_text_generator import generate_rule_based_text
+
+CLIP_1 = {"clip_index": 1, "top_text": "【衝撃】", "bottom_text": "一行目\n二行目"}
+CLIP_2 = {"clip_index": 2, "top_text": "展開", "bottom_text": "続きは本編で！"}
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse(text, num_clips=2, chunk=1, max_chars=3000, max_top=40, max_bottom=120):
+    parser = ClipStreamParser(num_clips, max_chars, max_top, max_bottom)
+    for i in range(0, len(text), chunk):
+        parser.feed(text[i:i + chunk])
+        if parser.done:
+            break
+    return parser
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 10000])
+@pytest.mark.parametrize("text, expected", [
+    # 受け付ける3つのコンテナ形式
+    (dumps([CLIP_1, CLIP_2]), [CLIP_1, CLIP_2]),
+    (dumps({"response": [CLIP_1, CLIP_2]}), [CLIP_1, CLIP_2]),
+    (dumps({"clip_1": CLIP_1, "clip_2": CLIP_2}), [CLIP_1, CLIP_2]),
+    # 前後の空白・改行
+    ("\n  " + json.dumps([CLIP_1, CLIP_2], ensure_ascii=False, indent=2) + "\n", [CLIP_1, CLIP_2]),
+    # 文字列内の括弧・エスケープされた引用符・バックスラッシュはクリップの区切りとみなさない
+    (dumps([{"top_text": '【"衝撃"の{結末}]】', "bottom_text": "a\\"}, CLIP_2]),
+     [{"top_text": '【"衝撃"の{結末}]】', "bottom_text": "a\\", "clip_index": 1}, CLIP_2]),
+    # クリップ内のネストしたオブジェクト・配列
+    (dumps([{**CLIP_1, "meta": {"tags": ["a", {"b": "}"}]}}, CLIP_2]),
+     [{**CLIP_1, "meta": {"tags": ["a", {"b": "}"}]}}, CLIP_2]),
+    # clip_indexが無い場合は出現順で補う
+    (dumps([{"top_text": "a", "bottom_text": "b"}, {"top_text": "c", "bottom_text": "d"}]),
+     [{"top_text": "a", "bottom_text": "b", "clip_index": 1}, {"top_text": "c", "bottom_text": "d", "clip_index": 2}]),
+])
+def test_parses_clips(text, expected, chunk):
+    parser = parse(text, chunk=chunk)
+    assert parser.done
+    assert parser.clips == expected
+
+
+def test_stops_after_required_clips():
+    parser = ClipStreamParser(1, 3000, 40, 120)
+    text = dumps([CLIP_1, CLIP_2])
+    new = parser.feed(text[:text.index("}") + 1])
+    assert new == [CLIP_1] and parser.done
+
+
+def test_ignores_text_after_root_closes():
+    parser = parse(dumps([CLIP_1]) + "\n以上です。[{", num_clips=4, chunk=10000)
+    assert parser.done
+    assert parser.clips == [CLIP_1]
+
+
+def test_feed_returns_only_new_clips():
+    parser = ClipStreamParser(2, 3000, 40, 120)
+    text = dumps([CLIP_1, CLIP_2])
+    middle = text.index("}") + 1
+    assert parser.feed(text[:middle - 1]) == []
+    assert parser.feed(text[middle - 1:middle]) == [CLIP_1]
+    assert parser.feed(text[middle:]) == [CLIP_2]
+
+
+@pytest.mark.parametrize("text, message", [
+    ('```json\n' + dumps([CLIP_1, CLIP_2]) + '\n```', "始まっていません"),
+    ('説明: ' + dumps([CLIP_1, CLIP_2]), "始まっていません"),
+    ('[{"top_text": "a", "bottom_text": "b"]', "括弧"),
+    ('[{"top_text": "a", "bottom_text": "b"}}', "括弧"),
+    ('[{"top_text": "a", "bottom_text": "b",}]', "JSON"),
+    (dumps([{"clip_index": 1, "headline": "見出し", "body": "本文"}]), "top_text"),
+    (dumps([{"top_text": "a", "bottom_text": "   "}]), "bottom_text"),
+    (dumps([{"top_text": "長" * 41, "bottom_text": "b"}]), "長すぎます"),
+])
+def test_rejects_malformed_output(text, message):
+    with pytest.raises(MalformedOutputError, match=message):
+        parse(text)
+
+
+def test_root_without_clip_objects_yields_no_clips():
+    # クリップ以外の値だけの配列は、ルートが閉じた時点でクリップ0件（stream_clipsがクリップ数不足として扱う）
+    parser = parse(dumps([["top_text", "bottom_text"], "a", 1]))
+    assert parser.done and parser.clips == []
+
+
+def test_aborts_over_max_chars():
+    text = dumps([{"top_text": "a", "bottom_text": "b" * 100}] * 5)
+    parser = ClipStreamParser(5, 50, 40, 120)
+    with pytest.raises(MalformedOutputError, match="50文字超"):
+        parser.feed(text)
+    # 上限ちょうどまでは受け付ける
+    exact = dumps([CLIP_1])
+    assert ClipStreamParser(1, len(exact), 40, 120).feed(exact) == [CLIP_1]
+
+
+def test_validate_clip_limits():
+    validate_clip({"top_text": "a" * 40, "bottom_text": "b" * 120}, 40, 120)
+    with pytest.raises(MalformedOutputError):
+        validate_clip({"top_text": "a", "bottom_text": "b" * 121}, 40, 120)
+    with pytest.raises(MalformedOutputError):
+        validate_clip({"top_text": 1, "bottom_text": "b"}, 40, 120)
+
+
+def test_stream_against_mock_llm(llm):
+    state = llm(chunk_chars=3)
+    clips, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, stream=True)
+    assert stats["source"] == "llm"
+    assert stats["ttft"] is not None and stats["completion_tokens"] > 0
+    assert len(clips) == 4
+    gen.validate_clips(clips, 4)
+    assert state.requests == 1
+
+
+def test_malformed_stream_switches_to_rule_based(llm):
+    state = llm(malformed_rate=1.0, chunk_chars=3)
+    for _ in range(3):   # 3種類の不正な出力を順に返す
+        clips, stats = gen.generate_marketing_text_with_stats(MOCK_DMM_DATA, 4, stream=True, refresh=True)
+        assert stats["source"] == "stream_fallback"
+        assert clips == generate_rule_based_text(MOCK_DMM_DATA, 4)
+    assert state.malformed == 3
+    assert llm.cache.get(gen.LLMCache.make_key(gen.LLM_MODEL, gen.build_messages(MOCK_DMM_DATA, 4))) is None
@@ -0,0 +1,136 @@
+import json
+import random
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def enabled():
+    was_enabled = metrics.is_enabled()
+    metrics.reset()
+    metrics.enable(True)
+    yield
+    metrics.enable(was_enabled)
+    metrics.reset()
+
+
+def test_percentiles_without_sampling():
+    h = metrics.Histogram(metrics.SIZE_BUCKETS)
+    for value in random.Random(0).sample(range(1, 101), 100):
+        h.observe(value)
+    assert h.to_dict() == {"count": 100, "sum": 5050.0, "mean": 50.5, "min": 1, "max": 100, "p50": 51, "p95": 96}
+    assert metrics.Histogram(metrics.SIZE_BUCKETS).percentile(0.5) is None
+
+
+def test_reservoir_keeps_a_uniform_sample(monkeypatch):
+    monkeypatch.setattr(metrics, "RESERVOIR_SIZE", 1000)
+    monkeypatch.setattr(metrics, "random", random.Random(1))
+    h = metrics.Histogram(metrics.LATENCY_BUCKETS)
+    n = 50_000
+    for i in range(n):
+        h.observe(i / n)
+    assert len(h.samples) == 1000
+    assert h.count == n and h.min == 0 and h.max == (n - 1) / n
+    # 全ての観測値から一様に抽出されていれば、サンプルのパーセンタイルは真の値に近い
+    assert h.percentile(0.50) == pytest.approx(0.50, abs=0.05)
+    assert h.percentile(0.95) == pytest.approx(0.95, abs=0.03)
+    assert sum(1 for v in h.samples if v >= 0.5) == pytest.approx(500, abs=80)
+
+
+def test_bucket_boundaries_are_inclusive():
+    h = metrics.Histogram((1, 10))
+    for value in (0.5, 1, 1.5, 10, 11):
+        h.observe(value)
+    assert h.counts == [2, 2, 1]
+
+
+def parse_prom(text):
+    # "# TYPE" 行と、名前{ラベル} 値 の行に分ける
+    types, samples = {}, {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+        else:
+            series, value = line.rsplit(" ", 1)
+            samples[series] = value
+    return types, samples
+
+
+def test_prometheus_text_format(enabled):
+    metrics.inc("works", status="OK")
+    metrics.inc("works", 2, status="OK")
+    metrics.inc("works", status="ERROR")
+    for value in (0.003, 0.2, 0.2, 7.0):
+        metrics.observe("stage_seconds", value, stage="fetch")
+    metrics.observe("llm_tokens_per_work", 150, kind="completion")
+
+    types, samples = parse_prom(metrics.prometheus_text())
+    assert types == {
+        "canva_works_total": "counter",
+        "canva_stage_seconds": "histogram",
+        "canva_llm_tokens_per_work": "histogram",
+        "canva_last_run_timestamp_seconds": "gauge",
+    }
+    assert samples['canva_works_total{status="OK"}'] == "3"
+    assert samples['canva_works_total{status="ERROR"}'] == "1"
+
+    buckets = {s: int(v) for s, v in samples.items() if s.startswith("canva_stage_seconds_bucket")}
+    assert len(buckets) == len(metrics.LATENCY_BUCKETS) + 1
+    assert buckets['canva_stage_seconds_bucket{stage="fetch",le="0.005"}'] == 1
+    assert buckets['canva_stage_seconds_bucket{stage="fetch",le="0.25"}'] == 3
+    assert buckets['canva_stage_seconds_bucket{stage="fetch",le="5"}'] == 3
+    assert buckets['canva_stage_seconds_bucket{stage="fetch",le="10"}'] == 4
+    assert buckets['canva_stage_seconds_bucket{stage="fetch",le="+Inf"}'] == 4
+    assert list(buckets.values()) == sorted(buckets.values())   # 累積
+    assert float(samples['canva_stage_seconds_sum{stage="fetch"}']) == pytest.approx(7.403)
+    assert samples['canva_stage_seconds_count{stage="fetch"}'] == "4"
+    # "_seconds" 以外はサイズ用のバケット
+    assert 'canva_llm_tokens_per_work_bucket{kind="completion",le="1000"}' in samples
+
+
+def test_prometheus_label_escaping(enabled):
+    metrics.inc("errors", reason='say "hi"\\path\nnext')
+    text = metrics.prometheus_text()
+    assert 'canva_errors_total{reason="say \\"hi\\"\\\\path\\nnext"} 1\n' in text
+    assert len(text.splitlines()) == 4   # 値の改行で行が分かれない
+
+
+def test_report_and_derived_metrics(enabled, tmp_path):
+    metrics.inc("llm_generations", source="llm", mode="stream")
+    metrics.inc("llm_generations", source="stream_fallback", mode="stream")
+    metrics.inc("llm_generations", source="fallback", mode="blocking")
+    metrics.inc("llm_generations", source="cache", mode="blocking")
+    metrics.inc("llm_tokens", 200, kind="completion")
+    metrics.observe("llm_request_seconds", 4.0, mode="stream", outcome="llm")
+    metrics.observe("llm_request_seconds", 1.0, mode="stream", outcome="stream_fallback")
+    metrics.inc("http_responses", 9, status_class="2xx")
+    metrics.inc("http_responses", 1, status_class="5xx")
+
+    derived = metrics.report()["derived"]
+    assert derived == {"llm_completion_tokens_per_sec": 50.0, "llm_fallback_rate": 0.5, "http_error_rate": 0.1}
+
+    metrics.dump(str(tmp_path / "m.json"), str(tmp_path / "m.prom"))
+    with open(tmp_path / "m.json", encoding="utf-8") as f:
+        assert json.load(f)["derived"] == derived
+    assert (tmp_path / "m.prom").read_text(encoding="utf-8").startswith("# TYPE canva_http_responses_total counter")
+
+
+def test_disabled_is_a_no_op(tmp_path):
+    was_enabled = metrics.is_enabled()
+    metrics.reset()
+    metrics.enable(False)
+    try:
+        metrics.inc("works", status="OK")
+        metrics.observe("stage_seconds", 1.0, stage="fetch")
+        assert metrics.timer("stage_seconds", stage="fetch") is metrics.timer("other_seconds")
+        with metrics.timer("stage_seconds", stage="fetch"):
+            pass
+        metrics.dump(str(tmp_path / "m.json"), str(tmp_path / "m.prom"))
+        report = metrics.report()
+        assert report["counters"] == [] and report["histograms"] == []
+        assert list(tmp_path.iterdir()) == []
+    finally:
+        metrics.enable(was_enabled)
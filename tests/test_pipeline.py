@@ -0,0 +1,30 @@
+import csv
+
+import pipeline
+
+
+def run(tmp_path, cids, **options):
+    return pipeline.run_canva_pipeline(cids, str(tmp_path / "out.csv"), use_mock=True, rule_based=True,
+                                       status_filename=str(tmp_path / "status.csv"), **options)
+
+
+def test_pipeline_writes_every_work(tmp_path):
+    results, stats = run(tmp_path, ["a", "b", "c"])
+
+    assert sorted(r["cid"] for r in results) == ["a", "b", "c"]
+    assert all(r["status"] == "OK" and r["message"] == "" for r in results)
+    with open(tmp_path / "out.csv", encoding="utf-8-sig") as f:
+        assert len(list(csv.DictReader(f))) == 3
+    assert [s["stage"] for s in stats["stages"]] == ["fetch", "scrape", "generate", "write"]
+
+
+def test_failing_write_stage_is_reported_as_error(tmp_path, monkeypatch):
+    def broken_row(dmm_data, clips):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pipeline, "build_canva_row", broken_row)
+    results, stats = run(tmp_path, ["a", "b"])
+
+    assert [r["status"] for r in results] == ["ERROR", "ERROR"]
+    assert all(r["message"] == "write: OSError: disk full" for r in results)
+    assert stats["stages"][-1]["errors"] == 2
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import postprocess_captures as pp
+
+SETTINGS = {"crop": [0, 10, 0, 10], "width": 120, "format": "webp", "quality": 85, "max_kb": 0}
+
+
+def noise(size=(200, 300), seed=0):
+    # 圧縮しにくいランダムな画像（品質を下げないと目標サイズに収まらない）
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+def make_work(root, cid, pages=3):
+    folder = root / cid
+    folder.mkdir(parents=True)
+    for i in range(1, pages + 1):
+        noise(seed=i).save(folder / f"page_{i:02d}.png")
+    (folder / "cover.png").write_bytes(b"not a page")
+    return folder
+
+
+@pytest.mark.parametrize("fmt", ["webp", "jpeg"])
+def test_encode_fits_max_kb(fmt):
+    image = noise()
+    full, _ = pp.encode_image(image, fmt, 90)
+    low, _ = pp.encode_image(image, fmt, pp.MIN_QUALITY)
+    max_kb = (len(full) + len(low)) // 2 // 1024
+    assert len(low) <= max_kb * 1024 < len(full)
+    data, quality = pp.encode_image(image, fmt, 90, max_kb)
+    assert len(data) <= max_kb * 1024
+    assert pp.MIN_QUALITY <= quality < 90
+
+
+def test_encode_never_raises_quality_above_request():
+    image = noise()
+    small, _ = pp.encode_image(image, "jpeg", 10)
+    # 収まらない目標サイズでも、下限（MIN_QUALITY）より低い指定品質のまま出力する
+    data, quality = pp.encode_image(image, "jpeg", 10, max_kb=1)
+    assert quality == 10 and data == small
+    # 下限でも収まらない場合は下限の品質
+    data, quality = pp.encode_image(image, "jpeg", 90, max_kb=1)
+    assert quality == pp.MIN_QUALITY
+
+
+def test_manifest_contents(tmp_path, monkeypatch):
+    folder = make_work(tmp_path / "captures", "abc001")
+    monkeypatch.chdir(tmp_path)
+    stats = pp.postprocess_captures([os.path.join("captures", "abc001")], SETTINGS, workers=1)
+    assert (stats["processed"], stats["skipped"], stats["failed"]) == (3, 0, 0)
+
+    manifest = pp.read_manifest(folder)
+    assert manifest["slug"] == "abc001" and manifest["settings"] == SETTINGS
+    assert [e["src"] for e in manifest["images"]] == ["page_01.png", "page_02.png", "page_03.png"]
+    assert [e["path"] for e in manifest["images"]] == [os.path.join("processed", f"page_0{i}.webp") for i in (1, 2, 3)]
+    for entry in manifest["images"]:
+        with Image.open(folder / entry["path"]) as im:
+            assert im.format == "WEBP" and im.size == (entry["width"], entry["height"]) == (120, 168)
+        assert entry["bytes"] == os.path.getsize(folder / entry["path"])
+
+    # 別のカレントディレクトリからでも、フォルダ内の画像の絶対パスが返る
+    monkeypatch.chdir(folder)
+    paths = pp.load_manifest_images("abc001", str(tmp_path / "captures"))
+    assert paths == [str(folder / "processed" / f"page_0{i}.webp") for i in (1, 2, 3)]
+    assert pp.load_manifest_images("missing", str(tmp_path / "captures")) == []
+
+
+def test_up_to_date_images_are_skipped(tmp_path):
+    folder = make_work(tmp_path, "abc002")
+    assert pp.postprocess_captures([str(folder)], SETTINGS, workers=1)["processed"] == 3
+
+    stats = pp.postprocess_captures([str(folder)], SETTINGS, workers=1)
+    assert (stats["processed"], stats["skipped"]) == (0, 3)
+    assert len(pp.read_manifest(folder)["images"]) == 3
+
+    # 元画像が更新されたページだけ再処理する
+    src = folder / "page_02.png"
+    later = os.path.getmtime(folder / "processed" / "page_02.webp") + 10
+    os.utime(src, (later, later))
+    stats = pp.postprocess_captures([str(folder)], SETTINGS, workers=1)
+    assert (stats["processed"], stats["skipped"]) == (1, 2)
+
+    # 設定を変えると全て再処理する
+    stats = pp.postprocess_captures([str(folder)], dict(SETTINGS, width=100), workers=1)
+    assert (stats["processed"], stats["skipped"]) == (3, 0)
+    assert pp.postprocess_captures([str(folder)], dict(SETTINGS, width=100), workers=1, force=True)["processed"] == 3
+
+
+def test_find_capture_folders(tmp_path):
+    make_work(tmp_path, "b")
+    make_work(tmp_path, "a", pages=1)
+    (tmp_path / "empty").mkdir()
+    assert pp.find_capture_folders(str(tmp_path)) == [str(tmp_path / "a"), str(tmp_path / "b")]
+    assert pp.find_capture_folders(str(tmp_path / "missing")) == []
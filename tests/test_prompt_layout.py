@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+import final_canva_csv_generator as gen
+from config import MOCK_DMM_DATA
+
+WORKS = [
+    MOCK_DMM_DATA,
+    {"title": "別の作品", "description": "短いあらすじ。", "genre": "ファンタジー", "keywords": ["魔法", "冒険"]},
+    {"title": "長い作品", "description": "とても長いあらすじが続く。" * 200, "genre": "SF", "keywords": []},
+    {"title": "English title", "description": "A plot written in ASCII. " * 100},
+    {},
+]
+
+
+def test_prefix_system_prompt_is_identical_across_works():
+    messages = [gen.build_messages(work, 4, "prefix") for work in WORKS]
+    systems = [m[0]["content"].encode("utf-8") for m in messages]
+    assert all(m[0]["role"] == "system" for m in messages)
+    assert len(set(systems)) == 1
+    assert systems[0] == gen.prefix_system_prompt(4).encode("utf-8")
+    # 作品ごとのデータはシステムプロンプトに含めず、最後のユーザーメッセージに置く
+    for work, m in zip(WORKS, messages):
+        assert [x["role"] for x in m] == ["system", "user"]
+        if work.get("title"):
+            assert work["title"] not in m[0]["content"] and work["title"] in m[1]["content"]
+    assert len({m[1]["content"] for m in messages}) == len(WORKS)
+    # クリップ数が変わるとシステムプロンプトも変わる
+    assert gen.prefix_system_prompt(5) != gen.prefix_system_prompt(4)
+
+
+def test_legacy_layout_embeds_work_data_in_system_prompt():
+    legacy = [gen.build_messages(work, 4, "legacy") for work in WORKS[:2]]
+    assert legacy[0][0]["content"] != legacy[1][0]["content"]
+    assert MOCK_DMM_DATA["title"] in legacy[0][0]["content"]
+
+
+def test_prefix_layout_trims_long_descriptions(monkeypatch):
+    monkeypatch.setattr(gen, "LLM_DESCRIPTION_TOKEN_BUDGET", 50)
+    user = gen.build_prefix_messages(WORKS[2], 4)[1]["content"]
+    description = next(line for line in user.splitlines() if line.startswith("- あらすじ")).split(": ", 1)[1]
+    assert description.endswith("…") and gen.estimate_tokens(description) <= 50
+    monkeypatch.setattr(gen, "LLM_DESCRIPTION_TOKEN_BUDGET", 0)
+    assert WORKS[2]["description"] in gen.build_prefix_messages(WORKS[2], 4)[1]["content"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("あいうえお", 5),
+    ("abcd", 1),
+    ("abcde", 2),
+    ("日本語abc", 4),
+    ("", 0),
+])
+def test_estimate_tokens(text, expected):
+    assert gen.estimate_tokens(text) == expected
+
+
+def test_trim_keeps_text_within_budget():
+    assert gen.trim_to_token_budget("短い文。", 10) == "短い文。"
+    assert gen.trim_to_token_budget("長い文" * 100, 0) == "長い文" * 100
+    rng = random.Random(0)
+    alphabet = "あいうえおカキクケコ漢字abcdefg 。！？\n"
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 300)))
+        budget = rng.randint(1, 120)
+        trimmed = gen.trim_to_token_budget(text, budget)
+        assert gen.estimate_tokens(trimmed) <= budget
+        if gen.estimate_tokens(text) > budget:
+            assert trimmed.endswith("…") and text.startswith(trimmed[:-1].rstrip())
+        else:
+            assert trimmed == text
+
+
+def test_trim_prefers_sentence_boundary():
+    text = "一文目です。二文目もあります。三文目はとても長くて予算を超えてしまう文章です。"
+    trimmed = gen.trim_to_token_budget(text, 20)
+    assert trimmed == "一文目です。二文目もあります。…"
+    # 区切りが前半にしかない場合は、文の途中で切る
+    trimmed = gen.trim_to_token_budget("短。" + "あ" * 50, 20)
+    assert trimmed == "短。" + "あ" * 17 + "…"
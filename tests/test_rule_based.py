@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import MOCK_DMM_DATA
+from rule_based_text_generator import (
+    benchmark_batch,
+    clips_to_frame,
+    generate_rule_based_text,
+    generate_rule_based_text_batch,
+)
+
+DESCRIPTIONS = [
+    MOCK_DMM_DATA["description"],
+    "運命の出会い。 二人の秘密、そして裏切り．最後に残るのは",
+    "短いあらすじ",
+    "二文だけ。残り",
+    "  。、 空白だけの文を含む.あらすじ。  ",
+    "　全角空白。　。次",
+    "。。、、..．",
+    "改行を\n含む。\t文",
+    "",
+]
+
+
+def expected_frame(records, num_clips, index=None):
+    return clips_to_frame([generate_rule_based_text(r, num_clips) for r in records], index=index)
+
+
+@pytest.mark.parametrize("num_clips", [1, 3, 4, 6])
+def test_batch_matches_per_item(num_clips):
+    records = [
+        {"title": f"作品{n}", "description": d, "genre": f"ジャンル{n % 2}"}
+        for n, d in enumerate(DESCRIPTIONS)
+    ]
+    df = pd.DataFrame(records, index=[f"cid{n}" for n in range(len(records))])
+    batch = generate_rule_based_text_batch(df, num_clips)
+    assert list(batch.columns) == [f"frame_{i}_{k}" for i in range(1, num_clips + 1) for k in ("top", "bottom")]
+    pd.testing.assert_frame_equal(batch, expected_frame(records, num_clips, index=df.index)[batch.columns])
+
+
+def test_missing_columns_and_values_use_per_item_defaults():
+    df = pd.DataFrame({"title": ["作品A", None], "description": ["一文目。二文目", np.nan]})
+    batch = generate_rule_based_text_batch(df, 4)
+    # 列・値が無い場合は、キーが無いdictを1件版に渡した場合と同じ結果になる
+    records = [{"title": "作品A", "description": "一文目。二文目"}, {}]
+    pd.testing.assert_frame_equal(batch, expected_frame(records, 4))
+
+
+def test_empty_frame():
+    batch = generate_rule_based_text_batch(pd.DataFrame(columns=["title", "description", "genre"]), 2)
+    assert list(batch.columns) == ["frame_1_top", "frame_1_bottom", "frame_2_top", "frame_2_bottom"]
+    assert batch.empty
+
+
+def test_benchmark_reports_parity():
+    result = benchmark_batch(600)
+    assert result["rows"] == 600 and result["matched"]